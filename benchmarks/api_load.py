@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+API load benchmark for the FastAPI app in ``agent_approval_gate.main``.
+
+Drives the app in-process (httpx ASGI transport) and over a real uvicorn
+socket with configurable concurrency, against SQLite in-memory, SQLite file
+and SQLite file in WAL mode. Telegram Bot API calls go to a local stub
+server, so only gate-side cost is measured.
+
+    python benchmarks/api_load.py                      # all configs, compare to baseline
+    python benchmarks/api_load.py --db wal --transport socket -c 32 -n 2000
+    python benchmarks/api_load.py --update-baseline    # rewrite baseline_api.json
+    python benchmarks/api_load.py --check              # exit 1 on regression
+
+Each database configuration runs in its own subprocess because settings
+and the engine are process-wide.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from common import (  # noqa: E402
+    compare,
+    exit_on_regression,
+    load_baseline,
+    save_baseline,
+    summarize_latencies,
+)
+
+BASELINE = Path(__file__).resolve().parent / "baseline_api.json"
+API_KEY = "bench-key"
+HEADERS = {"Authorization": f"Bearer {API_KEY}"}
+DB_CONFIGS = ("memory", "file", "wal")
+TRANSPORTS = ("inprocess", "socket")
+SCENARIOS = ("create_pending", "create_auto", "status_get", "decision_apply", "webhook_callback")
+METRICS = {"throughput_rps": True, "p50_ms": False, "p95_ms": False, "p99_ms": False}
+# Unique across runs in one process, or the webhook would drop later runs as redeliveries.
+UPDATE_IDS = itertools.count(1)
+
+
+# ---- child process: one database configuration ----
+
+
+def configure_env(db: str, workdir: str, telegram_base: str) -> None:
+    if db == "memory":
+        os.environ["DATABASE_URL"] = "sqlite://"
+        os.environ.pop("SQLITE_JOURNAL_MODE", None)
+    else:
+        os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/bench.db"
+        if db == "wal":
+            os.environ["SQLITE_JOURNAL_MODE"] = "wal"
+        else:
+            os.environ.pop("SQLITE_JOURNAL_MODE", None)
+    os.environ["APPROVAL_API_KEYS"] = API_KEY
+    os.environ["TELEGRAM_MOCK"] = "1"
+    os.environ["TELEGRAM_BOT_TOKEN"] = "bench"
+    os.environ["TELEGRAM_API_BASE"] = telegram_base
+    for name in ("TELEGRAM_WEBHOOK_SECRET", "ALLOWED_USER_IDS", "TRACE_EXPORTER"):
+        os.environ.pop(name, None)
+
+
+def start_telegram_stub() -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", "0")))
+            body = b'{"ok": true, "result": true}'
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def approval_payload(session_id: str, action_type: str) -> dict:
+    return {
+        "session_id": session_id,
+        "action_type": action_type,
+        "title": "Run command",
+        "preview": "rm -rf ./build && npm run build",
+        "channel": "telegram",
+        "target": {"tg_chat_id": "123"},
+        "expires_in_sec": 600,
+    }
+
+
+async def run_requests(client, requests: list[tuple], concurrency: int) -> tuple[list[float], list, float]:
+    """Issue ``requests`` with at most ``concurrency`` in flight."""
+    latencies: list[float] = [0.0] * len(requests)
+    responses: list = [None] * len(requests)
+    cursor = iter(range(len(requests)))
+
+    async def worker():
+        for index in cursor:
+            method, url, kwargs = requests[index]
+            start = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies[index] = time.perf_counter() - start
+            responses[index] = response
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    failures = [r.status_code for r in responses if r.status_code >= 400]
+    if failures:
+        raise RuntimeError(f"{len(failures)} request(s) failed, e.g. HTTP {failures[0]}")
+    return latencies, responses, elapsed
+
+
+async def create_pending(client, count: int, tag: str, concurrency: int) -> list[str]:
+    requests = [
+        ("POST", "/v1/approvals", {"json": approval_payload(f"{tag}_{i}", f"{tag}_pending"), "headers": HEADERS})
+        for i in range(count)
+    ]
+    _, responses, _ = await run_requests(client, requests, concurrency)
+    return [r.json()["approval_id"] for r in responses]
+
+
+async def build_scenario(name: str, client, count: int, tag: str, concurrency: int) -> list[tuple]:
+    if name == "create_pending":
+        return [
+            ("POST", "/v1/approvals", {"json": approval_payload(f"{tag}_s{i}", f"{tag}_pend"), "headers": HEADERS})
+            for i in range(count)
+        ]
+    if name == "create_auto":
+        (seed,) = await create_pending(client, 1, f"{tag}_auto", concurrency)
+        await client.post(
+            "/v1/inbox/email-reply",
+            json={"subject": f"Re: [{seed}]", "body": "6"},
+            headers=HEADERS,
+        )
+        return [
+            ("POST", "/v1/approvals", {"json": approval_payload(f"{tag}_a{i}", f"{tag}_auto_pending"), "headers": HEADERS})
+            for i in range(count)
+        ]
+    if name == "status_get":
+        ids = await create_pending(client, min(count, 200), f"{tag}_get", concurrency)
+        return [("GET", f"/v1/approvals/{ids[i % len(ids)]}", {"headers": HEADERS}) for i in range(count)]
+    if name == "decision_apply":
+        ids = await create_pending(client, count, f"{tag}_dec", concurrency)
+        return [
+            ("POST", "/v1/inbox/email-reply", {"json": {"subject": f"Re: [{approval_id}]", "body": "1"}, "headers": HEADERS})
+            for approval_id in ids
+        ]
+    if name == "webhook_callback":
+        ids = await create_pending(client, count, f"{tag}_hook", concurrency)
+        return [
+            (
+                "POST",
+                "/v1/telegram/webhook",
+                {
+                    "json": {
+                        "update_id": next(UPDATE_IDS),
+                        "callback_query": {
+                            "id": f"cb{i}",
+                            "data": f"{approval_id}:1",
+                            "from": {"id": 1, "language_code": "en"},
+                            "message": {"message_id": i, "chat": {"id": 123}, "text": "Approval"},
+                        },
+                    }
+                },
+            )
+            for i, approval_id in enumerate(ids)
+        ]
+    raise ValueError(f"unknown scenario: {name}")
+
+
+async def bench_transport(transport: str, args) -> dict:
+    import httpx
+
+    from agent_approval_gate.main import app
+
+    server = None
+    thread = None
+    if transport == "inprocess":
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+    else:
+        import socket
+
+        import uvicorn
+
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", access_log=False)
+        server = uvicorn.Server(config)
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        while not server.started:
+            await asyncio.sleep(0.01)
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        client = httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=30)
+
+    results = {}
+    try:
+        for scenario in args.scenario:
+            tag = f"{transport}_{scenario}"
+            requests = await build_scenario(scenario, client, args.requests, tag, args.concurrency)
+            latencies, _, elapsed = await run_requests(client, requests, args.concurrency)
+            results[scenario] = summarize_latencies(latencies, elapsed)
+    finally:
+        await client.aclose()
+        if server is not None:
+            server.should_exit = True
+            thread.join(timeout=10)
+    return results
+
+
+def run_child(args) -> dict:
+    stub = start_telegram_stub()
+    with tempfile.TemporaryDirectory() as workdir:
+        configure_env(args.db[0], workdir, f"http://127.0.0.1:{stub.server_address[1]}")
+        from agent_approval_gate.database import init_db
+
+        init_db()
+        results = {}
+        for transport in args.transport:
+            for scenario, summary in asyncio.run(bench_transport(transport, args)).items():
+                results[f"{transport}/{args.db[0]}/{scenario}/c{args.concurrency}"] = summary
+    stub.shutdown()
+    return results
+
+
+# ---- parent process ----
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", nargs="+", choices=DB_CONFIGS, default=list(DB_CONFIGS))
+    parser.add_argument("--transport", nargs="+", choices=TRANSPORTS, default=list(TRANSPORTS))
+    parser.add_argument("--scenario", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("-n", "--requests", type=int, default=300, help="requests per scenario")
+    parser.add_argument("-c", "--concurrency", type=int, default=8)
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=25.0, help="regression threshold in percent")
+    parser.add_argument("--check", action="store_true", help="exit 1 if any result regresses")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main() -> None:
+    args = parse_args()
+    if args.child:
+        print(json.dumps(run_child(args)))
+        return
+
+    results = {}
+    for db in args.db:
+        cmd = [
+            sys.executable, __file__, "--child", "--db", db,
+            "--transport", *args.transport,
+            "--scenario", *args.scenario,
+            "-n", str(args.requests),
+            "-c", str(args.concurrency),
+        ]
+        proc = subprocess.run(cmd, capture_output=True, text=True)
+        if proc.returncode != 0:
+            sys.stderr.write(proc.stderr)
+            sys.exit(proc.returncode)
+        results.update(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    baseline = load_baseline(args.baseline)
+    regressions = compare(results, baseline, METRICS, args.threshold)
+    if args.update_baseline:
+        merged = {**baseline, **results}
+        save_baseline(args.baseline, merged)
+        print(f"\nBaseline written to {args.baseline}")
+        return
+    exit_on_regression(regressions, args.check)
+
+
+if __name__ == "__main__":
+    main()
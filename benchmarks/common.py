@@ -0,0 +1,105 @@
+"""Shared helpers for the benchmark scripts: percentiles and JSON baselines."""
+
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+ROOT = BENCH_DIR.parent
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize_latencies(latencies: list[float], elapsed: float) -> dict:
+    """Throughput and latency percentiles (milliseconds) for one run."""
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "throughput_rps": round(len(ordered) / elapsed, 1) if elapsed > 0 else 0.0,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+    }
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=False,
+        ).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def load_baseline(path: Path) -> dict:
+    if not path.exists():
+        return {}
+    with open(path, encoding="utf-8") as fh:
+        return json.load(fh).get("results", {})
+
+
+def save_baseline(path: Path, results: dict) -> None:
+    payload = {"environment": environment(), "results": dict(sorted(results.items()))}
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(payload, fh, indent=2, sort_keys=False)
+        fh.write("\n")
+
+
+def compare(
+    results: dict,
+    baseline: dict,
+    metrics: dict[str, bool],
+    threshold: float,
+) -> list[str]:
+    """Print a diff against ``baseline`` and return the regressed keys.
+
+    ``metrics`` maps a metric name to True when higher is better.
+    """
+    regressions = []
+    for key, current in sorted(results.items()):
+        previous = baseline.get(key)
+        parts = []
+        regressed = False
+        for metric, higher_is_better in metrics.items():
+            value = current.get(metric)
+            if value is None:
+                continue
+            if not previous or not previous.get(metric):
+                parts.append(f"{metric}={value}")
+                continue
+            change = (value - previous[metric]) / previous[metric] * 100
+            worse = -change if higher_is_better else change
+            flag = " !" if worse > threshold else ""
+            regressed = regressed or bool(flag)
+            parts.append(f"{metric}={value} ({change:+.1f}%{flag})")
+        print(f"{key:<48} " + "  ".join(parts))
+        if regressed:
+            regressions.append(key)
+    return regressions
+
+
+def exit_on_regression(regressions: list[str], check: bool) -> None:
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond threshold: {', '.join(regressions)}")
+        if check:
+            sys.exit(1)
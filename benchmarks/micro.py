@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the pure functions on the request path.
+
+Each case is timed with ``timeit``: the loop count is auto-ranged to about
+0.2 s, the timing is repeated and the best run is reported as ns/op, which
+is the most stable figure to compare across commits.
+
+    python benchmarks/micro.py                    # compare to baseline_micro.json
+    python benchmarks/micro.py -k email           # only cases whose name contains "email"
+    python benchmarks/micro.py --update-baseline
+    python benchmarks/micro.py --check            # exit 1 on regression
+"""
+
+import argparse
+import datetime as dt
+import os
+import sys
+import timeit
+from pathlib import Path
+
+from pydantic import TypeAdapter
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from common import compare, exit_on_regression, load_baseline, save_baseline  # noqa: E402
+
+BASELINE = Path(__file__).resolve().parent / "baseline_micro.json"
+METRICS = {"ns_per_op": False}
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ["PUBLIC_URL"] = "https://approvals.example.com"
+os.environ["ACTION_SIGN_KEY"] = "bench-sign-key-0123456789abcdef"
+os.environ["DISPLAY_TIMEZONE"] = "Asia/Shanghai"
+
+from agent_approval_gate.config import get_settings  # noqa: E402
+
+get_settings.cache_clear()
+
+from agent_approval_gate.adapters.email import build_html_body, generate_action_signature  # noqa: E402
+from agent_approval_gate.adapters.telegram import build_question_keyboard, build_telegram_message  # noqa: E402
+from agent_approval_gate.auth import api_key_to_client_id  # noqa: E402
+from agent_approval_gate.decision import parse_menu_reply  # noqa: E402
+from agent_approval_gate.models import Approval  # noqa: E402
+from agent_approval_gate.schemas import ApprovalCreateResponse, ApprovalStatusResponse  # noqa: E402
+from agent_approval_gate.serialization import ModelEncoder  # noqa: E402
+from agent_approval_gate.utils import extract_approval_id, format_expires_at, truncate_email_reply  # noqa: E402
+
+APPROVAL_ID = "appr_9f1c2b7e4d5a4e0f8b3c6a1d2e7f9a0b"
+
+# ~4 KB shell preview similar to what the permission hook sends for Bash/Write.
+PREVIEW = "\n".join(
+    f"docker run --rm -v \"$PWD\":/src -e STAGE={i} registry.example.com/build:latest "
+    f"sh -c 'cd /src && make target-{i} && rm -rf ./build/tmp-{i} <out-{i}.log' && echo \"done {i}\""
+    for i in range(30)
+)
+
+# Reply on top of a long Gmail-style quoted thread (~12 KB).
+QUOTED_THREAD = "4 ship it but keep the logs\n\n" + "\n".join(
+    f"On Tue, Oct {i % 28 + 1}, 2026 at 10:{i % 60:02d} AM Approval Gate <approvals@example.com> wrote:\n"
+    + "\n".join(f"{'> ' * (i % 5 + 1)}{line}" for line in PREVIEW.splitlines()[:3])
+    for i in range(40)
+)
+
+# Body without any quote marker: truncate_email_reply has to scan every line.
+UNQUOTED_BODY = "\n".join(f"line {i}: {'x' * 60}" for i in range(200))
+
+# approval_id appears only near the end of the email body.
+BODY_WITH_ID_AT_END = UNQUOTED_BODY + f"\nApproval ID: {APPROVAL_ID}\n"
+
+OPTIONS = [
+    "Use PostgreSQL with logical replication",
+    "Use SQLite in WAL mode",
+    "Keep the current setup",
+    "Something else entirely, explain in the note",
+]
+
+NOW = dt.datetime(2026, 10, 19, 12, 0, 0)
+
+CREATE_BODY = {"approval_id": APPROVAL_ID, "status": "pending", "auto": False, "expires_at": 1792411200}
+STATUS_BODY = {
+    "status": "approved",
+    "expires_at": 1792411200,
+    "decision": {"code": "4", "note": "ship it but keep the logs", "override": None},
+    "session_id": "cc_4242_deadbeef",
+    "action_type": "Bash",
+}
+
+
+def make_approval() -> Approval:
+    return Approval(
+        approval_id=APPROVAL_ID,
+        created_at=NOW,
+        expires_at=NOW + dt.timedelta(hours=1),
+        status="pending",
+        session_id="cc_4242_deadbeef",
+        action_type="Bash",
+        title="Claude Code: Bash",
+        preview=PREVIEW,
+        channel="telegram",
+        target={"tg_chat_id": "123456789"},
+        client_id="b0962662e937",
+    )
+
+
+def response_model_path(model):
+    # What FastAPI does with a returned dict: validate into the model, then dump JSON.
+    adapter = TypeAdapter(model)
+    return lambda body: adapter.dump_json(adapter.validate_python(body))
+
+
+def build_cases() -> dict:
+    approval = make_approval()
+    long_note = "4 " + "please also archive the logs and notify the on-call channel " * 20
+    override = "5 " + PREVIEW[:1024]
+    sign_key = get_settings().action_sign_key
+    create_model, create_fast = response_model_path(ApprovalCreateResponse), ModelEncoder(ApprovalCreateResponse)
+    status_model, status_fast = response_model_path(ApprovalStatusResponse), ModelEncoder(ApprovalStatusResponse)
+    return {
+        "decision.parse_menu_reply/code": lambda: parse_menu_reply("1"),
+        "decision.parse_menu_reply/long_note": lambda: parse_menu_reply(long_note),
+        "decision.parse_menu_reply/override_1k": lambda: parse_menu_reply(override),
+        "utils.extract_approval_id/subject": lambda: extract_approval_id(f"Re: Claude Code: Bash [{APPROVAL_ID}]"),
+        "utils.extract_approval_id/body_end": lambda: extract_approval_id(BODY_WITH_ID_AT_END),
+        "utils.truncate_email_reply/quoted_thread": lambda: truncate_email_reply(QUOTED_THREAD),
+        "utils.truncate_email_reply/unquoted_14k": lambda: truncate_email_reply(UNQUOTED_BODY),
+        "utils.format_expires_at": lambda: format_expires_at(approval.expires_at),
+        "auth.api_key_to_client_id": lambda: api_key_to_client_id("sk-live-0123456789abcdef0123456789abcdef"),
+        "email.build_html_body/standard": lambda: build_html_body(approval, "approvals@example.com"),
+        "email.build_html_body/options": lambda: build_html_body(approval, "approvals@example.com", OPTIONS),
+        "email.generate_action_signature": lambda: generate_action_signature(APPROVAL_ID, "approve", sign_key),
+        "telegram.build_telegram_message": lambda: build_telegram_message(approval),
+        "telegram.build_question_keyboard": lambda: build_question_keyboard(APPROVAL_ID, OPTIONS),
+        "serialization.create/response_model": lambda: create_model(CREATE_BODY),
+        "serialization.create/fast": lambda: create_fast(CREATE_BODY),
+        "serialization.status/response_model": lambda: status_model(STATUS_BODY),
+        "serialization.status/fast": lambda: status_fast(STATUS_BODY),
+    }
+
+
+def measure(func, repeat: int, min_time: float) -> float:
+    timer = timeit.Timer(func)
+    loops, elapsed = timer.autorange()
+    if elapsed < min_time:
+        loops = max(loops, int(loops * min_time / max(elapsed, 1e-9)))
+    best = min(timer.repeat(repeat=repeat, number=loops))
+    return best / loops * 1e9
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-k", "--filter", default="", help="only run cases containing this substring")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per timing run")
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=15.0, help="regression threshold in percent")
+    parser.add_argument("--check", action="store_true", help="exit 1 if any case regresses")
+    args = parser.parse_args()
+
+    results = {}
+    for name, func in build_cases().items():
+        if args.filter and args.filter not in name:
+            continue
+        results[name] = {"ns_per_op": round(measure(func, args.repeat, args.min_time), 1)}
+
+    baseline = load_baseline(args.baseline)
+    regressions = compare(results, baseline, METRICS, args.threshold)
+    if args.update_baseline:
+        save_baseline(args.baseline, {**baseline, **results})
+        print(f"\nBaseline written to {args.baseline}")
+        return
+    exit_on_regression(regressions, args.check)
+
+
+if __name__ == "__main__":
+    main()
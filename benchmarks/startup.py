@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark: how long a fresh process takes to become useful.
+
+Each case launches a new interpreter, the way a scale-to-zero container or
+a per-invocation hook does, and is repeated; the median and the fastest run
+are reported in milliseconds.
+
+- ``api.import``: ``import agent_approval_gate.main``
+- ``api.first_response``: spawn uvicorn on a fresh SQLite file until
+  ``GET /metrics`` answers (import, ``init_db``, migrations, bind)
+- ``hook.startup`` / ``mcp.startup``: launch the client script up to its
+  configuration check, i.e. everything it imports before the first request
+
+    python benchmarks/startup.py                    # compare to baseline_startup.json
+    python benchmarks/startup.py -k api -n 20
+    python benchmarks/startup.py --update-baseline
+    python benchmarks/startup.py --check            # exit 1 on regression
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from common import ROOT, compare, exit_on_regression, load_baseline, save_baseline  # noqa: E402
+
+BASELINE = Path(__file__).resolve().parent / "baseline_startup.json"
+METRICS = {"p50_ms": False, "min_ms": False}
+
+
+def child_env(**extra) -> dict:
+    env = {key: value for key, value in os.environ.items() if key != "APPROVAL_API_KEY"}
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(ROOT / "src"), env.get("PYTHONPATH")]))
+    env.update(extra)
+    return env
+
+
+def run_process(cmd: list[str], env: dict) -> float:
+    start = time.perf_counter()
+    subprocess.run(cmd, env=env, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def first_response(env: dict, timeout: float = 30.0) -> float:
+    port = free_port()
+    with tempfile.TemporaryDirectory() as workdir:
+        env = {**env, "DATABASE_URL": f"sqlite:///{workdir}/startup.db", "APPROVAL_API_KEY": "bench-key"}
+        cmd = [sys.executable, "-m", "uvicorn", "agent_approval_gate.main:app", "--port", str(port), "--log-level", "warning"]
+        start = time.perf_counter()
+        proc = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            while time.perf_counter() - start < timeout:
+                try:
+                    with socket.create_connection(("127.0.0.1", port), timeout=1) as conn:
+                        conn.sendall(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n")
+                        if conn.recv(12).startswith(b"HTTP/1.1 200"):
+                            return time.perf_counter() - start
+                except OSError:
+                    time.sleep(0.005)
+            raise RuntimeError("server did not answer within timeout")
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+def build_cases() -> dict:
+    env = child_env(DATABASE_URL="sqlite://")
+    return {
+        "api.import": lambda: run_process([sys.executable, "-c", "import agent_approval_gate.main"], env),
+        "api.first_response": lambda: first_response(env),
+        "hook.startup": lambda: run_process([sys.executable, str(ROOT / "scripts" / "cc_permission_hook.py")], env),
+        "mcp.startup": lambda: run_process([sys.executable, str(ROOT / "mcp_server.py")], env),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-k", "--filter", default="", help="only run cases containing this substring")
+    parser.add_argument("-n", "--repeat", type=int, default=10)
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=20.0, help="regression threshold in percent")
+    parser.add_argument("--check", action="store_true", help="exit 1 if any case regresses")
+    args = parser.parse_args()
+
+    results = {}
+    for name, func in build_cases().items():
+        if args.filter and args.filter not in name:
+            continue
+        func()  # warm the OS page cache and __pycache__
+        samples = [func() * 1000 for _ in range(args.repeat)]
+        results[name] = {"p50_ms": round(statistics.median(samples), 1), "min_ms": round(min(samples), 1)}
+
+    baseline = load_baseline(args.baseline)
+    regressions = compare(results, baseline, METRICS, args.threshold)
+    if args.update_baseline:
+        save_baseline(args.baseline, {**baseline, **results})
+        print(f"\nBaseline written to {args.baseline}")
+        return
+    exit_on_regression(regressions, args.check)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,7 +9,6 @@ import sys
 import os
 import time
 import subprocess
-import uuid
 
 # Configuration
 API_BASE = os.getenv("APPROVAL_GATE_URL", "http://localhost:8000")
@@ -23,12 +22,53 @@ DEFAULT_TG_CHAT_ID = os.getenv("APPROVAL_TG_CHAT_ID", "")
 DEFAULT_EMAIL = os.getenv("APPROVAL_EMAIL", "")
 
 # Generate unique session ID per MCP server process
-SESSION_ID = os.getenv("APPROVAL_SESSION_ID") or f"mcp_{uuid.uuid4().hex[:12]}"
+SESSION_ID = os.getenv("APPROVAL_SESSION_ID") or f"mcp_{os.urandom(6).hex()}"
 
+# Trace context: each tools/call starts a new trace; API calls are children of its root span.
+# When APPROVAL_TRACE_FILE is set, the root span is appended to that JSONL file.
+TRACE_FILE = os.getenv("APPROVAL_TRACE_FILE", "")
+_trace = {"trace_id": os.urandom(16).hex(), "span_id": os.urandom(8).hex(), "attributes": {}}
 
-def api_call(method: str, path: str, data: dict = None) -> dict:
+
+def start_trace() -> None:
+    _trace.update(
+        trace_id=os.urandom(16).hex(),
+        span_id=os.urandom(8).hex(),
+        start_ns=time.time_ns(),
+        attributes={},
+    )
+
+
+def end_trace(name: str) -> None:
+    if not TRACE_FILE:
+        return
+    span = {
+        "name": name,
+        "trace_id": _trace["trace_id"],
+        "span_id": _trace["span_id"],
+        "parent_id": None,
+        "start_ns": _trace.get("start_ns", time.time_ns()),
+        "end_ns": time.time_ns(),
+        "status": "ok",
+        "attributes": _trace["attributes"],
+    }
+    try:
+        with open(TRACE_FILE, "a", encoding="utf-8") as fh:
+            fh.write(json.dumps(span, ensure_ascii=False) + "\n")
+    except OSError:
+        pass
+
+
+def api_call(method: str, path: str, data: dict = None, idempotency_key: str = None) -> dict:
     """Call API using curl (more reliable than httpx in some environments)"""
-    cmd = ["curl", "-sS", f"{API_BASE}{path}", "-H", f"Authorization: Bearer {API_KEY}"]
+    cmd = [
+        "curl", "-sS", f"{API_BASE}{path}",
+        "-H", f"Authorization: Bearer {API_KEY}",
+        "-H", f"traceparent: 00-{_trace['trace_id']}-{_trace['span_id']}-01",
+    ]
+    if idempotency_key:
+        # Safe to retry: the server replays the first response instead of creating a duplicate
+        cmd.extend(["-H", f"Idempotency-Key: {idempotency_key}", "--retry", "3", "--retry-connrefused"])
     if method == "POST":
         cmd.extend(["-X", "POST", "-H", "Content-Type: application/json", "-d", json.dumps(data)])
     result = subprocess.run(cmd, capture_output=True, text=True)
@@ -71,19 +111,25 @@ def request_approval(
     if options:
         data["options"] = options
 
-    return api_call("POST", "/v1/approvals", data)
+    result = api_call("POST", "/v1/approvals", data, idempotency_key=os.urandom(16).hex())
+    if result.get("approval_id"):
+        _trace["attributes"]["approval.id"] = result["approval_id"]
+    return result
 
 
-def check_approval(approval_id: str) -> dict:
-    """Check approval status"""
-    return api_call("GET", f"/v1/approvals/{approval_id}")
+def check_approval(approval_id: str, wait: int = 0) -> dict:
+    """Check approval status; ``wait`` long-polls up to that many seconds while pending"""
+    path = f"/v1/approvals/{approval_id}"
+    if wait:
+        path += f"?wait={wait}"
+    return api_call("GET", path)
 
 
 def wait_for_approval(approval_id: str, poll_interval: int = 3, max_wait: int = 3600) -> dict:
     """Wait for approval decision (blocking)"""
     start = time.time()
     while time.time() - start < max_wait:
-        result = check_approval(approval_id)
+        result = check_approval(approval_id, wait=25)
         status = result.get("status")
         if status and status != "pending":
             return result
@@ -224,6 +270,9 @@ def handle_request(request: dict) -> dict:
     elif method == "tools/call":
         tool_name = params.get("name")
         args = params.get("arguments", {})
+        start_trace()
+        if tool_name == "wait_for_approval" and args.get("approval_id"):
+            _trace["attributes"]["approval.id"] = args["approval_id"]
 
         try:
             if tool_name == "request_approval":
@@ -268,12 +317,14 @@ def handle_request(request: dict) -> dict:
             else:
                 return {"jsonrpc": "2.0", "id": req_id, "error": {"code": -32601, "message": f"Unknown tool: {tool_name}"}}
 
+            end_trace(f"mcp.{tool_name}")
             return {
                 "jsonrpc": "2.0",
                 "id": req_id,
                 "result": {"content": [{"type": "text", "text": json.dumps(result, indent=2)}]}
             }
         except Exception as e:
+            end_trace(f"mcp.{tool_name}")
             return {
                 "jsonrpc": "2.0",
                 "id": req_id,
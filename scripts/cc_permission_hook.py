@@ -9,12 +9,12 @@ Claude Code PermissionRequest Hook
 3. 所有权限确认都会发送到 Telegram
 """
 
+import atexit
 import json
 import os
 import sys
 import time
 import subprocess
-import uuid
 
 # 配置
 API_BASE = os.getenv("APPROVAL_GATE_URL", "http://127.0.0.1:8000")
@@ -34,16 +34,56 @@ CHANNEL = os.getenv("APPROVAL_CHANNEL", "telegram")
 TG_CHAT_ID = os.getenv("APPROVAL_TG_CHAT_ID", "")
 EMAIL = os.getenv("APPROVAL_EMAIL", "")
 POLL_INTERVAL = 2
+LONG_POLL_SEC = 25  # 服务端挂起等待决策的秒数；旧版服务端会忽略 wait 参数并立即返回
 MAX_WAIT = 3600  # 1 hour
 
 # Generate unique session ID per hook process (derived from parent PID for consistency within a Claude Code session)
 PPID = os.getppid()
-SESSION_ID = os.getenv("APPROVAL_SESSION_ID") or f"cc_{PPID}_{uuid.uuid4().hex[:8]}"
+SESSION_ID = os.getenv("APPROVAL_SESSION_ID") or f"cc_{PPID}_{os.urandom(4).hex()}"
+
+# Trace context：一次 hook 调用对应一个 trace，所有 API 请求都作为根 span 的子节点
+# 设置 APPROVAL_TRACE_FILE 时，hook 自身的 span 会追加写入该 JSONL 文件
+TRACE_FILE = os.getenv("APPROVAL_TRACE_FILE", "")
+TRACE_ID = os.urandom(16).hex()
+ROOT_SPAN_ID = os.urandom(8).hex()
+TRACE_START_NS = time.time_ns()
+TRACE_ATTRS = {}
+
+
+def export_trace():
+    """把 hook 根 span 写入 APPROVAL_TRACE_FILE（与服务端 JSONL 格式一致）"""
+    if not TRACE_FILE:
+        return
+    span = {
+        "name": "hook.permission_request",
+        "trace_id": TRACE_ID,
+        "span_id": ROOT_SPAN_ID,
+        "parent_id": None,
+        "start_ns": TRACE_START_NS,
+        "end_ns": time.time_ns(),
+        "status": "ok",
+        "attributes": TRACE_ATTRS,
+    }
+    try:
+        with open(TRACE_FILE, "a", encoding="utf-8") as fh:
+            fh.write(json.dumps(span, ensure_ascii=False) + "\n")
+    except OSError:
+        pass
+
+
+atexit.register(export_trace)
 
 
-def api_call(method: str, path: str, data: dict = None) -> dict:
+def api_call(method: str, path: str, data: dict = None, idempotency_key: str = None) -> dict:
     """Call API using curl"""
-    cmd = ["curl", "-sS", f"{API_BASE}{path}", "-H", f"Authorization: Bearer {API_KEY}"]
+    cmd = [
+        "curl", "-sS", f"{API_BASE}{path}",
+        "-H", f"Authorization: Bearer {API_KEY}",
+        "-H", f"traceparent: 00-{TRACE_ID}-{ROOT_SPAN_ID}-01",
+    ]
+    if idempotency_key:
+        # 带 Idempotency-Key 的请求可以安全重试：服务端会重放首次响应，不会重复创建和通知
+        cmd.extend(["-H", f"Idempotency-Key: {idempotency_key}", "--retry", "3", "--retry-connrefused"])
     if method == "POST":
         cmd.extend(["-X", "POST", "-H", "Content-Type: application/json", "-d", json.dumps(data)])
     result = subprocess.run(cmd, capture_output=True, text=True)
@@ -81,14 +121,14 @@ def request_approval(tool_name: str, tool_input: dict) -> dict:
         "expires_in_sec": MAX_WAIT
     }
 
-    return api_call("POST", "/v1/approvals", data)
+    return api_call("POST", "/v1/approvals", data, idempotency_key=os.urandom(16).hex())
 
 
 def wait_for_approval(approval_id: str) -> dict:
     """Wait for approval decision"""
     start = time.time()
     while time.time() - start < MAX_WAIT:
-        result = api_call("GET", f"/v1/approvals/{approval_id}")
+        result = api_call("GET", f"/v1/approvals/{approval_id}?wait={LONG_POLL_SEC}")
         status = result.get("status")
         if status and status != "pending":
             return result
@@ -113,6 +153,7 @@ def main():
 
     tool_name = input_data.get("tool_name", "Unknown")
     tool_input = input_data.get("tool_input", {})
+    TRACE_ATTRS["tool_name"] = tool_name
 
     # 某些工具不需要审批
     skip_tools = ["Read", "Glob", "Grep", "LS", "Task", "WebFetch", "WebSearch"]
@@ -129,6 +170,8 @@ def main():
     # 请求审批
     req_result = request_approval(tool_name, tool_input)
     approval_id = req_result.get("approval_id")
+    if approval_id:
+        TRACE_ATTRS["approval.id"] = approval_id
 
     if not approval_id:
         # API 调用失败，回退到默认对话框
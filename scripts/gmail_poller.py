@@ -3,9 +3,12 @@
 Gmail 轮询脚本：通过 IMAP 读取邮件回复并处理审批
 """
 
+import base64
+import binascii
 import email
 import imaplib
 import os
+import quopri
 import re
 import time
 
@@ -24,8 +27,16 @@ API_KEY = os.getenv("API_KEY", "dev-key")
 # 格式：逗号分隔，如 "admin@example.com,user@example.com"
 ALLOWED_SENDERS = set(filter(None, os.getenv("ALLOWED_SENDERS", "").split(",")))
 
+# 每批 UID FETCH 的邮件数量
+FETCH_BATCH_SIZE = int(os.getenv("EMAIL_FETCH_BATCH_SIZE", "50"))
+# 正文只读取前 N 个字节（回复代码在第一行，无需下载整封邮件）
+BODY_MAX_BYTES = int(os.getenv("EMAIL_BODY_MAX_BYTES", "4096"))
+
 # 匹配 approval_id 的正则
 APPROVAL_ID_RE = re.compile(r"(appr_[a-f0-9]+)")
+UID_RE = re.compile(rb"UID (\d+)")
+FETCH_START_RE = re.compile(rb"\d+ \(")
+BODYSTRUCTURE_RE = re.compile(rb"BODYSTRUCTURE ")
 
 
 def connect_imap():
@@ -35,34 +46,186 @@ def connect_imap():
     return mail
 
 
-def get_unread_emails(mail):
-    """获取未读的审批相关邮件（主题包含 appr_）"""
+def get_unread_uids(mail) -> list[bytes]:
+    """获取未读的审批相关邮件 UID（主题包含 appr_）"""
     mail.select("INBOX")
-    # 只搜索主题包含 appr_ 的未读邮件
-    _, message_numbers = mail.search(None, 'UNSEEN', 'SUBJECT', 'appr_')
-    return message_numbers[0].split()
-
-
-def parse_email(mail, num):
-    """解析邮件内容"""
-    _, msg_data = mail.fetch(num, "(RFC822)")
-    email_body = msg_data[0][1]
-    msg = email.message_from_bytes(email_body)
-
-    subject = msg["Subject"] or ""
-    from_addr = msg["From"] or ""
-
-    # 获取邮件正文
-    body = ""
-    if msg.is_multipart():
-        for part in msg.walk():
-            if part.get_content_type() == "text/plain":
-                body = part.get_payload(decode=True).decode("utf-8", errors="ignore")
+    # 只搜索主题包含 appr_ 的未读邮件；UID 在会话间稳定，可安全批量 FETCH/STORE
+    _, data = mail.uid("SEARCH", None, "UNSEEN", "SUBJECT", "appr_")
+    return data[0].split() if data and data[0] else []
+
+
+def _tokenize_sexp(data: bytes) -> list:
+    """把 IMAP 括号表达式（如 BODYSTRUCTURE）解析为嵌套列表"""
+    stack: list[list] = [[]]
+    i = 0
+    n = len(data)
+    while i < n:
+        ch = data[i:i + 1]
+        if ch in b" \r\n":
+            i += 1
+        elif ch == b"(":
+            stack.append([])
+            i += 1
+        elif ch == b")":
+            if len(stack) == 1:
                 break
-    else:
-        body = msg.get_payload(decode=True).decode("utf-8", errors="ignore")
+            item = stack.pop()
+            stack[-1].append(item)
+            i += 1
+        elif ch == b'"':
+            j = i + 1
+            buf = bytearray()
+            while j < n and data[j:j + 1] != b'"':
+                if data[j:j + 1] == b"\\":
+                    j += 1
+                buf += data[j:j + 1]
+                j += 1
+            stack[-1].append(buf.decode("utf-8", errors="ignore"))
+            i = j + 1
+        else:
+            j = i
+            while j < n and data[j:j + 1] not in b" ()\r\n":
+                j += 1
+            atom = data[i:j].decode("ascii", errors="ignore")
+            stack[-1].append(None if atom.upper() == "NIL" else atom)
+            i = j
+    while len(stack) > 1:
+        item = stack.pop()
+        stack[-1].append(item)
+    return stack[0]
+
+
+def find_text_plain_part(structure, prefix: str = "") -> tuple[str, str, str] | None:
+    """在 BODYSTRUCTURE 中查找第一个 text/plain 部分
+
+    返回 (part 编号, 传输编码, 字符集)，未找到时返回 None。
+    """
+    if not isinstance(structure, list) or not structure:
+        return None
+    if isinstance(structure[0], list):
+        # multipart：子部分依次编号 1..n，最后是 subtype 等扩展字段
+        index = 0
+        for child in structure:
+            if not isinstance(child, list):
+                break
+            index += 1
+            part = f"{prefix}.{index}" if prefix else str(index)
+            found = find_text_plain_part(child, part)
+            if found:
+                return found
+        return None
+    if len(structure) < 6:
+        return None
+    media_type = str(structure[0] or "").lower()
+    subtype = str(structure[1] or "").lower()
+    if media_type != "text" or subtype != "plain":
+        return None
+    params = structure[2] if isinstance(structure[2], list) else []
+    charset = "utf-8"
+    for key, value in zip(params[::2], params[1::2]):
+        if str(key).lower() == "charset" and value:
+            charset = str(value)
+    encoding = str(structure[5] or "7bit").lower()
+    # 非 multipart 邮件的正文在 IMAP 中编号为 1
+    return prefix or "1", encoding, charset
+
+
+def decode_partial_body(raw: bytes, encoding: str, charset: str) -> str:
+    """解码截断后的正文片段（base64 需对齐到 4 字节边界）"""
+    if encoding == "base64":
+        compact = b"".join(raw.split())
+        compact = compact[: len(compact) - len(compact) % 4]
+        try:
+            raw = base64.b64decode(compact)
+        except (binascii.Error, ValueError):
+            raw = b""
+    elif encoding == "quoted-printable":
+        raw = quopri.decodestring(raw)
+    try:
+        return raw.decode(charset, errors="ignore")
+    except LookupError:
+        return raw.decode("utf-8", errors="ignore")
+
+
+def _fetch_items(data) -> list[tuple[bytes, bytes | None]]:
+    """把 imaplib FETCH 响应整理为 (响应元数据, literal) 列表
+
+    literal 之后的剩余字段（如排在 BODY[...] 之后的 BODYSTRUCTURE）
+    会以独立的 bytes 返回，这里把它们拼回所属邮件的元数据。
+    """
+    items: list[list] = []
+    for entry in data or []:
+        if isinstance(entry, tuple):
+            items.append([entry[0], entry[1]])
+        elif isinstance(entry, bytes):
+            if items and not FETCH_START_RE.match(entry):
+                items[-1][0] += entry
+            elif entry.strip():
+                items.append([entry, None])
+    return [(prefix, literal) for prefix, literal in items]
+
+
+def fetch_emails(mail, uids: list[bytes]) -> list[tuple[bytes, str, str, str]]:
+    """批量获取邮件的头部和第一个 text/plain 部分（最多 BODY_MAX_BYTES 字节）
+
+    第一轮 FETCH 只取 BODYSTRUCTURE 和 Subject/From 头部；
+    第二轮按 part 编号分组，用 BODY.PEEK[part]<0.N> 取正文前 N 个字节，
+    附件和引用的长邮件不会被下载。
+    """
+    results = []
+    for start in range(0, len(uids), FETCH_BATCH_SIZE):
+        batch = uids[start:start + FETCH_BATCH_SIZE]
+        uid_set = b",".join(batch).decode()
+        _, data = mail.uid(
+            "FETCH", uid_set, "(UID BODYSTRUCTURE BODY.PEEK[HEADER.FIELDS (SUBJECT FROM)])"
+        )
 
-    return subject, from_addr, body
+        headers: dict[bytes, tuple[str, str]] = {}
+        parts: dict[bytes, tuple[str, str, str]] = {}
+        for prefix, literal in _fetch_items(data):
+            match = UID_RE.search(prefix)
+            if not match:
+                continue
+            uid = match.group(1)
+            msg = email.message_from_bytes(literal or b"")
+            headers[uid] = (msg["Subject"] or "", msg["From"] or "")
+            bs_match = BODYSTRUCTURE_RE.search(prefix)
+            part = None
+            if bs_match:
+                structure = _tokenize_sexp(prefix[bs_match.end():])
+                part = find_text_plain_part(structure[0] if structure else None)
+            parts[uid] = part or ("1", "7bit", "utf-8")
+
+        by_part: dict[str, list[bytes]] = {}
+        for uid, (part, _, _) in parts.items():
+            by_part.setdefault(part, []).append(uid)
+
+        bodies: dict[bytes, bytes] = {}
+        for part, part_uids in by_part.items():
+            _, data = mail.uid(
+                "FETCH",
+                b",".join(part_uids).decode(),
+                f"(UID BODY.PEEK[{part}]<0.{BODY_MAX_BYTES}>)",
+            )
+            for prefix, literal in _fetch_items(data):
+                match = UID_RE.search(prefix)
+                if match and literal is not None:
+                    bodies[match.group(1)] = literal
+
+        for uid in batch:
+            if uid not in headers:
+                continue
+            subject, from_addr = headers[uid]
+            _, encoding, charset = parts[uid]
+            body = decode_partial_body(bodies.get(uid, b""), encoding, charset)
+            results.append((uid, subject, from_addr, body))
+    return results
+
+
+def mark_seen(mail, uids: list[bytes]) -> None:
+    """用一次 UID STORE 把所有已处理邮件标记为已读"""
+    if uids:
+        mail.uid("STORE", b",".join(uids).decode(), "+FLAGS", "(\\Seen)")
 
 
 def extract_approval_id(text: str) -> str | None:
@@ -112,9 +275,8 @@ def extract_email_address(from_header: str) -> str:
     return from_header.strip().lower()
 
 
-def process_email(mail, num):
+def process_email(subject: str, from_addr: str, body: str):
     """处理单封邮件"""
-    subject, from_addr, body = parse_email(mail, num)
 
     # 安全检查：验证发件人
     sender_email = extract_email_address(from_addr)
@@ -156,14 +318,16 @@ def main():
     while True:
         try:
             mail = connect_imap()
-            unread = get_unread_emails(mail)
+            unread = get_unread_uids(mail)
 
             if unread:
                 print(f"[Gmail] Found {len(unread)} unread emails")
-                for num in unread:
-                    process_email(mail, num)
-                    # 标记为已读
-                    mail.store(num, "+FLAGS", "\\Seen")
+                processed = []
+                for uid, subject, from_addr, body in fetch_emails(mail, unread):
+                    process_email(subject, from_addr, body)
+                    processed.append(uid)
+                # 标记为已读
+                mark_seen(mail, processed)
 
             mail.logout()
         except Exception as e:
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Print the latency breakdown of one approval from exported spans.
+
+    python scripts/trace_breakdown.py appr_xxx --file traces.jsonl
+"""
+
+import argparse
+import sys
+
+from agent_approval_gate.tracing import approval_breakdown, load_spans
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Reconstruct an approval's latency breakdown.")
+    parser.add_argument("approval_id")
+    parser.add_argument("--file", default="traces.jsonl")
+    args = parser.parse_args()
+
+    rows = approval_breakdown(load_spans(args.file), args.approval_id)
+    if not rows:
+        print(f"No spans found for {args.approval_id}", file=sys.stderr)
+        return 1
+    for row in rows:
+        status = "" if row["status"] == "ok" else f"  [{row['status']}]"
+        print(f"{row['offset_ms']:>12.1f} ms  {row['duration_ms']:>10.1f} ms  {row['name']}{status}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
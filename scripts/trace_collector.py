@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+OTLP/HTTP JSON collector stand-in: receives spans at /v1/traces and appends
+them to a JSONL file in the same format as TRACE_EXPORTER=jsonl.
+
+    python scripts/trace_collector.py --port 4318 --out traces.jsonl
+"""
+
+import argparse
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def _attr_value(value: dict):
+    if "stringValue" in value:
+        return value["stringValue"]
+    if "intValue" in value:
+        return int(value["intValue"])
+    if "doubleValue" in value:
+        return float(value["doubleValue"])
+    if "boolValue" in value:
+        return bool(value["boolValue"])
+    return None
+
+
+def otlp_to_spans(payload: dict) -> list[dict]:
+    spans = []
+    for resource_spans in payload.get("resourceSpans", []):
+        for scope_spans in resource_spans.get("scopeSpans", []):
+            for span in scope_spans.get("spans", []):
+                spans.append({
+                    "name": span.get("name", ""),
+                    "trace_id": span.get("traceId", ""),
+                    "span_id": span.get("spanId", ""),
+                    "parent_id": span.get("parentSpanId") or None,
+                    "start_ns": int(span.get("startTimeUnixNano", 0)),
+                    "end_ns": int(span.get("endTimeUnixNano", 0)),
+                    "status": "error" if span.get("status", {}).get("code") == 2 else "ok",
+                    "attributes": {
+                        attr["key"]: _attr_value(attr.get("value", {}))
+                        for attr in span.get("attributes", [])
+                    },
+                })
+    return spans
+
+
+def make_handler(out_path: str):
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path != "/v1/traces":
+                self.send_response(404)
+                self.end_headers()
+                return
+            length = int(self.headers.get("Content-Length", "0"))
+            try:
+                spans = otlp_to_spans(json.loads(self.rfile.read(length) or b"{}"))
+            except (ValueError, TypeError):
+                self.send_response(400)
+                self.end_headers()
+                return
+            with lock, open(out_path, "a", encoding="utf-8") as fh:
+                for span in spans:
+                    fh.write(json.dumps(span, ensure_ascii=False) + "\n")
+            body = b"{}"
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Minimal OTLP/HTTP JSON trace collector.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4318)
+    parser.add_argument("--out", default="traces.jsonl")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args.out))
+    print(f"[Collector] Listening on http://{args.host}:{args.port}/v1/traces -> {args.out}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,9 @@
 import hmac
 import hashlib
-import smtplib
 from dataclasses import dataclass
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
 from urllib.parse import quote
 
+from agent_approval_gate import metrics
 from agent_approval_gate.config import get_settings
 from agent_approval_gate.decision import MENU_TEXT
 from agent_approval_gate.utils import format_expires_at
@@ -170,6 +168,11 @@ class EmailAdapter:
         self.use_ssl = settings.email_use_ssl
 
     def _send(self, approval, options: list | None = None) -> EmailSendResult:
+        # Imported here: most deployments never send mail, so the API should not load them.
+        import smtplib
+        from email.mime.multipart import MIMEMultipart
+        from email.mime.text import MIMEText
+
         subject = build_email_subject(approval)
         text_body = build_email_body(approval)
         to_addr = str(approval.target.get("email_to"))
@@ -186,18 +189,19 @@ class EmailAdapter:
         html_part = MIMEText(html_body, "html", "utf-8")
         message.attach(html_part)
 
-        if self.use_ssl:
-            smtp = smtplib.SMTP_SSL(self.smtp_host, self.smtp_port, timeout=60)
-        else:
-            smtp = smtplib.SMTP(self.smtp_host, self.smtp_port, timeout=60)
-        try:
-            if self.use_tls and not self.use_ssl:
-                smtp.starttls()
-            if self.username and self.password:
-                smtp.login(self.username, self.password)
-            smtp.send_message(message)
-        finally:
-            smtp.quit()
+        with metrics.track_send("email", "question" if options else "approval"):
+            if self.use_ssl:
+                smtp = smtplib.SMTP_SSL(self.smtp_host, self.smtp_port, timeout=60)
+            else:
+                smtp = smtplib.SMTP(self.smtp_host, self.smtp_port, timeout=60)
+            try:
+                if self.use_tls and not self.use_ssl:
+                    smtp.starttls()
+                if self.username and self.password:
+                    smtp.login(self.username, self.password)
+                smtp.send_message(message)
+            finally:
+                smtp.quit()
 
         return EmailSendResult(subject=subject, to_addr=to_addr)
 
@@ -2,8 +2,7 @@ import html
 import json
 from dataclasses import dataclass
 
-import httpx
-
+from agent_approval_gate import metrics
 from agent_approval_gate.config import get_settings
 from agent_approval_gate.decision import MENU_TEXT
 from agent_approval_gate.i18n import t
@@ -86,7 +85,9 @@ class TelegramAdapter:
             "parse_mode": "HTML",
             "reply_markup": json.dumps(build_inline_keyboard(approval.approval_id)),
         }
-        with httpx.Client(timeout=10) as client:
+        import httpx
+
+        with metrics.track_send("telegram", "approval"), httpx.Client(timeout=10) as client:
             response = client.post(url, data=payload)
             response.raise_for_status()
         return TelegramSendResult(message_text=message_text, chat_id=chat_id, mock=False)
@@ -119,7 +120,9 @@ class TelegramAdapter:
             "parse_mode": "HTML",
             "reply_markup": json.dumps(build_question_keyboard(approval.approval_id, options)),
         }
-        with httpx.Client(timeout=10) as client:
+        import httpx
+
+        with metrics.track_send("telegram", "question"), httpx.Client(timeout=10) as client:
             response = client.post(url, data=payload)
             response.raise_for_status()
         return TelegramSendResult(message_text=message_text, chat_id=chat_id, mock=False)
@@ -1,27 +1,151 @@
+"""API key authentication.
+
+Keys come from ``APPROVAL_API_KEYS`` (full access) and from the
+``api_keys`` table (SHA-256 digests with scopes and expiry, managed with
+``python -m agent_approval_gate.keys``). The registry holds an immutable
+map from digest to key record, so a request costs one hash and one dict
+lookup and the presented secret is never compared directly. The map is
+rebuilt from the table every ``API_KEY_RELOAD_SEC`` and on an unknown key
+(at most once a second), so keys created, rotated or revoked by any
+worker take effect everywhere without a restart.
+"""
+
+import datetime as dt
+import functools
 import hashlib
+import threading
+import time
+from dataclasses import dataclass
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
 
 from agent_approval_gate.config import get_settings
+from agent_approval_gate.database import get_db
+from agent_approval_gate.models import ApiKey
 
 bearer = HTTPBearer()
 
+SCOPES = ("approvals", "stats", "admin")
+ALL_SCOPES = "*"
+MISS_RELOAD_INTERVAL_SEC = 1.0
+
+
+@dataclass(frozen=True)
+class KeyRecord:
+    key_id: str
+    client_id: str
+    name: str
+    scopes: frozenset[str]
+    expires_at: dt.datetime | None = None
+
+    def allows(self, scope: str) -> bool:
+        return ALL_SCOPES in self.scopes or scope in self.scopes
+
+
+def hash_key(api_key: str) -> str:
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
 
 def api_key_to_client_id(api_key: str) -> str:
-    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12]
+    return hash_key(api_key)[:12]
+
+
+class KeyRegistry:
+    def __init__(self) -> None:
+        self._keys: dict[str, KeyRecord] = {}
+        self._loaded_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def load(self, db: Session) -> None:
+        keys = {}
+        for api_key in get_settings().api_keys:
+            digest = hash_key(api_key)
+            keys[digest] = KeyRecord(
+                key_id=f"env_{digest[:8]}",
+                client_id=digest[:12],
+                name="APPROVAL_API_KEYS",
+                scopes=frozenset({ALL_SCOPES}),
+            )
+        try:
+            rows = db.execute(select(ApiKey).where(ApiKey.revoked_at.is_(None))).scalars().all()
+        except SQLAlchemyError:
+            # api_keys does not exist until init_db has run.
+            db.rollback()
+            rows = []
+        for row in rows:
+            keys[row.key_hash] = KeyRecord(
+                key_id=row.key_id,
+                client_id=row.client_id,
+                name=row.name,
+                scopes=frozenset(row.scopes),
+                expires_at=row.expires_at,
+            )
+        self._keys = keys
+        self._loaded_at = time.monotonic()
+
+    def _reload_if_older(self, db: Session, max_age: float) -> None:
+        if time.monotonic() - self._loaded_at < max_age:
+            return
+        # One reload at a time; other requests keep using the current map.
+        if self._lock.acquire(blocking=False):
+            try:
+                self.load(db)
+            finally:
+                self._lock.release()
+
+    def lookup(self, api_key: str, db: Session) -> KeyRecord | None:
+        digest = hash_key(api_key)
+        self._reload_if_older(db, get_settings().api_key_reload_sec)
+        record = self._keys.get(digest)
+        if record is None:
+            self._reload_if_older(db, MISS_RELOAD_INTERVAL_SEC)
+            record = self._keys.get(digest)
+        return record
+
+    def invalidate(self) -> None:
+        self._loaded_at = float("-inf")
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+registry = KeyRegistry()
+
+
+def authorize(api_key: str, db: Session, scope: str) -> str:
+    record = registry.lookup(api_key, db)
+    if record is None:
+        if not len(registry):
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="No API keys configured",
+            )
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid API key")
+    if record.expires_at is not None and record.expires_at <= dt.datetime.utcnow():
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="API key expired")
+    if not record.allows(scope):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=f"API key lacks scope: {scope}")
+    return record.client_id
+
+
+@functools.lru_cache()
+def require_scope(scope: str):
+    # One dependency per scope, so FastAPI authorizes a request once however many dependencies ask.
+    def dependency(
+        credentials: HTTPAuthorizationCredentials = Depends(bearer),
+        db=Depends(get_db),
+    ) -> str:
+        return authorize(credentials.credentials, db, scope)
+
+    return dependency
 
 
 def get_client_id(
     credentials: HTTPAuthorizationCredentials = Depends(bearer),
+    db=Depends(get_db),
 ) -> str:
-    settings = get_settings()
-    if not settings.api_keys:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="No API keys configured",
-        )
-    api_key = credentials.credentials
-    if api_key not in settings.api_keys:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid API key")
-    return api_key_to_client_id(api_key)
+    return authorize(credentials.credentials, db, "approvals")
@@ -8,7 +8,10 @@ from dotenv import load_dotenv
 @dataclass(frozen=True)
 class Settings:
     database_url: str
+    storage_backend: str  # "sql" | "memory" (approvals, allow rules and session allows in process memory)
+    sqlite_journal_mode: str | None  # e.g. "wal"; None keeps the SQLite default
     api_keys: list[str]
+    api_key_reload_sec: float  # how often the key registry re-reads the api_keys table
     telegram_bot_token: str | None
     telegram_api_base: str
     telegram_mock: bool
@@ -22,6 +25,31 @@ class Settings:
     email_use_ssl: bool
     public_url: str | None  # 公网 URL，用于邮件按钮回调
     action_sign_key: str | None  # HMAC key for signing email action URLs
+    trace_exporter: str  # "" (disabled) | "jsonl" | "otlp"
+    trace_file: str
+    trace_otlp_endpoint: str
+    notify_backend: str  # "inprocess" | "sqlite" (one extra write per decision) | "unix"
+    notify_sqlite_path: str
+    notify_socket_path: str
+    archive_after_days: float  # 0 disables archival of terminal approvals
+    archive_interval_sec: float
+    archive_batch_size: int
+    coalesce_pending: bool  # identical pending requests share one approval
+    idempotency_ttl_sec: int  # how long an Idempotency-Key replays the original response
+    status_cache_size: int  # terminal approval responses kept in memory; 0 disables
+    fast_responses: bool  # hot endpoints encode JSON directly instead of via response_model
+    rate_limit_client_per_min: float  # approval creations per client; 0 disables
+    rate_limit_session_per_min: float  # approval creations per session; 0 disables
+    rate_limit_backend: str  # "memory" (per process) | "db" (shared through the database)
+    max_pending_per_session: int  # outstanding pending approvals per session; 0 disables
+    telegram_dedup_backend: str  # "memory" (per process) | "db" (also claimed in telegram_updates)
+    telegram_dedup_capacity: int  # webhook update ids remembered per process
+    telegram_dedup_window_sec: float  # how long a webhook update id is remembered
+    shard_dir: str | None  # per-client SQLite files live here; None keeps every client in DATABASE_URL
+    shard_max_open: int  # shard engines kept open (least recently used are disposed)
+    write_batch_window_ms: float  # group commit: how long the writer collects writes; 0 commits per request
+    write_batch_max: int  # group commit: most writes per transaction
+    debug_sql_headers: bool  # return per-request SQL statement and commit counts as response headers
 
 
 @lru_cache()
@@ -36,7 +64,10 @@ def get_settings() -> Settings:
 
     return Settings(
         database_url=os.getenv("DATABASE_URL", "sqlite:///./data.db"),
+        storage_backend=os.getenv("STORAGE_BACKEND", "sql").lower(),
+        sqlite_journal_mode=(os.getenv("SQLITE_JOURNAL_MODE") or "").lower() or None,
         api_keys=api_keys,
+        api_key_reload_sec=float(os.getenv("API_KEY_RELOAD_SEC", "5")),
         telegram_bot_token=os.getenv("TELEGRAM_BOT_TOKEN"),
         telegram_api_base=os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org"),
         telegram_mock=telegram_mock,
@@ -50,4 +81,29 @@ def get_settings() -> Settings:
         email_use_ssl=email_use_ssl,
         public_url=os.getenv("PUBLIC_URL"),  # e.g., https://your-vps.com
         action_sign_key=os.getenv("ACTION_SIGN_KEY"),  # For signing email action URLs
+        trace_exporter=os.getenv("TRACE_EXPORTER", "").lower(),
+        trace_file=os.getenv("TRACE_FILE", "./traces.jsonl"),
+        trace_otlp_endpoint=os.getenv("TRACE_OTLP_ENDPOINT", "http://127.0.0.1:4318/v1/traces"),
+        notify_backend=os.getenv("NOTIFY_BACKEND", "inprocess").lower(),
+        notify_sqlite_path=os.getenv("NOTIFY_SQLITE_PATH", "./notify.db"),
+        notify_socket_path=os.getenv("NOTIFY_SOCKET_PATH", "/tmp/approval-gate-notify.sock"),
+        archive_after_days=float(os.getenv("ARCHIVE_AFTER_DAYS", "0")),
+        archive_interval_sec=float(os.getenv("ARCHIVE_INTERVAL_SEC", "3600")),
+        archive_batch_size=int(os.getenv("ARCHIVE_BATCH_SIZE", "500")),
+        coalesce_pending=os.getenv("COALESCE_PENDING", "0").lower() in {"1", "true", "yes"},
+        idempotency_ttl_sec=int(os.getenv("IDEMPOTENCY_TTL_SEC", "86400")),
+        status_cache_size=int(os.getenv("STATUS_CACHE_SIZE", "10000")),
+        fast_responses=os.getenv("FAST_RESPONSES", "0").lower() in {"1", "true", "yes"},
+        rate_limit_client_per_min=float(os.getenv("RATE_LIMIT_CLIENT_PER_MIN", "0")),
+        rate_limit_session_per_min=float(os.getenv("RATE_LIMIT_SESSION_PER_MIN", "0")),
+        rate_limit_backend=os.getenv("RATE_LIMIT_BACKEND", "memory").lower(),
+        max_pending_per_session=int(os.getenv("MAX_PENDING_PER_SESSION", "0")),
+        telegram_dedup_backend=os.getenv("TELEGRAM_DEDUP_BACKEND", "memory").lower(),
+        telegram_dedup_capacity=int(os.getenv("TELEGRAM_DEDUP_CAPACITY", "10000")),
+        telegram_dedup_window_sec=float(os.getenv("TELEGRAM_DEDUP_WINDOW_SEC", "86400")),
+        shard_dir=os.getenv("SHARD_DIR") or None,
+        shard_max_open=int(os.getenv("SHARD_MAX_OPEN", "32")),
+        write_batch_window_ms=float(os.getenv("WRITE_BATCH_WINDOW_MS", "0")),
+        write_batch_max=int(os.getenv("WRITE_BATCH_MAX", "64")),
+        debug_sql_headers=os.getenv("DEBUG_SQL_HEADERS", "0").lower() in {"1", "true", "yes"},
     )
@@ -1,44 +1,153 @@
-from sqlalchemy import create_engine
+import contextlib
+import threading
+import uuid
+
+from sqlalchemy import create_engine, event
 from sqlalchemy.pool import StaticPool
-from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
 
+from agent_approval_gate import metrics
 from agent_approval_gate.config import get_settings
 
 Base = declarative_base()
 
+SQLITE_JOURNAL_MODES = {"delete", "truncate", "persist", "memory", "wal", "off"}
+SQLITE_MEMORY_URLS = {"sqlite://", "sqlite:///:memory:"}
+
+
+def _set_journal_mode(engine, mode: str) -> None:
+    if mode not in SQLITE_JOURNAL_MODES:
+        raise ValueError(f"unsupported SQLITE_JOURNAL_MODE: {mode}")
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA journal_mode={mode}")
+        cursor.close()
+
 
 def get_engine():
     settings = get_settings()
     connect_args = {}
     if settings.database_url.startswith("sqlite"):
         connect_args = {"check_same_thread": False}
-        if settings.database_url in {"sqlite://", "sqlite:///:memory:"}:
+        if settings.database_url in SQLITE_MEMORY_URLS:
+            import sqlite3
+
+            # The memdb VFS (SQLite >= 3.36) lets every pooled connection in this process
+            # open the same in-memory database with normal file locking.
+            if sqlite3.sqlite_version_info >= (3, 36, 0):
+                url = f"sqlite:///file:/approval_gate_{uuid.uuid4().hex}?vfs=memdb&uri=true"
+                return create_engine(url, connect_args=connect_args, future=True)
             return create_engine(
                 settings.database_url,
                 connect_args=connect_args,
                 poolclass=StaticPool,
                 future=True,
             )
-    return create_engine(settings.database_url, connect_args=connect_args, future=True)
+    engine = create_engine(settings.database_url, connect_args=connect_args, future=True)
+    if settings.sqlite_journal_mode and settings.database_url.startswith("sqlite"):
+        _set_journal_mode(engine, settings.sqlite_journal_mode)
+    return engine
+
+
+def get_session_local(engine=None):
+    engine = engine or get_engine()
+    # Rows keep their values after a commit: service writes every column it changes, so re-reading is waste.
+    return sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine, future=True)
+
+
+def serialize_transactions(session_local) -> None:
+    """Let one session from ``session_local`` at a time have a transaction open.
+
+    Without memdb, in-memory SQLite runs on a single shared connection
+    (``StaticPool``); sessions must take turns on it or concurrent requests
+    corrupt each other's transactions. The turn lasts from a session's first
+    statement to its commit, rollback or close, not for the whole request,
+    and may end on another thread than it began.
+    """
+    lock = threading.Lock()
+
+    def begin(session, transaction) -> None:
+        if transaction.parent is None:
+            lock.acquire()
+
+    def end(session, transaction) -> None:
+        if transaction.parent is None:
+            lock.release()
 
+    event.listen(session_local, "after_transaction_create", begin)
+    event.listen(session_local, "after_transaction_end", end)
 
-def get_session_local():
-    engine = get_engine()
-    return sessionmaker(autocommit=False, autoflush=False, bind=engine, future=True)
 
+_engine = None
+_session_local = None
+_bind_lock = threading.Lock()
 
-SessionLocal = get_session_local()
+
+def _bind():
+    """Create the process-wide engine and session factory on first use."""
+    global _engine, _session_local
+    if _session_local is None:
+        with _bind_lock:
+            if _session_local is None:
+                engine = get_engine()
+                metrics.bind_pool(engine)
+                session_local = get_session_local(engine)
+                if isinstance(engine.pool, StaticPool):
+                    serialize_transactions(session_local)
+                _engine = engine
+                _session_local = session_local
+    return _engine, _session_local
+
+
+def __getattr__(name: str):
+    # ``engine`` and ``SessionLocal`` are built lazily so importing the app, or a
+    # CLI that never opens the database, does not pay for engine setup.
+    if name == "engine":
+        return _bind()[0]
+    if name == "SessionLocal":
+        return _bind()[1]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def init_db() -> None:
+    # Use the engine bound to SessionLocal so in-memory databases share tables.
+    engine, _ = _bind()
+    init_schema(engine)
+
+
+def init_schema(engine) -> None:
+    """Create missing tables on ``engine`` and apply pending migrations."""
     from agent_approval_gate import models  # noqa: F401
+    from agent_approval_gate.migrations import migrate
 
-    engine = get_engine()
-    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        if engine.dialect.name == "sqlite":
+            # Only takes effect on a new file; lets retention reclaim pages incrementally.
+            conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+        Base.metadata.create_all(bind=conn)
+        migrate(conn)
 
 
 def get_db():
-    db = SessionLocal()
+    _, session_local = _bind()
+    db = session_local()
+    metrics.DB_SESSIONS_IN_USE.inc()
+    try:
+        yield db
+    finally:
+        db.close()
+        metrics.DB_SESSIONS_IN_USE.dec()
+
+
+@contextlib.contextmanager
+def detached_session(bind):
+    """A fresh session on ``bind`` for work that outlives the request, e.g. background tasks.
+
+    Pass ``db.get_bind()`` of the request's session so the work hits the same database.
+    """
+    db = Session(bind=bind, autoflush=False)
     try:
         yield db
     finally:
@@ -0,0 +1,85 @@
+"""``Idempotency-Key`` support for ``POST /v1/approvals``.
+
+The key row is written in the same transaction as the approval it
+produced. A retry either finds the row and replays the original response,
+or, when two copies of the request race, loses on the unique constraint
+and then replays; either way there is one approval and one notification.
+Keys live for ``IDEMPOTENCY_TTL_SEC``; the retention pass purges expired
+rows.
+"""
+
+import datetime as dt
+import hashlib
+import json
+
+from fastapi import HTTPException
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+from agent_approval_gate.config import get_settings
+from agent_approval_gate.models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+
+
+class KeyInUse(Exception):
+    """Another request committed the same key first."""
+
+
+def utcnow() -> dt.datetime:
+    return dt.datetime.utcnow()
+
+
+def request_hash(payload: dict) -> str:
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def lookup(db: Session, client_id: str, key: str, payload_hash: str) -> IdempotencyKey | None:
+    """The live record for ``key``, or None if the key is new or has expired."""
+    stmt = select(IdempotencyKey).where(IdempotencyKey.client_id == client_id, IdempotencyKey.key == key)
+    record = db.execute(stmt).scalars().first()
+    if record is None:
+        return None
+    if record.expires_at <= utcnow():
+        db.delete(record)
+        db.commit()
+        return None
+    if record.request_hash != payload_hash:
+        raise HTTPException(status_code=422, detail="Idempotency-Key reused with a different request")
+    return record
+
+
+def claim(db: Session, client_id: str, key: str, payload_hash: str, approval_id: str, auto: bool) -> None:
+    """Stage the key row; committed together with the approval."""
+    now = utcnow()
+    db.add(
+        IdempotencyKey(
+            client_id=client_id,
+            key=key,
+            request_hash=payload_hash,
+            approval_id=approval_id,
+            auto=auto,
+            created_at=now,
+            expires_at=now + dt.timedelta(seconds=get_settings().idempotency_ttl_sec),
+        )
+    )
+
+
+def release(db: Session, client_id: str, key: str) -> None:
+    """Forget ``key`` so a retry creates and sends again (the first send failed)."""
+    db.rollback()
+    db.execute(delete(IdempotencyKey).where(IdempotencyKey.client_id == client_id, IdempotencyKey.key == key))
+    db.commit()
+
+
+def purge_expired(db: Session, limit: int = 500) -> int:
+    ids = db.execute(
+        select(IdempotencyKey.id).where(IdempotencyKey.expires_at <= utcnow()).limit(limit)
+    ).scalars().all()
+    if ids:
+        db.execute(delete(IdempotencyKey).where(IdempotencyKey.id.in_(ids)))
+        db.commit()
+    return len(ids)
@@ -0,0 +1,150 @@
+"""Manage API keys stored in the ``api_keys`` table.
+
+Only the SHA-256 digest of a key is stored; the secret is printed once
+when the key is created. Rotation issues a new key for the same client
+and scopes and lets the old one keep working for a grace period, so
+agents can be switched over without a restart on either side::
+
+    python -m agent_approval_gate.keys create --name laptop --scopes approvals stats
+    python -m agent_approval_gate.keys rotate key_ab12cd34 --grace-sec 3600
+    python -m agent_approval_gate.keys revoke key_ab12cd34
+    python -m agent_approval_gate.keys list
+"""
+
+import argparse
+import datetime as dt
+import secrets
+import sys
+
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from agent_approval_gate.auth import ALL_SCOPES, SCOPES, hash_key, registry
+from agent_approval_gate.models import ApiKey
+
+SECRET_PREFIX = "agk_"
+
+
+def _check_scopes(scopes: list[str]) -> list[str]:
+    unknown = sorted(set(scopes) - set(SCOPES) - {ALL_SCOPES})
+    if unknown or not scopes:
+        raise HTTPException(status_code=422, detail=f"Unknown or empty scopes: {unknown}")
+    return sorted(set(scopes))
+
+
+def store_key(
+    db: Session,
+    secret: str,
+    name: str,
+    scopes: list[str],
+    client_id: str | None = None,
+    expires_at: dt.datetime | None = None,
+) -> ApiKey:
+    digest = hash_key(secret)
+    row = ApiKey(
+        key_id=f"key_{secrets.token_hex(4)}",
+        key_hash=digest,
+        # Same derivation as APPROVAL_API_KEYS, so importing an env key keeps its approvals.
+        client_id=client_id or digest[:12],
+        name=name,
+        scopes=_check_scopes(scopes),
+        expires_at=expires_at,
+    )
+    db.add(row)
+    db.commit()
+    db.refresh(row)
+    registry.invalidate()
+    return row
+
+
+def create_key(
+    db: Session,
+    name: str,
+    scopes: list[str],
+    client_id: str | None = None,
+    expires_at: dt.datetime | None = None,
+) -> tuple[ApiKey, str]:
+    secret = SECRET_PREFIX + secrets.token_urlsafe(32)
+    return store_key(db, secret, name, scopes, client_id, expires_at), secret
+
+
+def _get_key(db: Session, key_id: str) -> ApiKey:
+    row = db.execute(select(ApiKey).where(ApiKey.key_id == key_id)).scalar_one_or_none()
+    if row is None or row.revoked_at is not None:
+        raise HTTPException(status_code=404, detail="API key not found")
+    return row
+
+
+def rotate_key(db: Session, key_id: str, grace_sec: int = 0) -> tuple[ApiKey, str]:
+    old = _get_key(db, key_id)
+    now = dt.datetime.utcnow()
+    if grace_sec > 0:
+        expires_at = now + dt.timedelta(seconds=grace_sec)
+        if old.expires_at is None or old.expires_at > expires_at:
+            old.expires_at = expires_at
+    else:
+        old.revoked_at = now
+    return create_key(db, old.name, list(old.scopes), client_id=old.client_id)
+
+
+def revoke_key(db: Session, key_id: str) -> ApiKey:
+    row = _get_key(db, key_id)
+    row.revoked_at = dt.datetime.utcnow()
+    db.commit()
+    registry.invalidate()
+    return row
+
+
+def list_keys(db: Session) -> list[ApiKey]:
+    return list(db.execute(select(ApiKey).order_by(ApiKey.created_at, ApiKey.id)).scalars())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Manage API keys stored in the database.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    create = sub.add_parser("create", help="create a key and print its secret once")
+    create.add_argument("--name", default="")
+    create.add_argument("--scopes", nargs="+", default=[ALL_SCOPES], choices=[*SCOPES, ALL_SCOPES])
+    create.add_argument("--client-id", help="share approvals and rules with an existing client")
+    imported = sub.add_parser("import", help="store an existing secret (read from stdin) as a hashed key")
+    imported.add_argument("--name", default="")
+    imported.add_argument("--scopes", nargs="+", default=[ALL_SCOPES], choices=[*SCOPES, ALL_SCOPES])
+    rotate = sub.add_parser("rotate", help="replace a key, keeping its client and scopes")
+    rotate.add_argument("key_id")
+    rotate.add_argument("--grace-sec", type=int, default=0, help="keep the old key valid this long")
+    revoke = sub.add_parser("revoke", help="disable a key")
+    revoke.add_argument("key_id")
+    sub.add_parser("list", help="list keys (never secrets)")
+    args = parser.parse_args()
+
+    from agent_approval_gate.database import SessionLocal, init_db
+
+    init_db()
+    db = SessionLocal()
+    try:
+        if args.command == "create":
+            row, secret = create_key(db, args.name, args.scopes, client_id=args.client_id)
+            print(f"[Keys] Created {row.key_id} for client {row.client_id}: {secret}", flush=True)
+        elif args.command == "import":
+            row = store_key(db, sys.stdin.readline().strip(), args.name, args.scopes)
+            print(f"[Keys] Imported {row.key_id} for client {row.client_id}", flush=True)
+        elif args.command == "rotate":
+            row, secret = rotate_key(db, args.key_id, args.grace_sec)
+            print(f"[Keys] Rotated {args.key_id} -> {row.key_id}: {secret}", flush=True)
+        elif args.command == "revoke":
+            revoke_key(db, args.key_id)
+            print(f"[Keys] Revoked {args.key_id}", flush=True)
+        else:
+            for row in list_keys(db):
+                state = "revoked" if row.revoked_at else f"expires {row.expires_at:%Y-%m-%d %H:%M}" if row.expires_at else "active"
+                print(f"{row.key_id}\t{row.client_id}\t{','.join(row.scopes)}\t{state}\t{row.name}")
+    except HTTPException as exc:
+        print(f"[Keys] {exc.detail}", file=sys.stderr, flush=True)
+        raise SystemExit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,47 +1,150 @@
+import asyncio
 import html
 import os
 import re
-
-import httpx
-from fastapi import Depends, FastAPI, HTTPException, Request
-from fastapi.responses import HTMLResponse
-
+import time
+from typing import Literal
+
+from fastapi import BackgroundTasks, Depends, FastAPI, Header, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, PlainTextResponse
+
+from agent_approval_gate import (
+    idempotency,
+    metrics,
+    querycount,
+    ratelimit,
+    retention,
+    serialization,
+    sharding,
+    stats,
+    status_cache,
+    tracing,
+    webhook_dedup,
+    writer,
+)
 from agent_approval_gate.adapters import EmailAdapter, TelegramAdapter
 from agent_approval_gate.adapters.email import verify_action_signature
-from agent_approval_gate.auth import get_client_id
+from agent_approval_gate.auth import get_client_id, require_scope
 from agent_approval_gate.config import get_settings
-from agent_approval_gate.database import get_db, init_db
+from agent_approval_gate.database import detached_session, get_db, init_db
 from agent_approval_gate.decision import Decision
 from agent_approval_gate.schemas import (
     ApprovalCreateRequest,
     ApprovalCreateResponse,
+    ApprovalListResponse,
     ApprovalStatusResponse,
     EmailReplyIn,
+    StatsResponse,
 )
 from agent_approval_gate.service import (
+    PendingDuplicate,
+    abandon,
     apply_decision,
+    content_hash,
     create_approval,
     expire_if_needed,
+    find_approval,
+    find_pending_duplicate,
     get_approval,
     get_approval_no_check,
+    list_approvals,
     revoke_allow_rule,
+    utcnow,
     validate_target,
+    wait_for_decision,
 )
 from agent_approval_gate.simulate import simulate_email_reply
-from agent_approval_gate.utils import to_epoch
+from agent_approval_gate.utils import from_epoch, to_epoch
 
 app = FastAPI(title="Agent Approval Gate")
 
 # Telegram Webhook 相关
 ALLOWED_USER_IDS = set(uid.strip() for uid in os.getenv("ALLOWED_USER_IDS", "").split(",") if uid.strip())
 
-telegram_adapter = TelegramAdapter()
-email_adapter = EmailAdapter()
+_adapters: dict = {}
+retention_worker = None
+
+CREATE_ENCODER = serialization.ModelEncoder(ApprovalCreateResponse)
+STATUS_ENCODER = serialization.ModelEncoder(ApprovalStatusResponse)
+
+
+def get_adapter(channel: str):
+    """Channel adapter, created on first send so settings are read at use, not import."""
+    adapter = _adapters.get(channel)
+    if adapter is None:
+        adapter = _adapters.setdefault(channel, TelegramAdapter() if channel == "telegram" else EmailAdapter())
+    return adapter
+
+
+def __getattr__(name: str):
+    if name == "telegram_adapter":
+        return get_adapter("telegram")
+    if name == "email_adapter":
+        return get_adapter("email")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 @app.on_event("startup")
 def on_startup() -> None:
+    global retention_worker
     init_db()
+    retention_worker = retention.start_worker()
+
+
+@app.on_event("shutdown")
+def on_shutdown() -> None:
+    if retention_worker is not None:
+        retention_worker.stop()
+    writer.stop()
+    router = sharding.get_router()
+    if router is not None:
+        router.close()
+
+
+@app.middleware("http")
+async def observe_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    status_code = 500
+    with querycount.tally() as sql:
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+            if get_settings().debug_sql_headers:
+                response.headers[querycount.STATEMENTS_HEADER] = str(sql.statements)
+                response.headers[querycount.COMMITS_HEADER] = str(sql.commits)
+            return response
+        finally:
+            route = request.scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            metrics.HTTP_REQUEST_DURATION.labels(request.method, path).observe(time.perf_counter() - start)
+            metrics.HTTP_REQUESTS.labels(request.method, path, str(status_code)).inc()
+            metrics.HTTP_REQUEST_SQL_STATEMENTS.labels(request.method, path).observe(sql.statements)
+            metrics.HTTP_REQUEST_SQL_COMMITS.labels(request.method, path).observe(sql.commits)
+
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    with tracing.span(
+        "http.request",
+        traceparent=request.headers.get(tracing.TRACEPARENT_HEADER),
+        **{"http.method": request.method},
+    ) as server_span:
+        response = await call_next(request)
+        route = request.scope.get("route")
+        path = getattr(route, "path", request.url.path)
+        server_span.update_name(f"{request.method} {path}")
+        server_span.set_attribute("http.route", path)
+        server_span.set_attribute("http.status_code", response.status_code)
+        approval_id = request.path_params.get("approval_id")
+        if approval_id:
+            server_span.set_attribute(tracing.APPROVAL_ID_ATTR, approval_id)
+        return response
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
 
 
 def decision_payload(approval):
@@ -54,40 +157,11 @@ def decision_payload(approval):
     }
 
 
-@app.post("/v1/approvals", response_model=ApprovalCreateResponse)
-def create_approval_endpoint(
-    request: ApprovalCreateRequest,
-    client_id: str = Depends(get_client_id),
-    db=Depends(get_db),
-):
-    target = validate_target(request.channel, request.target)
-    approval, auto = create_approval(
-        db,
-        session_id=request.session_id,
-        action_type=request.action_type,
-        title=request.title,
-        preview=request.preview,
-        channel=request.channel,
-        target=target,
-        expires_in_sec=request.expires_in_sec,
-        client_id=client_id,
-    )
-
-    if not auto:
-        if request.channel == "telegram":
-            if request.options:
-                telegram_adapter.send_question(approval, request.options)
-            else:
-                telegram_adapter.send_approval(approval)
-        else:
-            if request.options:
-                email_adapter.send_question(approval, request.options)
-            else:
-                email_adapter.send_approval(approval)
-
+def creation_response(approval, auto: bool) -> dict:
+    # Built only from fields fixed at creation, so an idempotent replay matches the original.
     response = {
         "approval_id": approval.approval_id,
-        "status": approval.status,
+        "status": approval.status if auto else "pending",
         "auto": auto,
     }
     if auto:
@@ -97,34 +171,217 @@ def create_approval_endpoint(
     return response
 
 
-@app.get("/v1/approvals/{approval_id}", response_model=ApprovalStatusResponse)
-def get_approval_endpoint(
-    approval_id: str,
+def replay_creation(db, record, response: Response) -> dict:
+    approval = find_approval(db, record.approval_id)
+    if approval is None:
+        raise HTTPException(status_code=404, detail="approval not found")
+    response.headers[idempotency.REPLAYED_HEADER] = "true"
+    metrics.IDEMPOTENT_REPLAYS.inc()
+    return creation_response(approval, record.auto)
+
+
+def attach_to_pending(db, approval, client_id: str, idempotency_key: str | None, request_hash: str) -> dict:
+    if idempotency_key:
+        idempotency.claim(db, client_id, idempotency_key, request_hash, approval.approval_id, False)
+        db.commit()
+    metrics.APPROVALS_COALESCED.labels(approval.channel, approval.action_type).inc()
+    tracing.set_attribute(tracing.APPROVAL_ID_ATTR, approval.approval_id)
+    return {**creation_response(approval, False), "coalesced": True}
+
+
+@app.post("/v1/approvals", response_model=ApprovalCreateResponse)
+def create_approval_endpoint(
+    request: ApprovalCreateRequest,
+    response: Response,
+    idempotency_key: str | None = Header(
+        default=None, alias=idempotency.HEADER, max_length=idempotency.MAX_KEY_LENGTH
+    ),
     client_id: str = Depends(get_client_id),
-    db=Depends(get_db),
+    db=Depends(sharding.get_client_db),
 ):
+    target = validate_target(request.channel, request.target)
+    request_hash = ""
+    if idempotency_key:
+        request_hash = idempotency.request_hash(request.model_dump())
+        record = idempotency.lookup(db, client_id, idempotency_key, request_hash)
+        if record is not None:
+            return serialization.render(replay_creation(db, record, response), CREATE_ENCODER, response)
+    coalesce_hash = None
+    if get_settings().coalesce_pending:
+        coalesce_hash = content_hash(request.session_id, request.action_type, request.preview, request.options)
+        pending = find_pending_duplicate(db, client_id, coalesce_hash)
+        if pending is not None:
+            body = attach_to_pending(db, pending, client_id, idempotency_key, request_hash)
+            return serialization.render(body, CREATE_ENCODER, response)
+    # Replays and coalesced requests above create nothing, so only new approvals are metered.
+    ratelimit.get_limiter().admit(db, client_id, request.session_id)
+    try:
+        with tracing.span("create_approval", **{"action_type": request.action_type}) as create_span:
+            approval, auto = create_approval(
+                db,
+                session_id=request.session_id,
+                action_type=request.action_type,
+                title=request.title,
+                preview=request.preview,
+                channel=request.channel,
+                target=target,
+                expires_in_sec=request.expires_in_sec,
+                client_id=client_id,
+                idempotency_key=idempotency_key,
+                request_hash=request_hash,
+                content_hash=coalesce_hash,
+                max_pending=get_settings().max_pending_per_session,
+            )
+            create_span.set_attribute(tracing.APPROVAL_ID_ATTR, approval.approval_id)
+            create_span.set_attribute("auto", auto)
+    except PendingDuplicate:
+        # A concurrent identical request created the pending approval first.
+        body = attach_to_pending(
+            db, find_pending_duplicate(db, client_id, coalesce_hash), client_id, idempotency_key, request_hash
+        )
+        return serialization.render(body, CREATE_ENCODER, response)
+    except idempotency.KeyInUse:
+        # A concurrent retry with the same key won the insert.
+        record = idempotency.lookup(db, client_id, idempotency_key, request_hash)
+        if record is None:
+            raise HTTPException(status_code=409, detail="concurrent request with this Idempotency-Key failed, retry")
+        return serialization.render(replay_creation(db, record, response), CREATE_ENCODER, response)
+    tracing.set_attribute(tracing.APPROVAL_ID_ATTR, approval.approval_id)
+
+    if not auto:
+        try:
+            with tracing.span(
+                f"{request.channel}.send", **{tracing.APPROVAL_ID_ATTR: approval.approval_id}
+            ):
+                adapter = get_adapter(request.channel)
+                if request.options:
+                    adapter.send_question(approval, request.options)
+                else:
+                    adapter.send_approval(approval)
+        except Exception:
+            # Nobody was notified: let a retry with the same key or content create and send again.
+            if idempotency_key:
+                idempotency.release(db, client_id, idempotency_key)
+            abandon(db, approval)
+            raise
+
+    return serialization.render(creation_response(approval, auto), CREATE_ENCODER, response)
+
+
+@app.get("/v1/approvals", response_model=ApprovalListResponse)
+def list_approvals_endpoint(
+    status: Literal["pending", "approved", "denied", "expired"] | None = None,
+    session_id: str | None = None,
+    action_type: str | None = None,
+    channel: Literal["telegram", "email"] | None = None,
+    created_after: int | None = None,  # epoch seconds, inclusive
+    created_before: int | None = None,  # epoch seconds, exclusive
+    cursor: str | None = None,
+    limit: int = Query(default=50, ge=1, le=200),
+    archived: bool = False,
+    client_id: str = Depends(get_client_id),
+    db=Depends(sharding.get_client_db),
+):
+    approvals, next_cursor = list_approvals(
+        db,
+        client_id,
+        status=status,
+        session_id=session_id,
+        action_type=action_type,
+        channel=channel,
+        created_after=from_epoch(created_after) if created_after is not None else None,
+        created_before=from_epoch(created_before) if created_before is not None else None,
+        cursor=cursor,
+        limit=limit,
+        archived=archived,
+    )
+    now = utcnow()
+    items = [
+        {
+            "approval_id": approval.approval_id,
+            "status": "expired" if approval.status == "pending" and approval.expires_at <= now else approval.status,
+            "created_at": to_epoch(approval.created_at),
+            "expires_at": to_epoch(approval.expires_at),
+            "session_id": approval.session_id,
+            "action_type": approval.action_type,
+            "title": approval.title,
+            "channel": approval.channel,
+            "decision": decision_payload(approval),
+        }
+        for approval in approvals
+    ]
+    return {"items": items, "next_cursor": next_cursor}
+
+
+def _client_approval(db, approval_id: str, client_id: str):
     approval = get_approval(db, approval_id)
     if approval.client_id != client_id:
         raise HTTPException(status_code=404, detail="approval not found")
     approval = expire_if_needed(db, approval)
+    # Values stay loaded; the connection is not held across the awaits that follow.
+    db.close()
+    return approval
 
-    response = {"status": approval.status}
-    if approval.status == "pending":
-        response["expires_at"] = to_epoch(approval.expires_at)
-        return response
 
-    response["expires_at"] = to_epoch(approval.expires_at)
-    response["decision"] = decision_payload(approval)
-    response["session_id"] = approval.session_id
-    response["action_type"] = approval.action_type
-    return response
+def cached_status_response(body: dict, etag: str, cache_control: str, if_none_match: str | None, response: Response):
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if status_cache.etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return serialization.render(body, STATUS_ENCODER, response)
+
+
+@app.get("/v1/approvals/{approval_id}", response_model=ApprovalStatusResponse)
+async def get_approval_endpoint(
+    approval_id: str,
+    response: Response,
+    wait: float = Query(default=0, ge=0, le=60),  # long-poll seconds while pending
+    if_none_match: str | None = Header(default=None),
+    client_id: str = Depends(get_client_id),
+    db=Depends(sharding.get_client_db),
+):
+    cache = status_cache.get_cache()
+    cached = cache.get((client_id, approval_id))
+    if cached is not None:
+        metrics.STATUS_CACHE_HITS.inc()
+        body, etag = cached
+        return cached_status_response(body, etag, status_cache.TERMINAL_CACHE_CONTROL, if_none_match, response)
+
+    # Async so a long-poll waits on the event loop, not on one of the threadpool's workers.
+    approval = await run_in_threadpool(_client_approval, db, approval_id, client_id)
+    if wait and approval.status == "pending":
+        approval = await wait_for_decision(db, approval, wait)
+
+    body = {"status": approval.status, "expires_at": to_epoch(approval.expires_at)}
+    if approval.status == "pending":
+        return cached_status_response(
+            body, status_cache.etag_for(body), status_cache.PENDING_CACHE_CONTROL, if_none_match, response
+        )
+
+    body["decision"] = decision_payload(approval)
+    body["session_id"] = approval.session_id
+    body["action_type"] = approval.action_type
+    etag = status_cache.etag_for(body)
+    cache.put((client_id, approval_id), (body, etag))
+    return cached_status_response(body, etag, status_cache.TERMINAL_CACHE_CONTROL, if_none_match, response)
+
+
+@app.get("/v1/stats", response_model=StatsResponse)
+def stats_endpoint(
+    window: Literal["1h", "24h", "7d", "30d"] = "24h",
+    client_id: str = Depends(require_scope("stats")),
+    db=Depends(sharding.client_db("stats")),
+):
+    result = stats.get_stats(db, client_id, window)
+    result["since"] = to_epoch(result["since"])
+    return result
 
 
 @app.post("/v1/inbox/email-reply")
 def email_reply_endpoint(
     payload: EmailReplyIn,
     client_id: str = Depends(get_client_id),
-    db=Depends(get_db),
+    db=Depends(sharding.get_client_db),
 ):
     approval = simulate_email_reply(db, payload.subject, payload.body, client_id=client_id)
     return {"status": approval.status, "approval_id": approval.approval_id}
@@ -134,7 +391,7 @@ def email_reply_endpoint(
 def revoke_allow_rule_endpoint(
     rule_id: str,
     client_id: str = Depends(get_client_id),
-    db=Depends(get_db),
+    db=Depends(sharding.get_client_db),
 ):
     rule = revoke_allow_rule(db, rule_id, client_id=client_id)
     return {
@@ -228,7 +485,9 @@ def _custom_form_html(approval_id: str) -> str:
 
 
 @app.get("/v1/action/{approval_id}/{action}", response_class=HTMLResponse)
-def action_endpoint(approval_id: str, action: str, sig: str = "", note: str = "", reply: str = "", db=Depends(get_db)):
+def action_endpoint(
+    approval_id: str, action: str, sig: str = "", note: str = "", reply: str = "", db=Depends(sharding.get_approval_db)
+):
     """处理邮件按钮点击（一键审批）"""
     settings = get_settings()
 
@@ -332,23 +591,39 @@ def _t(key: str, lang: str) -> str:
     return TEXTS.get(lang, TEXTS["en"]).get(key, key)
 
 
-def _tg_api_call(method: str, data: dict) -> dict:
+_tg_client = None  # (event loop, httpx.AsyncClient)
+
+
+def _telegram_client():
+    """Shared async client for Bot API calls, so webhook handling never blocks the event loop."""
+    global _tg_client
+    loop = asyncio.get_running_loop()
+    if _tg_client is None or _tg_client[0] is not loop:
+        import httpx
+
+        _tg_client = (loop, httpx.AsyncClient(timeout=10))
+    return _tg_client[1]
+
+
+@app.on_event("shutdown")
+async def close_telegram_client() -> None:
+    if _tg_client is not None and _tg_client[0] is asyncio.get_running_loop():
+        await _tg_client[1].aclose()
+
+
+async def _tg_api_call(method: str, data: dict) -> dict:
     settings = get_settings()
     url = f"{settings.telegram_api_base}/bot{settings.telegram_bot_token}/{method}"
     try:
-        resp = httpx.post(url, data=data, timeout=10)
+        resp = await _telegram_client().post(url, data=data)
         return resp.json()
     except Exception:
         return {}
 
 
-def _answer_callback(callback_query_id: str, text: str):
-    _tg_api_call("answerCallbackQuery", {"callback_query_id": callback_query_id, "text": text})
-
-
-def _edit_message(chat_id: int, message_id: int, text: str):
+async def _edit_message(chat_id: int, message_id: int, text: str):
     import json
-    _tg_api_call("editMessageText", {
+    await _tg_api_call("editMessageText", {
         "chat_id": chat_id,
         "message_id": message_id,
         "text": text,
@@ -357,12 +632,12 @@ def _edit_message(chat_id: int, message_id: int, text: str):
     })
 
 
-def _send_message(chat_id: int, text: str, reply_markup: dict = None):
+async def _send_message(chat_id: int, text: str, reply_markup: dict = None):
     import json
     data = {"chat_id": chat_id, "text": text, "parse_mode": "HTML"}
     if reply_markup:
         data["reply_markup"] = json.dumps(reply_markup)
-    _tg_api_call("sendMessage", data)
+    await _tg_api_call("sendMessage", data)
 
 
 def _process_tg_approval(approval_id: str, code: str, note: str = None, db=None) -> dict:
@@ -381,9 +656,64 @@ def _process_tg_approval(approval_id: str, code: str, note: str = None, db=None)
         return {"status": "error", "detail": str(e)}
 
 
+def _peek_tg_approval(approval_id: str, db) -> tuple[str, object]:
+    """Current status of the approval a button refers to ("missing" if there is none) and its engine."""
+    with sharding.approval_session(db, approval_id) as approval_db:
+        bind = approval_db.get_bind()
+        try:
+            approval = get_approval_no_check(approval_db, approval_id)
+        except HTTPException:
+            return "missing", bind
+        return expire_if_needed(approval_db, approval).status, bind
+
+
+def _decide_detached(bind, approval_id: str, code: str, note: str | None) -> dict:
+    with detached_session(bind) as db:
+        return _process_tg_approval(approval_id, code, note, db)
+
+
+def _inline_answer(callback_query_id: str, text: str) -> dict:
+    """Webhook response that has Telegram call answerCallbackQuery itself, saving a round trip."""
+    return {"method": "answerCallbackQuery", "callback_query_id": callback_query_id, "text": text}
+
+
+def _status_text(status: str, lang: str) -> str:
+    return _t("approved", lang) if status == "approved" else _t("denied", lang)
+
+
+async def _finish_tg_callback(
+    bind, approval_id: str, code: str, note: str | None, chat_id, message_id, original_text: str, lang: str
+) -> None:
+    """Write the decision and edit the message, after the tap has been acknowledged."""
+    result = await run_in_threadpool(_decide_detached, bind, approval_id, code, note)
+    status = result.get("status")
+    if status in ("approved", "denied"):
+        if note is not None:
+            footer = f"✅ <b>{_t('selected', lang)}: {html.escape(note)}</b>"
+        else:
+            footer = f"{'✅' if status == 'approved' else '❌'} <b>{_status_text(status, lang)}</b>"
+    elif status == "already_processed":
+        # 显示实际状态
+        footer = f"⚡ <b>{_status_text(result.get('actual_status', 'approved'), lang)}</b>"
+    else:
+        footer = f"⚠️ <b>{_t('failed', lang)}: {html.escape(str(result.get('detail', status)))}</b>"
+    await _edit_message(chat_id, message_id, f"{original_text}\n\n━━━━━━━━━━━━━━━━━━━━\n{footer}")
+
+
+async def _finish_tg_reply(bind, approval_id: str, text: str, chat_id, lang: str) -> None:
+    result = await run_in_threadpool(_decide_detached, bind, approval_id, "4", text)
+    if result.get("status") in ("approved", "denied"):
+        await _send_message(chat_id, f"✅ {_t('reply_received', lang)}\n\n{text}")
+
+
 @app.post("/v1/telegram/webhook")
-async def telegram_webhook(request: Request, db=Depends(get_db)):
-    """Telegram Webhook 端点 - 处理按钮点击和文本回复"""
+async def telegram_webhook(request: Request, background: BackgroundTasks, db=Depends(get_db)):
+    """Telegram Webhook 端点 - 处理按钮点击和文本回复
+
+    Taps are acknowledged in the webhook response itself (an inline
+    answerCallbackQuery); the decision write and the message edit run as
+    background tasks after the response is sent.
+    """
     # 验证 Telegram secret token
     settings = get_settings()
     if settings.telegram_webhook_secret:
@@ -396,6 +726,26 @@ async def telegram_webhook(request: Request, db=Depends(get_db)):
     except Exception:
         return {"ok": True}
 
+    # Telegram redelivers updates it considers unanswered; handle each update_id once.
+    update_id = update.get("update_id")
+    if not isinstance(update_id, int):
+        return await _handle_tg_update(update, background, db)
+    dedup = webhook_dedup.get_deduper()
+    if dedup.seen(update_id) or (
+        dedup.shared and await run_in_threadpool(dedup.claimed_elsewhere, db, update_id)
+    ):
+        metrics.TELEGRAM_DUPLICATE_UPDATES.inc()
+        return {"ok": True}
+    try:
+        return await _handle_tg_update(update, background, db)
+    except Exception:
+        # Unanswered, so Telegram will redeliver it: let that copy through.
+        await run_in_threadpool(dedup.release, db, update_id)
+        raise
+
+
+async def _handle_tg_update(update: dict, background: BackgroundTasks, db) -> dict:
+    """The webhook's answer to one new update; decision work is queued on ``background``."""
     # 处理按钮点击
     if "callback_query" in update:
         callback = update["callback_query"]
@@ -412,76 +762,44 @@ async def telegram_webhook(request: Request, db=Depends(get_db)):
 
         # 安全检查
         if ALLOWED_USER_IDS and user_id not in ALLOWED_USER_IDS:
-            _answer_callback(callback_id, _t("no_permission", lang))
-            return {"ok": True}
+            return _inline_answer(callback_id, _t("no_permission", lang))
 
         if ":" not in data:
-            _answer_callback(callback_id, _t("invalid", lang))
-            return {"ok": True}
+            return _inline_answer(callback_id, _t("invalid", lang))
 
         approval_id, code = data.split(":", 1)
+        note = None
 
         # 处理选择题选项
         if code.startswith("opt:"):
             option = code.split(":")[1]
             if option == "custom":
-                _answer_callback(callback_id, "")
-                _send_message(chat_id, f"📝 <code>{approval_id}</code>", {
+                background.add_task(_send_message, chat_id, f"📝 <code>{approval_id}</code>", {
                     "force_reply": True,
                     "selective": True,
                     "input_field_placeholder": _t("enter_custom", lang)
                 })
-                return {"ok": True}
-
-            result = _process_tg_approval(approval_id, "4", option, db)
-            status = result.get("status")
-            if status in ("approved", "denied"):
-                _answer_callback(callback_id, f"{_t('selected', lang)}: {option}")
-                new_text = f"{original_text}\n\n━━━━━━━━━━━━━━━━━━━━\n✅ <b>{_t('selected', lang)}: {option}</b>"
-                _edit_message(chat_id, message_id, new_text)
-            elif status == "already_processed":
-                # 显示实际状态
-                actual = result.get("actual_status", "approved")
-                if actual == "approved":
-                    _answer_callback(callback_id, "⚡ " + _t("approved", lang))
-                    new_text = f"{original_text}\n\n━━━━━━━━━━━━━━━━━━━━\n⚡ <b>{_t('approved', lang)}</b>"
-                else:
-                    _answer_callback(callback_id, "⚡ " + _t("denied", lang))
-                    new_text = f"{original_text}\n\n━━━━━━━━━━━━━━━━━━━━\n⚡ <b>{_t('denied', lang)}</b>"
-                _edit_message(chat_id, message_id, new_text)
-            else:
-                _answer_callback(callback_id, f"{_t('failed', lang)}: {status}")
-            return {"ok": True}
-
-        # 处理标准审批按钮
-        code_info = {
-            "1": ("✅", "approve"),
-            "2": ("✅", "approve_session"),
-            "3": ("❌", "deny"),
-            "6": ("♾️", "always_allow")
-        }
-        emoji, _ = code_info.get(code, ("", code))
-        result = _process_tg_approval(approval_id, code, None, db)
-        status = result.get("status")
-
-        if status in ("approved", "denied"):
-            status_text = _t("approved", lang) if status == "approved" else _t("denied", lang)
-            _answer_callback(callback_id, f"{emoji} {status_text}")
-            status_emoji = "✅" if status == "approved" else "❌"
-            new_text = f"{original_text}\n\n━━━━━━━━━━━━━━━━━━━━\n{status_emoji} <b>{status_text}</b>"
-            _edit_message(chat_id, message_id, new_text)
-        elif status == "already_processed":
-            # 显示实际状态
-            actual = result.get("actual_status", "approved")
-            if actual == "approved":
-                _answer_callback(callback_id, "⚡ " + _t("approved", lang))
-                new_text = f"{original_text}\n\n━━━━━━━━━━━━━━━━━━━━\n⚡ <b>{_t('approved', lang)}</b>"
+                return _inline_answer(callback_id, "")
+            code, note = "4", option
+
+        status, bind = await run_in_threadpool(_peek_tg_approval, approval_id, db)
+        if status == "pending":
+            # Optimistic: the background write reports any race in the edited message.
+            if note is not None:
+                answer = f"{_t('selected', lang)}: {note}"
             else:
-                _answer_callback(callback_id, "⚡ " + _t("denied", lang))
-                new_text = f"{original_text}\n\n━━━━━━━━━━━━━━━━━━━━\n⚡ <b>{_t('denied', lang)}</b>"
-            _edit_message(chat_id, message_id, new_text)
+                # 标准审批按钮
+                emoji = {"1": "✅", "2": "✅", "3": "❌", "6": "♾️"}.get(code, "")
+                answer = f"{emoji} {_status_text('denied' if code == '3' else 'approved', lang)}"
+        elif status in ("approved", "denied"):
+            answer = "⚡ " + _status_text(status, lang)
         else:
-            _answer_callback(callback_id, f"{_t('failed', lang)}: {status}")
+            return _inline_answer(callback_id, f"{_t('failed', lang)}: {status}")
+
+        background.add_task(
+            _finish_tg_callback, bind, approval_id, code, note, chat_id, message_id, original_text, lang
+        )
+        return _inline_answer(callback_id, answer)
 
     # 处理文本回复
     elif "message" in update:
@@ -504,17 +822,18 @@ async def telegram_webhook(request: Request, db=Depends(get_db)):
             return {"ok": True}
 
         approval_id = match.group(1)
-        result = _process_tg_approval(approval_id, "4", text, db)
-
-        if result.get("status") in ("approved", "denied"):
-            _send_message(chat_id, f"✅ {_t('reply_received', lang)}\n\n{text}")
+        if sharding.get_router() is None:
+            bind = db.get_bind()
+        else:
+            bind = await run_in_threadpool(sharding.bind_for_approval, db, approval_id)
+        background.add_task(_finish_tg_reply, bind, approval_id, text, chat_id, lang)
 
     return {"ok": True}
 
 
 @app.post("/v1/telegram/setup-webhook")
 def setup_telegram_webhook(
-    client_id: str = Depends(get_client_id),
+    client_id: str = Depends(require_scope("admin")),
     db=Depends(get_db),
 ):
     """设置 Telegram Webhook"""
@@ -530,6 +849,8 @@ def setup_telegram_webhook(
     if settings.telegram_webhook_secret:
         data["secret_token"] = settings.telegram_webhook_secret
 
+    import httpx
+
     try:
         resp = httpx.post(url, data=data, timeout=10)
         return {"webhook_url": webhook_url, "telegram_response": resp.json()}
@@ -539,11 +860,12 @@ def setup_telegram_webhook(
 
 @app.delete("/v1/telegram/webhook")
 def delete_telegram_webhook(
-    client_id: str = Depends(get_client_id),
+    client_id: str = Depends(require_scope("admin")),
 ):
     """删除 Telegram Webhook（恢复轮询模式）"""
     settings = get_settings()
     url = f"{settings.telegram_api_base}/bot{settings.telegram_bot_token}/deleteWebhook"
+    import httpx
 
     try:
         resp = httpx.post(url, timeout=10)
@@ -0,0 +1,374 @@
+"""In-process metrics exposed in the Prometheus text format.
+
+Metric children are created once per label set and cached, so recording a
+sample only bumps numbers in place. Rendering happens on scrape.
+"""
+
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterable
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_COUNT_BUCKETS = (0.0, 1.0, 2.0, 3.0, 4.0, 6.0, 8.0, 12.0, 16.0, 32.0)
+DECISION_BUCKETS = (5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0, 7200.0, 86400.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+    return "{" + pairs + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self, lock: threading.Lock) -> None:
+        self.value = 0.0
+        self._lock = lock
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild(self._lock)
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default.inc(amount)
+
+    def _samples(self) -> list[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+            for values, child in list(self._children.items())
+        ]
+
+
+class _GaugeChild:
+    __slots__ = ("value", "function", "_lock")
+
+    def __init__(self, lock: threading.Lock) -> None:
+        self.value = 0.0
+        self.function: Callable[[], float] | None = None
+        self._lock = lock
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value -= amount
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        self.function = function
+
+    def get(self) -> float:
+        if self.function is not None:
+            try:
+                return float(self.function())
+            except Exception:
+                return math.nan
+        return self.value
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self) -> _GaugeChild:
+        return _GaugeChild(self._lock)
+
+    def set(self, value: float) -> None:
+        self._default.set(value)
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default.inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._default.dec(amount)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        self._default.set_function(function)
+
+    def _samples(self) -> list[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.get())}"
+            for values, child in list(self._children.items())
+        ]
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds: tuple[float, ...], lock: threading.Lock) -> None:
+        self.bounds = bounds
+        # One slot per finite bucket plus the +Inf overflow slot.
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = lock
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets, self._lock)
+
+    def observe(self, value: float) -> None:
+        self._default.observe(value)
+
+    def _samples(self) -> list[str]:
+        lines = []
+        bucket_names = self.labelnames + ("le",)
+        for values, child in list(self._children.items()):
+            with self._lock:
+                counts = list(child.counts)
+                total = child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                labels = _format_labels(bucket_names, values + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(
+    name: str,
+    documentation: str,
+    labelnames: tuple[str, ...] = (),
+    buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+# ---- Approval pipeline metrics ----
+
+HTTP_REQUEST_DURATION = histogram(
+    "approval_gate_http_request_duration_seconds",
+    "HTTP request latency by route",
+    ("method", "route"),
+)
+HTTP_REQUESTS = counter(
+    "approval_gate_http_requests_total",
+    "HTTP requests by route and status code",
+    ("method", "route", "status"),
+)
+HTTP_REQUEST_SQL_STATEMENTS = histogram(
+    "approval_gate_http_request_sql_statements",
+    "SQL statements issued per HTTP request",
+    ("method", "route"),
+    buckets=SQL_COUNT_BUCKETS,
+)
+HTTP_REQUEST_SQL_COMMITS = histogram(
+    "approval_gate_http_request_sql_commits",
+    "Database commits per HTTP request",
+    ("method", "route"),
+    buckets=SQL_COUNT_BUCKETS,
+)
+APPROVALS_CREATED = counter(
+    "approval_gate_approvals_created_total",
+    "Approvals created",
+    ("channel", "action_type"),
+)
+APPROVALS_AUTO_APPROVED = counter(
+    "approval_gate_approvals_auto_approved_total",
+    "Approvals auto-approved by an allow rule or session allow",
+    ("channel", "action_type"),
+)
+APPROVALS_DECIDED = counter(
+    "approval_gate_approvals_decided_total",
+    "Approvals decided by a human",
+    ("channel", "action_type", "status"),
+)
+APPROVALS_EXPIRED = counter(
+    "approval_gate_approvals_expired_total",
+    "Approvals that expired before a decision",
+    ("channel", "action_type"),
+)
+APPROVALS_ARCHIVED = counter(
+    "approval_gate_approvals_archived_total",
+    "Terminal approvals moved to approvals_archive",
+)
+APPROVALS_COALESCED = counter(
+    "approval_gate_approvals_coalesced_total",
+    "Create requests attached to an identical pending approval",
+    ("channel", "action_type"),
+)
+IDEMPOTENT_REPLAYS = counter(
+    "approval_gate_idempotent_replays_total",
+    "Create requests answered from an earlier request with the same Idempotency-Key",
+)
+STATUS_CACHE_HITS = counter(
+    "approval_gate_status_cache_hits_total",
+    "Status reads of terminal approvals served from the in-process cache",
+)
+APPROVALS_THROTTLED = counter(
+    "approval_gate_approvals_throttled_total",
+    "Create requests rejected with 429 by rate limits or the pending cap",
+    ("reason",),
+)
+TELEGRAM_DUPLICATE_UPDATES = counter(
+    "approval_gate_telegram_duplicate_updates_total",
+    "Telegram webhook updates dropped because their update_id was already handled",
+)
+WRITE_BATCH_SIZE = histogram(
+    "approval_gate_write_batch_size",
+    "Writes committed per group-commit transaction",
+    buckets=(1.0, 2.0, 4.0, 8.0, 16.0, 32.0, 64.0, 128.0, 256.0),
+)
+DECISION_LATENCY = histogram(
+    "approval_gate_time_to_decision_seconds",
+    "Time from approval creation to human decision",
+    ("channel", "action_type"),
+    buckets=DECISION_BUCKETS,
+)
+ADAPTER_SEND_DURATION = histogram(
+    "approval_gate_adapter_send_duration_seconds",
+    "Notification send latency by adapter",
+    ("adapter", "kind"),
+)
+ADAPTER_SEND_FAILURES = counter(
+    "approval_gate_adapter_send_failures_total",
+    "Notification sends that raised an error",
+    ("adapter", "kind"),
+)
+DB_SESSIONS_IN_USE = gauge(
+    "approval_gate_db_sessions_in_use",
+    "Database sessions currently handed out to requests",
+)
+SHARDS_OPEN = gauge(
+    "approval_gate_shards_open",
+    "Per-client SQLite shards with an open engine (SHARD_DIR)",
+)
+DB_POOL_SIZE = gauge(
+    "approval_gate_db_pool_size",
+    "Configured connection pool size",
+)
+DB_POOL_CHECKED_OUT = gauge(
+    "approval_gate_db_pool_checked_out",
+    "Connections currently checked out of the pool",
+)
+
+
+@contextmanager
+def track_send(adapter: str, kind: str):
+    """Time a notification send and count it as failed if it raises."""
+    duration = ADAPTER_SEND_DURATION.labels(adapter, kind)
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        ADAPTER_SEND_FAILURES.labels(adapter, kind).inc()
+        raise
+    finally:
+        duration.observe(time.perf_counter() - start)
+
+
+def bind_pool(engine) -> None:
+    """Report pool utilisation of ``engine`` at scrape time."""
+    pool = engine.pool
+    if hasattr(pool, "size"):
+        DB_POOL_SIZE.set_function(pool.size)
+    if hasattr(pool, "checkedout"):
+        DB_POOL_CHECKED_OUT.set_function(pool.checkedout)
+
+
+def render() -> str:
+    return REGISTRY.render()
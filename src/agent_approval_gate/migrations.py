@@ -0,0 +1,125 @@
+"""Schema migrations for existing databases.
+
+``Base.metadata.create_all`` creates missing tables but never changes an
+existing one, so indexes added to a model after a ``data.db`` was created
+are applied here. Every migration is idempotent (fresh databases already
+have the objects from ``create_all``) and is recorded by version in
+``schema_migrations``. Append new migrations; never renumber.
+"""
+
+import datetime as dt
+from collections.abc import Callable
+
+from sqlalchemy import Column, DateTime, Integer, String, Table, inspect, select
+from sqlalchemy.engine import Connection
+
+from agent_approval_gate.database import Base
+from agent_approval_gate.models import AllowRule, Approval, ApprovalArchive
+
+schema_migrations = Table(
+    "schema_migrations",
+    Base.metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String(256), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+def _index(model, name: str):
+    return next(index for index in model.__table__.indexes if index.name == name)
+
+
+def _create_indexes(*indexes) -> Callable[[Connection], None]:
+    def apply(conn: Connection) -> None:
+        for index in indexes:
+            index.create(conn, checkfirst=True)
+
+    return apply
+
+
+def _add_columns(model, *names: str) -> Callable[[Connection], None]:
+    def apply(conn: Connection) -> None:
+        table = model.__table__
+        existing = {column["name"] for column in inspect(conn).get_columns(table.name)}
+        for name in names:
+            if name in existing:
+                continue
+            column = table.c[name]
+            conn.exec_driver_sql(
+                f"ALTER TABLE {table.name} ADD COLUMN {name} {column.type.compile(conn.dialect)}"
+            )
+
+    return apply
+
+
+def _drop_indexes(*names: str) -> Callable[[Connection], None]:
+    def apply(conn: Connection) -> None:
+        for name in names:
+            conn.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+
+    return apply
+
+
+def _chain(*steps: Callable[[Connection], None]) -> Callable[[Connection], None]:
+    def apply(conn: Connection) -> None:
+        for step in steps:
+            step(conn)
+
+    return apply
+
+
+MIGRATIONS: list[tuple[int, str, Callable[[Connection], None]]] = [
+    (
+        1,
+        "composite indexes for allow rule lookup, expiry and retention",
+        _chain(
+            _create_indexes(
+                _index(AllowRule, "ix_allow_rules_client_action_enabled"),
+                _index(Approval, "ix_approvals_status_expires_at"),
+                _index(Approval, "ix_approvals_created_at"),
+            ),
+            # Superseded by the (status, expires_at) prefix.
+            _drop_indexes("ix_approvals_status"),
+        ),
+    ),
+    (
+        2,
+        "keyset pagination indexes for approval listing",
+        _create_indexes(
+            _index(Approval, "ix_approvals_client_created"),
+            _index(ApprovalArchive, "ix_approvals_archive_client_created"),
+        ),
+    ),
+    (
+        3,
+        "content hash for coalescing identical pending approvals",
+        _chain(
+            _add_columns(Approval, "content_hash"),
+            _add_columns(ApprovalArchive, "content_hash"),
+            _create_indexes(_index(Approval, "ux_approvals_pending_content")),
+        ),
+    ),
+    (
+        4,
+        "pending approvals per session for admission control",
+        _create_indexes(_index(Approval, "ix_approvals_pending_session")),
+    ),
+]
+
+
+def migrate(conn: Connection) -> list[int]:
+    """Apply pending migrations on ``conn``; returns the versions applied."""
+    schema_migrations.create(conn, checkfirst=True)
+    done = set(conn.execute(select(schema_migrations.c.version)).scalars())
+    applied = []
+    for version, description, apply in MIGRATIONS:
+        if version in done:
+            continue
+        apply(conn)
+        conn.execute(
+            schema_migrations.insert().values(
+                version=version, description=description, applied_at=dt.datetime.utcnow()
+            )
+        )
+        applied.append(version)
+    return applied
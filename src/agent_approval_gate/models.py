@@ -1,6 +1,6 @@
 import datetime as dt
 
-from sqlalchemy import Boolean, Column, DateTime, Integer, String, Text, UniqueConstraint
+from sqlalchemy import BigInteger, Boolean, Column, DateTime, Float, Index, Integer, String, Text, UniqueConstraint, text
 from sqlalchemy.types import JSON
 
 from agent_approval_gate.database import Base
@@ -13,7 +13,7 @@ class Approval(Base):
     approval_id = Column(String(64), unique=True, index=True, nullable=False)
     created_at = Column(DateTime, nullable=False, default=dt.datetime.utcnow)
     expires_at = Column(DateTime, nullable=False)
-    status = Column(String(16), nullable=False, index=True)
+    status = Column(String(16), nullable=False)
 
     session_id = Column(String(128), nullable=False, index=True)
     action_type = Column(String(128), nullable=False, index=True)
@@ -29,6 +29,62 @@ class Approval(Base):
 
     client_id = Column(String(64), nullable=False, index=True)
     allow_rule_applied = Column(String(64), nullable=True)
+    # sha256 of (session_id, action_type, preview, options); set only when coalescing is on
+    content_hash = Column(String(64), nullable=True)
+
+    __table_args__ = (
+        Index("ix_approvals_status_expires_at", "status", "expires_at"),
+        Index("ix_approvals_created_at", "created_at"),
+        Index("ix_approvals_client_created", "client_id", "created_at", "id"),
+        # At most one pending approval per content hash; also serves the coalescing lookup.
+        Index(
+            "ux_approvals_pending_content",
+            "client_id",
+            "content_hash",
+            unique=True,
+            sqlite_where=text("status = 'pending'"),
+            postgresql_where=text("status = 'pending'"),
+        ),
+        # Outstanding pending approvals per session (admission control).
+        Index(
+            "ix_approvals_pending_session",
+            "client_id",
+            "session_id",
+            sqlite_where=text("status = 'pending'"),
+            postgresql_where=text("status = 'pending'"),
+        ),
+    )
+
+
+class ApprovalArchive(Base):
+    """Terminal approvals moved out of ``approvals`` by the retention job."""
+
+    __tablename__ = "approvals_archive"
+
+    id = Column(Integer, primary_key=True)
+    approval_id = Column(String(64), unique=True, index=True, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    status = Column(String(16), nullable=False)
+
+    session_id = Column(String(128), nullable=False)
+    action_type = Column(String(128), nullable=False)
+    title = Column(String(256), nullable=False)
+    preview = Column(Text, nullable=False)
+
+    decision_code = Column(String(4), nullable=True)
+    decision_note = Column(Text, nullable=True)
+    decision_override = Column(Text, nullable=True)
+
+    channel = Column(String(16), nullable=False)
+    target = Column(JSON, nullable=False)
+
+    client_id = Column(String(64), nullable=False)
+    allow_rule_applied = Column(String(64), nullable=True)
+    content_hash = Column(String(64), nullable=True)
+    archived_at = Column(DateTime, nullable=False, default=dt.datetime.utcnow)
+
+    __table_args__ = (Index("ix_approvals_archive_client_created", "client_id", "created_at", "id"),)
 
 
 class AllowRule(Base):
@@ -41,7 +97,10 @@ class AllowRule(Base):
     enabled = Column(Boolean, nullable=False, default=True)
     created_at = Column(DateTime, nullable=False, default=dt.datetime.utcnow)
 
-    __table_args__ = (UniqueConstraint("client_id", "action_type", name="uq_allow_rule"),)
+    __table_args__ = (
+        UniqueConstraint("client_id", "action_type", name="uq_allow_rule"),
+        Index("ix_allow_rules_client_action_enabled", "client_id", "action_type", "enabled"),
+    )
 
 
 class SessionAllow(Base):
@@ -56,3 +115,104 @@ class SessionAllow(Base):
     __table_args__ = (
         UniqueConstraint("client_id", "session_id", "action_type", name="uq_session_allow"),
     )
+
+
+class ApprovalRollup(Base):
+    """Hourly approval counters, maintained in the same transaction as the change."""
+
+    __tablename__ = "approval_rollups"
+
+    id = Column(Integer, primary_key=True)
+    client_id = Column(String(64), nullable=False)
+    bucket_start = Column(DateTime, nullable=False)
+    action_type = Column(String(128), nullable=False)
+    channel = Column(String(16), nullable=False)
+    created = Column(Integer, nullable=False, default=0)
+    auto_approved = Column(Integer, nullable=False, default=0)
+    approved = Column(Integer, nullable=False, default=0)
+    denied = Column(Integer, nullable=False, default=0)
+    expired = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("client_id", "bucket_start", "action_type", "channel", name="uq_approval_rollup"),
+    )
+
+
+class LatencyRollup(Base):
+    """Hourly decision-latency sketch: one row per log-scaled latency bin."""
+
+    __tablename__ = "latency_rollups"
+
+    id = Column(Integer, primary_key=True)
+    client_id = Column(String(64), nullable=False)
+    bucket_start = Column(DateTime, nullable=False)
+    action_type = Column(String(128), nullable=False)
+    channel = Column(String(16), nullable=False)
+    bin = Column(Integer, nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("client_id", "bucket_start", "action_type", "channel", "bin", name="uq_latency_rollup"),
+    )
+
+
+class IdempotencyKey(Base):
+    """``Idempotency-Key`` of a create request, recorded with the approval it produced."""
+
+    __tablename__ = "idempotency_keys"
+
+    id = Column(Integer, primary_key=True)
+    client_id = Column(String(64), nullable=False)
+    key = Column(String(255), nullable=False)
+    request_hash = Column(String(64), nullable=False)
+    approval_id = Column(String(64), nullable=False)
+    auto = Column(Boolean, nullable=False, default=False)
+    created_at = Column(DateTime, nullable=False, default=dt.datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+    __table_args__ = (UniqueConstraint("client_id", "key", name="uq_idempotency_key"),)
+
+
+class ApiKey(Base):
+    """API key stored as its SHA-256 digest; the secret itself is never kept."""
+
+    __tablename__ = "api_keys"
+
+    id = Column(Integer, primary_key=True)
+    key_id = Column(String(64), unique=True, index=True, nullable=False)
+    key_hash = Column(String(64), unique=True, nullable=False)
+    client_id = Column(String(64), nullable=False, index=True)
+    name = Column(String(128), nullable=False, default="")
+    scopes = Column(JSON, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=dt.datetime.utcnow)
+    expires_at = Column(DateTime, nullable=True)
+    revoked_at = Column(DateTime, nullable=True)
+
+
+class RateLimitBucket(Base):
+    """Token bucket shared by workers when ``RATE_LIMIT_BACKEND=db``; idle rows are deleted."""
+
+    __tablename__ = "rate_limit_buckets"
+
+    key = Column(String(256), primary_key=True)
+    tokens = Column(Float, nullable=False)
+    updated_at = Column(Float, nullable=False, index=True)  # epoch seconds
+
+
+class TelegramUpdate(Base):
+    """Webhook update ids claimed when ``TELEGRAM_DEDUP_BACKEND=db``; rows past the window are deleted."""
+
+    __tablename__ = "telegram_updates"
+
+    update_id = Column(BigInteger, primary_key=True, autoincrement=False)
+    seen_at = Column(Float, nullable=False, index=True)  # epoch seconds
+
+
+class ClientShard(Base):
+    """Shard map used when ``SHARD_DIR`` is set: which SQLite file holds a client's data."""
+
+    __tablename__ = "client_shards"
+
+    client_id = Column(String(64), primary_key=True)
+    shard = Column(String(8), nullable=False, index=True)  # file name stem, 8 hex digits
+    created_at = Column(DateTime, nullable=False, default=dt.datetime.utcnow)
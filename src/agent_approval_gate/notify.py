@@ -0,0 +1,409 @@
+"""Pub/sub for approval state changes.
+
+Backends (``NOTIFY_BACKEND``):
+
+- ``inprocess``: subscribers in this process only (default).
+- ``sqlite``: a change-sequence table in a shared SQLite file
+  (``NOTIFY_SQLITE_PATH``). One reader thread per process watches
+  ``PRAGMA data_version`` and fans new rows out to local subscribers, so
+  waiters never query the approvals table. It polls only while the
+  process has subscribers. The cost: every published change is one more
+  write, an INSERT and commit in the notify file, on top of the decision's
+  own commit. The file runs with ``synchronous=NORMAL``, so in WAL mode
+  that commit does not fsync. Old rows are pruned at most once a minute.
+- ``unix``: a broker on a Unix socket (``NOTIFY_SOCKET_PATH``) that relays
+  newline-delimited JSON events between worker processes. Start one with
+  ``python -m agent_approval_gate.notify --socket PATH``.
+
+Every backend delivers locally published events immediately; remote events
+arrive through the backend's transport. ``Subscription.wait_async`` lets
+an async handler await an event on the event loop without holding a
+threadpool worker.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from dataclasses import asdict, dataclass
+
+from agent_approval_gate.config import get_settings
+
+
+@dataclass(frozen=True)
+class ApprovalEvent:
+    approval_id: str
+    client_id: str
+    status: str
+
+
+class Subscription:
+    """Wakes up when an event for ``approval_id`` (or any, if None) arrives."""
+
+    def __init__(self, bus: "InProcessBus", approval_id: str | None) -> None:
+        self.bus = bus
+        self.approval_id = approval_id
+        self.event: ApprovalEvent | None = None
+        self._ready = threading.Event()
+        self._waiter: tuple[asyncio.AbstractEventLoop, asyncio.Event] | None = None
+
+    def _deliver(self, event: ApprovalEvent) -> None:
+        self.event = event
+        self._ready.set()
+        waiter = self._waiter
+        if waiter is not None:
+            loop, ready = waiter
+            try:
+                loop.call_soon_threadsafe(ready.set)
+            except RuntimeError:
+                # The loop is closed; nobody is awaiting any more.
+                pass
+
+    def wait(self, timeout: float | None = None) -> ApprovalEvent | None:
+        if not self._ready.wait(timeout):
+            return None
+        self._ready.clear()
+        return self.event
+
+    async def wait_async(self, timeout: float | None = None) -> ApprovalEvent | None:
+        """Like ``wait``, but awaited on the running event loop."""
+        if not self._ready.is_set():
+            ready = asyncio.Event()
+            self._waiter = (asyncio.get_running_loop(), ready)
+            try:
+                # Re-check: an event delivered before the waiter was registered set only ``_ready``.
+                if not self._ready.is_set():
+                    await asyncio.wait_for(ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+            finally:
+                self._waiter = None
+        self._ready.clear()
+        return self.event
+
+    def close(self) -> None:
+        self.bus._unsubscribe(self)
+
+    def __enter__(self) -> "Subscription":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class InProcessBus:
+    def __init__(self) -> None:
+        self._subscribers: dict[str | None, set[Subscription]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, approval_id: str | None = None) -> Subscription:
+        subscription = Subscription(self, approval_id)
+        with self._lock:
+            self._subscribers.setdefault(approval_id, set()).add(subscription)
+        return subscription
+
+    def _unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.approval_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.approval_id]
+
+    def _dispatch(self, event: ApprovalEvent) -> None:
+        with self._lock:
+            targets = list(self._subscribers.get(event.approval_id, ()))
+            targets.extend(self._subscribers.get(None, ()))
+        for subscription in targets:
+            subscription._deliver(event)
+
+    def publish(self, event: ApprovalEvent) -> None:
+        self._dispatch(event)
+
+    def close(self) -> None:
+        pass
+
+
+class SqliteChangeBus(InProcessBus):
+    """Change-sequence table in a SQLite file shared by all workers."""
+
+    PRUNE_INTERVAL_SEC = 60.0
+    # Events published this long before the first subscriber still reach it (clock skew between workers).
+    RESUME_SLACK_SEC = 1.0
+
+    def __init__(self, path: str, interval: float = 0.05, retention_sec: float = 3600.0) -> None:
+        super().__init__()
+        self.path = path
+        self.interval = interval
+        self.retention_sec = retention_sec
+        self._write_lock = threading.Lock()
+        self._pruned_at = 0.0
+        self._watching = threading.Event()
+        self._since = 0.0
+        self._writer = self._connect()
+        self._writer.execute(
+            "CREATE TABLE IF NOT EXISTS approval_changes ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, approval_id TEXT NOT NULL, "
+            "client_id TEXT NOT NULL, status TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._writer.commit()
+        row = self._writer.execute("SELECT COALESCE(MAX(seq), 0) FROM approval_changes").fetchone()
+        self._last_seq = row[0]
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="approval-changes", daemon=True)
+        self._thread.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=wal")
+        # Change rows are transient: losing the last ones on power loss only makes waiters time out.
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def subscribe(self, approval_id: str | None = None) -> Subscription:
+        subscription = super().subscribe(approval_id)
+        if not self._watching.is_set():
+            # A new subscriber reads the current state after subscribing; older changes are already in it.
+            self._since = time.time() - self.RESUME_SLACK_SEC
+            self._watching.set()
+        return subscription
+
+    def _unsubscribe(self, subscription: Subscription) -> None:
+        super()._unsubscribe(subscription)
+        with self._lock:
+            if not self._subscribers:
+                self._watching.clear()
+
+    def publish(self, event: ApprovalEvent) -> None:
+        now = time.time()
+        with self._write_lock:
+            self._writer.execute(
+                "INSERT INTO approval_changes (approval_id, client_id, status, created_at) VALUES (?, ?, ?, ?)",
+                (event.approval_id, event.client_id, event.status, now),
+            )
+            if now - self._pruned_at >= self.PRUNE_INTERVAL_SEC:
+                self._pruned_at = now
+                self._writer.execute(
+                    "DELETE FROM approval_changes WHERE created_at < ?", (now - self.retention_sec,)
+                )
+            self._writer.commit()
+        self._dispatch(event)
+
+    def _run(self) -> None:
+        reader = self._connect()
+        version = None
+        while not self._stopped.is_set():
+            # Idle without subscribers: nobody would receive what a poll finds.
+            if not self._watching.wait(1.0) or self._stopped.wait(self.interval):
+                continue
+            try:
+                current = reader.execute("PRAGMA data_version").fetchone()[0]
+                if current == version:
+                    continue
+                version = current
+                rows = reader.execute(
+                    "SELECT seq, approval_id, client_id, status FROM approval_changes"
+                    " WHERE seq > ? AND created_at >= ? ORDER BY seq",
+                    (self._last_seq, self._since),
+                ).fetchall()
+            except sqlite3.Error:
+                continue
+            for seq, approval_id, client_id, status in rows:
+                self._last_seq = seq
+                self._dispatch(ApprovalEvent(approval_id, client_id, status))
+        reader.close()
+
+    def close(self) -> None:
+        self._stopped.set()
+        self._watching.set()
+        self._thread.join(timeout=5)
+        self._writer.close()
+
+
+class UnixSocketBroker:
+    """Relay newline-delimited events between all connected clients."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._clients: set[socket.socket] = set()
+        self._lock = threading.Lock()
+        self._server: socket.socket | None = None
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> "UnixSocketBroker":
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self.path)
+        self._server.listen(64)
+        self._thread = threading.Thread(target=self._accept_loop, name="notify-broker", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        self.start()
+        self._thread.join()
+
+    def _accept_loop(self) -> None:
+        while True:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                return
+            with self._lock:
+                self._clients.add(conn)
+            threading.Thread(target=self._relay, args=(conn,), daemon=True).start()
+
+    def _relay(self, conn: socket.socket) -> None:
+        reader = conn.makefile("rb")
+        try:
+            for line in reader:
+                with self._lock:
+                    peers = [client for client in self._clients if client is not conn]
+                for peer in peers:
+                    try:
+                        peer.sendall(line)
+                    except OSError:
+                        self._drop(peer)
+        except OSError:
+            pass
+        finally:
+            self._drop(conn)
+
+    def _drop(self, conn: socket.socket) -> None:
+        with self._lock:
+            self._clients.discard(conn)
+        try:
+            conn.close()
+        except OSError:
+            pass
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+        with self._lock:
+            clients = list(self._clients)
+        for client in clients:
+            self._drop(client)
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+class UnixSocketBus(InProcessBus):
+    """Client of :class:`UnixSocketBroker`; reconnects in the background."""
+
+    def __init__(self, path: str, reconnect_interval: float = 0.5) -> None:
+        super().__init__()
+        self.path = path
+        self.reconnect_interval = reconnect_interval
+        self._sock: socket.socket | None = None
+        self._send_lock = threading.Lock()
+        self._connected = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="notify-client", daemon=True)
+        self._thread.start()
+
+    def wait_connected(self, timeout: float | None = None) -> bool:
+        return self._connected.wait(timeout)
+
+    def publish(self, event: ApprovalEvent) -> None:
+        line = (json.dumps(asdict(event)) + "\n").encode()
+        with self._send_lock:
+            if self._sock is not None:
+                try:
+                    self._sock.sendall(line)
+                except OSError:
+                    pass
+        self._dispatch(event)
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                sock.connect(self.path)
+            except OSError:
+                self._stopped.wait(self.reconnect_interval)
+                continue
+            with self._send_lock:
+                self._sock = sock
+            self._connected.set()
+            try:
+                for line in sock.makefile("rb"):
+                    try:
+                        self._dispatch(ApprovalEvent(**json.loads(line)))
+                    except (ValueError, TypeError):
+                        continue
+            except OSError:
+                pass
+            with self._send_lock:
+                self._sock = None
+            self._connected.clear()
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    def close(self) -> None:
+        self._stopped.set()
+        with self._send_lock:
+            sock, self._sock = self._sock, None
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+        self._thread.join(timeout=5)
+
+
+_bus: InProcessBus | None = None
+_bus_key: tuple | None = None
+_bus_lock = threading.Lock()
+
+
+def get_bus() -> InProcessBus:
+    global _bus, _bus_key
+    settings = get_settings()
+    key = (settings.notify_backend, settings.notify_sqlite_path, settings.notify_socket_path)
+    if key != _bus_key:
+        with _bus_lock:
+            if key != _bus_key:
+                if _bus is not None:
+                    _bus.close()
+                if settings.notify_backend == "sqlite":
+                    _bus = SqliteChangeBus(settings.notify_sqlite_path)
+                elif settings.notify_backend == "unix":
+                    _bus = UnixSocketBus(settings.notify_socket_path)
+                else:
+                    _bus = InProcessBus()
+                _bus_key = key
+    return _bus
+
+
+def publish_approval(approval) -> None:
+    """Announce the committed state of ``approval`` to all waiters."""
+    try:
+        get_bus().publish(ApprovalEvent(approval.approval_id, approval.client_id, approval.status))
+    except Exception:
+        # The state change is already committed; waiters fall back to their timeout.
+        pass
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Approval notification broker (Unix socket).")
+    parser.add_argument("--socket", default=get_settings().notify_socket_path)
+    args = parser.parse_args()
+    broker = UnixSocketBroker(args.socket)
+    print(f"[Notify] Broker listening on {args.socket}", flush=True)
+    try:
+        broker.serve_forever()
+    except KeyboardInterrupt:
+        broker.stop()
+
+
+if __name__ == "__main__":
+    main()
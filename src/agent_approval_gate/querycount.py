@@ -0,0 +1,59 @@
+"""Per-request SQL round trips.
+
+Engine events, registered once for every engine including shard engines,
+count each statement sent to the database and each commit against the
+request that issued it. ``main`` opens a tally around every request. The
+tally is recorded in ``approval_gate_http_request_sql_statements`` and
+``approval_gate_http_request_sql_commits``. With ``DEBUG_SQL_HEADERS=1``
+it is also returned as ``X-SQL-Statements`` and ``X-SQL-Commits``.
+``tests/test_sql_budget.py`` holds each endpoint to a budget.
+
+The tally lives in a context variable, which the threadpool copies into
+sync endpoints. Work on other threads, such as group-committed writes and
+background retention, is not counted.
+"""
+
+import contextlib
+import contextvars
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+STATEMENTS_HEADER = "X-SQL-Statements"
+COMMITS_HEADER = "X-SQL-Commits"
+
+
+class Tally:
+    __slots__ = ("statements", "commits")
+
+    def __init__(self) -> None:
+        self.statements = 0
+        self.commits = 0
+
+
+_current: contextvars.ContextVar[Tally | None] = contextvars.ContextVar("sql_tally", default=None)
+
+
+@contextlib.contextmanager
+def tally():
+    """Count the statements and commits issued in this context."""
+    current = Tally()
+    token = _current.set(current)
+    try:
+        yield current
+    finally:
+        _current.reset(token)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany) -> None:
+    current = _current.get()
+    if current is not None:
+        current.statements += 1
+
+
+@event.listens_for(Engine, "commit")
+def _count_commit(conn) -> None:
+    current = _current.get()
+    if current is not None:
+        current.commits += 1
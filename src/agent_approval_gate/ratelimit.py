@@ -0,0 +1,175 @@
+"""Token-bucket admission control for ``POST /v1/approvals``.
+
+Each client and each ``(client, session)`` pair has a bucket holding up to
+one minute's worth of creations (``RATE_LIMIT_CLIENT_PER_MIN``,
+``RATE_LIMIT_SESSION_PER_MIN``) that refills continuously. A creation
+takes one token from every bucket it touches, or from none: when any
+bucket is empty the request is rejected with 429 and ``Retry-After`` set
+to the time until that bucket holds a token again.
+
+A bucket is only ``(tokens, updated_at)``. The ``memory`` backend keeps
+them in a dict per process. The ``db`` backend keeps them in
+``rate_limit_buckets`` and refills and takes in a single conditional
+``UPDATE``, so every worker on the database shares the same budget. A
+bucket left idle for a full refill period is indistinguishable from a
+new one, so both backends delete such buckets periodically.
+"""
+
+import math
+import threading
+import time
+from dataclasses import dataclass
+
+from fastapi import HTTPException
+from sqlalchemy import case, delete, insert, select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from agent_approval_gate import metrics
+from agent_approval_gate.config import get_settings
+from agent_approval_gate.models import RateLimitBucket
+
+SWEEP_INTERVAL_SEC = 60.0
+
+_INSERTS = {"sqlite": sqlite_insert, "postgresql": postgresql_insert}
+
+
+@dataclass(frozen=True)
+class Limit:
+    rate: float  # tokens per second
+    capacity: float
+
+    @classmethod
+    def per_minute(cls, count: float) -> "Limit | None":
+        return cls(count / 60.0, count) if count > 0 else None
+
+    @property
+    def refill_sec(self) -> float:
+        return self.capacity / self.rate
+
+    def refill(self, tokens: float, elapsed: float) -> float:
+        return min(self.capacity, tokens + max(elapsed, 0.0) * self.rate)
+
+    def wait(self, tokens: float) -> float:
+        return (1 - tokens) / self.rate
+
+
+# (reason, bucket key, limit); reason labels the throttled metric.
+Request = tuple[str, str, Limit]
+
+
+class MemoryBuckets:
+    """Buckets of this process: ``key -> (tokens, updated_at)``."""
+
+    def __init__(self) -> None:
+        self._buckets: dict[str, tuple[float, float]] = {}
+        self._lock = threading.Lock()
+        self._swept_at = 0.0
+
+    def take(self, db: Session, requests: list[Request], now: float) -> tuple[float, str | None]:
+        with self._lock:
+            levels = []
+            for reason, key, limit in requests:
+                tokens, updated_at = self._buckets.get(key, (limit.capacity, now))
+                tokens = limit.refill(tokens, now - updated_at)
+                if tokens < 1:
+                    return limit.wait(tokens), reason
+                levels.append(tokens)
+            for (_, key, _), tokens in zip(requests, levels):
+                self._buckets[key] = (tokens - 1, now)
+            if now - self._swept_at >= SWEEP_INTERVAL_SEC:
+                self._swept_at = now
+                idle = max(limit.refill_sec for _, _, limit in requests)
+                for key in [key for key, (_, updated_at) in self._buckets.items() if now - updated_at >= idle]:
+                    del self._buckets[key]
+        return 0.0, None
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class DatabaseBuckets:
+    """Buckets in ``rate_limit_buckets``, shared by every worker on the database."""
+
+    def __init__(self) -> None:
+        self._swept_at = 0.0
+
+    def _take_one(self, db: Session, key: str, limit: Limit, now: float) -> float:
+        columns = RateLimitBucket.__table__.c
+        refilled = columns.tokens + (now - columns.updated_at) * limit.rate
+        level = case((refilled > limit.capacity, limit.capacity), else_=refilled)
+        stmt = update(RateLimitBucket).where(columns.key == key, level >= 1).values(tokens=level - 1, updated_at=now)
+        if db.execute(stmt).rowcount:
+            return 0.0
+        row = db.execute(select(columns.tokens, columns.updated_at).where(columns.key == key)).first()
+        if row is not None:
+            return limit.wait(limit.refill(row.tokens, now - row.updated_at))
+        values = {"key": key, "tokens": limit.capacity - 1, "updated_at": now}
+        dialect_insert = _INSERTS.get(db.get_bind().dialect.name)
+        if dialect_insert is None:
+            db.execute(insert(RateLimitBucket).values(**values))
+            return 0.0
+        if db.execute(dialect_insert(RateLimitBucket).values(**values).on_conflict_do_nothing()).rowcount:
+            return 0.0
+        # Another worker created the bucket between our UPDATE and INSERT.
+        return self._take_one(db, key, limit, now)
+
+    def take(self, db: Session, requests: list[Request], now: float) -> tuple[float, str | None]:
+        for reason, key, limit in requests:
+            wait = self._take_one(db, key, limit, now)
+            if wait:
+                db.rollback()
+                return wait, reason
+        if now - self._swept_at >= SWEEP_INTERVAL_SEC:
+            self._swept_at = now
+            idle = max(limit.refill_sec for _, _, limit in requests)
+            db.execute(delete(RateLimitBucket).where(RateLimitBucket.updated_at < now - idle))
+        db.commit()
+        return 0.0, None
+
+
+class RateLimiter:
+    def __init__(self, backend: str, client_limit: Limit | None, session_limit: Limit | None) -> None:
+        if backend not in ("memory", "db"):
+            raise ValueError(f"unsupported RATE_LIMIT_BACKEND: {backend}")
+        self.buckets = MemoryBuckets() if backend == "memory" else DatabaseBuckets()
+        self.client_limit = client_limit
+        self.session_limit = session_limit
+
+    def admit(self, db: Session, client_id: str, session_id: str, now: float | None = None) -> None:
+        """Take a token for this creation or raise 429 with ``Retry-After``."""
+        requests = []
+        if self.client_limit:
+            requests.append(("client_rate", f"c:{client_id}", self.client_limit))
+        if self.session_limit:
+            requests.append(("session_rate", f"s:{client_id}:{session_id}", self.session_limit))
+        if not requests:
+            return
+        wait, reason = self.buckets.take(db, requests, time.time() if now is None else now)
+        if reason is None:
+            return
+        metrics.APPROVALS_THROTTLED.labels(reason).inc()
+        scope = "client" if reason == "client_rate" else "session"
+        raise HTTPException(
+            status_code=429,
+            detail=f"approval rate limit exceeded for this {scope}",
+            headers={"Retry-After": str(max(1, math.ceil(wait)))},
+        )
+
+
+_limiter: RateLimiter | None = None
+_limiter_key: tuple | None = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter() -> RateLimiter:
+    global _limiter, _limiter_key
+    settings = get_settings()
+    key = (settings.rate_limit_backend, settings.rate_limit_client_per_min, settings.rate_limit_session_per_min)
+    if _limiter is None or _limiter_key != key:
+        with _limiter_lock:
+            if _limiter is None or _limiter_key != key:
+                _limiter = RateLimiter(key[0], Limit.per_minute(key[1]), Limit.per_minute(key[2]))
+                _limiter_key = key
+    return _limiter
@@ -0,0 +1,610 @@
+"""Storage for approvals, allow rules and session allows.
+
+``service`` reaches these three tables only through a ``Repository``,
+obtained with ``repository.of(db)`` for the request's session:
+
+- ``SqlRepository`` (``STORAGE_BACKEND=sql``, the default) runs the queries
+  on the session.
+- ``MemoryRepository`` (``STORAGE_BACKEND=memory``) keeps the rows in
+  process-wide dicts with secondary indexes, guarded by one lock. It is
+  meant for ephemeral, high-throughput deployments and fast tests.
+  Everything is lost on restart, workers do not share it, and there is no
+  archive: retention drops old terminal approvals instead. New rows,
+  allow rule toggles and transitions are staged per repository and reach
+  the shared store only on ``commit``. A ``transition`` claims its row at
+  once, like the row lock an ``UPDATE`` takes: other transitions of that
+  row wait for the claim to commit or roll back, while readers keep
+  seeing the committed values.
+
+The session still carries the tables written in the same unit of work
+(stats rollups, idempotency keys), so ``commit`` and ``rollback`` cover
+both. A broken uniqueness rule surfaces as ``Conflict``. The rules are one
+pending approval per content hash, one allow rule per action and one
+session allow per session and action.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from collections import defaultdict
+
+from sqlalchemy import and_, func, literal, or_, select, tuple_, union_all, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from agent_approval_gate.config import get_settings
+from agent_approval_gate.models import AllowRule, Approval, ApprovalArchive, SessionAllow
+
+
+class Conflict(Exception):
+    """A write broke a uniqueness rule; nothing from the unit of work was kept."""
+
+
+class Repository:
+    """What ``service`` needs from storage. Rows are the ORM model classes."""
+
+    def __init__(self, db: Session) -> None:
+        self.db = db
+
+    # ---- allow rules ----
+
+    def get_allow_rule(self, client_id: str, action_type: str, enabled_only: bool = True) -> AllowRule | None:
+        raise NotImplementedError
+
+    def get_allow_rule_by_id(self, rule_id: str) -> AllowRule | None:
+        raise NotImplementedError
+
+    def add_allow_rule(self, rule: AllowRule) -> None:
+        raise NotImplementedError
+
+    def set_allow_rule_enabled(self, rule: AllowRule, enabled: bool) -> None:
+        """Stage enabling or disabling ``rule``."""
+        raise NotImplementedError
+
+    # ---- session allows ----
+
+    def get_session_allow(self, client_id: str, session_id: str, action_type: str) -> SessionAllow | None:
+        raise NotImplementedError
+
+    def add_session_allow(self, record: SessionAllow) -> None:
+        raise NotImplementedError
+
+    def find_standing_allow(self, client_id: str, session_id: str, action_type: str) -> tuple[str, str | None] | None:
+        """The decision a new approval gets without asking, from one lookup.
+
+        ``("6", rule_id)`` for an enabled allow rule, else ``("2", None)`` for
+        a session allow, else None.
+        """
+        raise NotImplementedError
+
+    # ---- approvals ----
+
+    def add_approval(self, approval: Approval) -> None:
+        raise NotImplementedError
+
+    def transition(self, approval: Approval, values: dict, now=None) -> bool:
+        """Stage ``values`` for ``approval`` only if it is still pending.
+
+        With ``now``, it must also expire after ``now``. The check and the
+        write are atomic. ``approval`` may belong to another session.
+        Returns False, changing nothing, if the check fails. ``approval``
+        shows ``values``, without being dirtied, once they are committed
+        (on SQL right away: the object is private to its session).
+        """
+        raise NotImplementedError
+
+    def find_approval(self, approval_id: str) -> Approval | ApprovalArchive | None:
+        """The approval in the hot table, else in the archive."""
+        raise NotImplementedError
+
+    def find_pending_by_hash(self, client_id: str, content_hash: str) -> Approval | None:
+        """The pending approval holding this content hash, expired or not."""
+        raise NotImplementedError
+
+    def count_pending(self, client_id: str, session_id: str, now) -> tuple[int, object]:
+        """Pending approvals of a session expiring after ``now``, and the earliest expiry among them."""
+        raise NotImplementedError
+
+    def list_overdue(self, now, limit: int) -> list[Approval]:
+        """Up to ``limit`` pending approvals whose expiry is not after ``now``."""
+        raise NotImplementedError
+
+    def list_approvals(
+        self,
+        client_id: str,
+        *,
+        now,
+        status: str | None = None,
+        session_id: str | None = None,
+        action_type: str | None = None,
+        channel: str | None = None,
+        created_after=None,
+        created_before=None,
+        before: tuple | None = None,
+        limit: int = 50,
+        archived: bool = False,
+    ) -> list:
+        """Newest first by ``(created_at, id)``, strictly below ``before`` when given.
+
+        ``status="pending"`` excludes, and ``status="expired"`` includes,
+        pending approvals whose expiry is not after ``now``.
+        """
+        raise NotImplementedError
+
+    # ---- unit of work ----
+
+    def commit(self) -> None:
+        raise NotImplementedError
+
+    def rollback(self) -> None:
+        raise NotImplementedError
+
+    def expire_all(self) -> None:
+        """Make the next reads see changes committed elsewhere."""
+
+
+class SqlRepository(Repository):
+    def get_allow_rule(self, client_id, action_type, enabled_only=True):
+        stmt = select(AllowRule).where(AllowRule.client_id == client_id, AllowRule.action_type == action_type)
+        if enabled_only:
+            stmt = stmt.where(AllowRule.enabled.is_(True))
+        return self.db.execute(stmt).scalars().first()
+
+    def get_allow_rule_by_id(self, rule_id):
+        return self.db.execute(select(AllowRule).where(AllowRule.rule_id == rule_id)).scalars().first()
+
+    def add_allow_rule(self, rule):
+        self.db.add(rule)
+
+    def set_allow_rule_enabled(self, rule, enabled):
+        rule.enabled = enabled
+
+    def get_session_allow(self, client_id, session_id, action_type):
+        stmt = select(SessionAllow).where(
+            SessionAllow.client_id == client_id,
+            SessionAllow.session_id == session_id,
+            SessionAllow.action_type == action_type,
+        )
+        return self.db.execute(stmt).scalars().first()
+
+    def add_session_allow(self, record):
+        self.db.add(record)
+
+    def find_standing_allow(self, client_id, session_id, action_type):
+        rule = select(literal("6"), AllowRule.rule_id).where(
+            AllowRule.client_id == client_id,
+            AllowRule.action_type == action_type,
+            AllowRule.enabled.is_(True),
+        )
+        session_allow = select(literal("2"), literal(None)).where(
+            SessionAllow.client_id == client_id,
+            SessionAllow.session_id == session_id,
+            SessionAllow.action_type == action_type,
+        )
+        found = dict(self.db.execute(union_all(rule, session_allow)).all())
+        if "6" in found:
+            return "6", found["6"]
+        return ("2", None) if "2" in found else None
+
+    def add_approval(self, approval):
+        self.db.add(approval)
+
+    def transition(self, approval, values, now=None):
+        stmt = update(Approval).where(Approval.id == approval.id, Approval.status == "pending")
+        if now is not None:
+            stmt = stmt.where(Approval.expires_at > now)
+        if self.db.execute(stmt.values(**values)).rowcount != 1:
+            return False
+        for key, value in values.items():
+            set_committed_value(approval, key, value)
+        return True
+
+    def find_approval(self, approval_id):
+        approval = self.db.execute(select(Approval).where(Approval.approval_id == approval_id)).scalars().first()
+        if approval is None:
+            stmt = select(ApprovalArchive).where(ApprovalArchive.approval_id == approval_id)
+            approval = self.db.execute(stmt).scalars().first()
+        return approval
+
+    def find_pending_by_hash(self, client_id, content_hash):
+        stmt = select(Approval).where(
+            Approval.client_id == client_id,
+            Approval.content_hash == content_hash,
+            # Inline literal so SQLite can match the partial unique index.
+            Approval.status == literal("pending", literal_execute=True),
+        )
+        return self.db.execute(stmt).scalars().first()
+
+    def count_pending(self, client_id, session_id, now):
+        stmt = select(func.count(), func.min(Approval.expires_at)).where(
+            Approval.client_id == client_id,
+            Approval.session_id == session_id,
+            # Inline literal so SQLite can match the partial index.
+            Approval.status == literal("pending", literal_execute=True),
+            Approval.expires_at > now,
+        )
+        count, earliest = self.db.execute(stmt).one()
+        return count, earliest
+
+    def list_overdue(self, now, limit):
+        stmt = select(Approval).where(Approval.status == "pending", Approval.expires_at <= now).limit(limit)
+        return list(self.db.execute(stmt).scalars())
+
+    def list_approvals(
+        self,
+        client_id,
+        *,
+        now,
+        status=None,
+        session_id=None,
+        action_type=None,
+        channel=None,
+        created_after=None,
+        created_before=None,
+        before=None,
+        limit=50,
+        archived=False,
+    ):
+        model = ApprovalArchive if archived else Approval
+        stmt = select(model).where(model.client_id == client_id)
+        if status == "pending":
+            stmt = stmt.where(model.status == "pending", model.expires_at > now)
+        elif status == "expired":
+            stmt = stmt.where(
+                or_(model.status == "expired", and_(model.status == "pending", model.expires_at <= now))
+            )
+        elif status is not None:
+            stmt = stmt.where(model.status == status)
+        if session_id is not None:
+            stmt = stmt.where(model.session_id == session_id)
+        if action_type is not None:
+            stmt = stmt.where(model.action_type == action_type)
+        if channel is not None:
+            stmt = stmt.where(model.channel == channel)
+        if created_after is not None:
+            stmt = stmt.where(model.created_at >= created_after)
+        if created_before is not None:
+            stmt = stmt.where(model.created_at < created_before)
+        if before is not None:
+            stmt = stmt.where(tuple_(model.created_at, model.id) < tuple_(*before))
+        stmt = stmt.order_by(model.created_at.desc(), model.id.desc()).limit(limit)
+        return list(self.db.execute(stmt).scalars())
+
+    def commit(self):
+        try:
+            self.db.commit()
+        except IntegrityError as exc:
+            self.db.rollback()
+            raise Conflict(str(exc.orig)) from exc
+
+    def rollback(self):
+        self.db.rollback()
+
+    def expire_all(self):
+        self.db.expire_all()
+
+
+class MemoryStore:
+    """Rows of the memory backend and their secondary indexes.
+
+    Pending indexes are pruned lazily: an entry whose approval has left
+    ``pending`` is dropped the next time a lookup meets it.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.approvals: dict[str, Approval] = {}
+        self.approvals_by_client: dict[str, dict[str, Approval]] = defaultdict(dict)
+        self.pending: dict[str, Approval] = {}
+        self.pending_by_hash: dict[tuple[str, str], Approval] = {}
+        self.pending_by_session: dict[tuple[str, str], dict[str, Approval]] = defaultdict(dict)
+        self.allow_rules: dict[str, AllowRule] = {}
+        self.allow_rules_by_action: dict[tuple[str, str], AllowRule] = {}
+        self.session_allows: dict[tuple[str, str, str], SessionAllow] = {}
+        # Approval ids with an uncommitted transition; ``settled`` wakes whoever waits on one.
+        self.claimed: set[str] = set()
+        self.settled = threading.Condition(self.lock)
+
+    def apply(
+        self, rows: list, toggles: list[tuple[AllowRule, bool]], transitions: list[tuple[Approval, dict]] = ()
+    ) -> list[tuple[Approval, dict]]:
+        """Write claimed ``transitions``, insert ``rows`` and set ``(rule, enabled)`` toggles, all or nothing.
+
+        Releases the transitions' claims and returns the values they replaced.
+        """
+        with self.lock:
+            # Transitions first: a row inserted in the same unit may take over a content hash they release.
+            previous = [(approval, {key: getattr(approval, key) for key in values}) for approval, values in transitions]
+            for approval, values in transitions:
+                for key, value in values.items():
+                    setattr(approval, key, value)
+            inserted = []
+            try:
+                for row in rows:
+                    self._insert(row)
+                    inserted.append(row)
+            except Conflict:
+                for row in inserted:
+                    self._delete(row)
+                for approval, values in previous:
+                    self._restore(approval, values)
+                raise
+            for rule, enabled in toggles:
+                rule.enabled = enabled
+            self._release(approval for approval, _ in transitions)
+        return previous
+
+    def release(self, approvals) -> None:
+        """Drop the claims of rolled-back transitions."""
+        with self.lock:
+            self._release(approvals)
+
+    def _release(self, approvals) -> None:
+        for approval in approvals:
+            self.claimed.discard(approval.approval_id)
+        self.settled.notify_all()
+
+    def _insert(self, row) -> None:
+        if isinstance(row, Approval):
+            self._insert_approval(row)
+        elif isinstance(row, AllowRule):
+            key = (row.client_id, row.action_type)
+            if key in self.allow_rules_by_action:
+                raise Conflict(f"allow rule exists for {key}")
+            row.id = next(self.ids)
+            row.enabled = True if row.enabled is None else row.enabled
+            self.allow_rules[row.rule_id] = self.allow_rules_by_action[key] = row
+        else:
+            key = (row.client_id, row.session_id, row.action_type)
+            if key in self.session_allows:
+                raise Conflict(f"session allow exists for {key}")
+            row.id = next(self.ids)
+            self.session_allows[key] = row
+
+    def _insert_approval(self, approval: Approval) -> None:
+        hash_key = (approval.client_id, approval.content_hash)
+        if approval.status == "pending" and approval.content_hash:
+            holder = self.pending_by_hash.get(hash_key)
+            if holder is not None and holder.status == "pending":
+                raise Conflict(f"pending approval exists for content hash {approval.content_hash}")
+        approval.id = next(self.ids)
+        self.approvals[approval.approval_id] = approval
+        self.approvals_by_client[approval.client_id][approval.approval_id] = approval
+        if approval.status == "pending":
+            self._index_pending(approval)
+
+    def _index_pending(self, approval: Approval) -> None:
+        self.pending[approval.approval_id] = approval
+        self.pending_by_session[(approval.client_id, approval.session_id)][approval.approval_id] = approval
+        if approval.content_hash:
+            self.pending_by_hash[(approval.client_id, approval.content_hash)] = approval
+
+    def restore(self, approval: Approval, values: dict) -> None:
+        """Put back column values of an undone transition, re-indexing it if it is pending again."""
+        with self.lock:
+            self._restore(approval, values)
+
+    def _restore(self, approval: Approval, values: dict) -> None:
+        for key, value in values.items():
+            setattr(approval, key, value)
+        if approval.status == "pending":
+            self._index_pending(approval)
+
+    def delete(self, row) -> None:
+        with self.lock:
+            self._delete(row)
+
+    def _delete(self, row) -> None:
+        if isinstance(row, Approval):
+            self._delete_approval(row)
+        elif isinstance(row, AllowRule):
+            self.allow_rules.pop(row.rule_id, None)
+            self.allow_rules_by_action.pop((row.client_id, row.action_type), None)
+        else:
+            self.session_allows.pop((row.client_id, row.session_id, row.action_type), None)
+
+    def _delete_approval(self, approval: Approval) -> None:
+        self.approvals.pop(approval.approval_id, None)
+        self.approvals_by_client[approval.client_id].pop(approval.approval_id, None)
+        self.pending.pop(approval.approval_id, None)
+        self.pending_by_session[(approval.client_id, approval.session_id)].pop(approval.approval_id, None)
+        if self.pending_by_hash.get((approval.client_id, approval.content_hash)) is approval:
+            del self.pending_by_hash[(approval.client_id, approval.content_hash)]
+
+    def prune(self, cutoff, limit: int) -> int:
+        """Drop up to ``limit`` approvals created before ``cutoff`` that are no longer pending.
+
+        Overdue pending approvals are left to ``service.expire_overdue``.
+        """
+        with self.lock:
+            old = [
+                approval
+                for approval in self.approvals.values()
+                if approval.created_at < cutoff and approval.status != "pending"
+            ][:limit]
+            for approval in old:
+                self._delete_approval(approval)
+        return len(old)
+
+    @staticmethod
+    def live_pending(index: dict[str, Approval]) -> list[Approval]:
+        stale = [approval_id for approval_id, approval in index.items() if approval.status != "pending"]
+        for approval_id in stale:
+            del index[approval_id]
+        return list(index.values())
+
+
+class MemoryRepository(Repository):
+    # How long a transition waits for another repository's claim on the same row, like SQLite's busy timeout.
+    CLAIM_TIMEOUT_SEC = 5.0
+
+    def __init__(self, store: MemoryStore, db: Session) -> None:
+        super().__init__(db)
+        self.store = store
+        self._added: list = []
+        self._toggled: list[tuple[AllowRule, bool]] = []
+        self._transitions: list[tuple[Approval, dict]] = []
+
+    def get_allow_rule(self, client_id, action_type, enabled_only=True):
+        rule = self.store.allow_rules_by_action.get((client_id, action_type))
+        if rule is None or (enabled_only and not rule.enabled):
+            return None
+        return rule
+
+    def get_allow_rule_by_id(self, rule_id):
+        return self.store.allow_rules.get(rule_id)
+
+    def add_allow_rule(self, rule):
+        self._add(rule)
+
+    def set_allow_rule_enabled(self, rule, enabled):
+        self._toggled.append((rule, enabled))
+
+    def get_session_allow(self, client_id, session_id, action_type):
+        return self.store.session_allows.get((client_id, session_id, action_type))
+
+    def add_session_allow(self, record):
+        self._add(record)
+
+    def find_standing_allow(self, client_id, session_id, action_type):
+        rule = self.get_allow_rule(client_id, action_type)
+        if rule is not None:
+            return "6", rule.rule_id
+        if self.get_session_allow(client_id, session_id, action_type) is not None:
+            return "2", None
+        return None
+
+    def add_approval(self, approval):
+        self._add(approval)
+
+    def transition(self, approval, values, now=None):
+        if any(claimed is approval for claimed, _ in self._transitions):
+            # Already moved out of pending in this unit of work.
+            return False
+        deadline = time.monotonic() + self.CLAIM_TIMEOUT_SEC
+        with self.store.settled:
+            while approval.approval_id in self.store.claimed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise Conflict(f"approval {approval.approval_id} is locked by another transaction")
+                self.store.settled.wait(remaining)
+            if approval.status != "pending" or (now is not None and approval.expires_at <= now):
+                return False
+            self.store.claimed.add(approval.approval_id)
+        self._transitions.append((approval, values))
+        return True
+
+    def _add(self, row) -> None:
+        self._added.append(row)
+
+    def find_approval(self, approval_id):
+        return self.store.approvals.get(approval_id)
+
+    def find_pending_by_hash(self, client_id, content_hash):
+        approval = self.store.pending_by_hash.get((client_id, content_hash))
+        return approval if approval is not None and approval.status == "pending" else None
+
+    def count_pending(self, client_id, session_id, now):
+        with self.store.lock:
+            index = self.store.pending_by_session.get((client_id, session_id))
+            live = [a.expires_at for a in self.store.live_pending(index) if a.expires_at > now] if index else []
+        return len(live), min(live, default=None)
+
+    def list_overdue(self, now, limit):
+        with self.store.lock:
+            pending = self.store.live_pending(self.store.pending)
+            overdue = [approval for approval in pending if approval.expires_at <= now]
+        return overdue[:limit]
+
+    def list_approvals(
+        self,
+        client_id,
+        *,
+        now,
+        status=None,
+        session_id=None,
+        action_type=None,
+        channel=None,
+        created_after=None,
+        created_before=None,
+        before=None,
+        limit=50,
+        archived=False,
+    ):
+        if archived:
+            return []
+
+        def matches(approval: Approval) -> bool:
+            expired = approval.status == "pending" and approval.expires_at <= now
+            if status == "pending" and (approval.status != "pending" or expired):
+                return False
+            if status == "expired" and not (approval.status == "expired" or expired):
+                return False
+            if status not in (None, "pending", "expired") and approval.status != status:
+                return False
+            return (
+                (session_id is None or approval.session_id == session_id)
+                and (action_type is None or approval.action_type == action_type)
+                and (channel is None or approval.channel == channel)
+                and (created_after is None or approval.created_at >= created_after)
+                and (created_before is None or approval.created_at < created_before)
+                and (before is None or (approval.created_at, approval.id) < tuple(before))
+            )
+
+        with self.store.lock:
+            rows = list(filter(matches, self.store.approvals_by_client.get(client_id, {}).values()))
+        return heapq.nlargest(limit, rows, key=lambda approval: (approval.created_at, approval.id))
+
+    def commit(self):
+        toggled = [(rule, rule.enabled) for rule, _ in self._toggled]
+        try:
+            previous = self.store.apply(self._added, self._toggled, self._transitions)
+        except Conflict:
+            self.rollback()
+            raise
+        self._transitions.clear()
+        try:
+            self.db.commit()
+        except IntegrityError as exc:
+            self.store.apply([], toggled)
+            for approval, values in reversed(previous):
+                self.store.restore(approval, values)
+            for row in reversed(self._added):
+                self.store.delete(row)
+            self.rollback()
+            raise Conflict(str(exc.orig)) from exc
+        self._added.clear()
+        self._toggled.clear()
+
+    def rollback(self):
+        self.db.rollback()
+        self._added.clear()
+        self._toggled.clear()
+        self.store.release(approval for approval, _ in self._transitions)
+        self._transitions.clear()
+
+
+_store: MemoryStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> MemoryStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = MemoryStore()
+    return _store
+
+
+def of(db: Session) -> Repository:
+    """The repository for ``db`` under the configured ``STORAGE_BACKEND``."""
+    backend = get_settings().storage_backend
+    if backend == "sql":
+        return SqlRepository(db)
+    if backend == "memory":
+        return MemoryRepository(get_store(), db)
+    raise ValueError(f"unsupported STORAGE_BACKEND: {backend}")
@@ -0,0 +1,218 @@
+"""Hot/cold retention for approvals.
+
+Each pass first expires overdue pending approvals through
+``service.expire_overdue``, which records the expiry in the stats and
+notifies waiters, and purges expired idempotency keys. Terminal approvals
+older than ``ARCHIVE_AFTER_DAYS`` are then moved from ``approvals`` to
+``approvals_archive`` in batches, so the hot table and its indexes only
+hold pending and recent rows. After each pass SQLite frees pages with
+``PRAGMA incremental_vacuum`` and refreshes planner statistics with
+``ANALYZE``. Lookups fall through to the archive in
+``service.get_approval``. With ``SHARD_DIR`` set, every pass covers the
+primary database and each client shard.
+
+Run once from the command line with
+``python -m agent_approval_gate.retention --days 30``.
+"""
+
+import argparse
+import datetime as dt
+import threading
+
+from sqlalchemy import delete, insert, literal, select
+from sqlalchemy.orm import Session
+
+from agent_approval_gate import idempotency, metrics, repository, sharding
+from agent_approval_gate.config import get_settings
+from agent_approval_gate.models import Approval, ApprovalArchive
+from agent_approval_gate.service import expire_overdue
+
+ARCHIVED_COLUMNS = [column.name for column in Approval.__table__.columns if column.name != "id"]
+SQLITE_AUTO_VACUUM_INCREMENTAL = 2
+
+
+def utcnow() -> dt.datetime:
+    return dt.datetime.utcnow()
+
+
+def archive_terminal(
+    db: Session,
+    older_than_days: float,
+    batch_size: int = 500,
+    now: dt.datetime | None = None,
+) -> int:
+    """Move approvals created before the cutoff that are no longer pending.
+
+    Pending rows stay, even if overdue: ``expire_overdue`` expires them
+    first so that stats and waiters hear about it. Each batch is its own
+    transaction so writers are only blocked briefly. Returns the number of
+    rows moved.
+    """
+    now = now or utcnow()
+    cutoff = now - dt.timedelta(days=older_than_days)
+    approvals = Approval.__table__
+    archive = ApprovalArchive.__table__
+    candidates = (
+        select(approvals.c.id)
+        .where(approvals.c.created_at < cutoff, approvals.c.status != "pending")
+        .order_by(approvals.c.created_at)
+        .limit(batch_size)
+    )
+    copied = [approvals.c[name] for name in ARCHIVED_COLUMNS]
+
+    moved = 0
+    while True:
+        ids = db.execute(candidates).scalars().all()
+        if not ids:
+            break
+        db.execute(
+            insert(archive).from_select(
+                [*ARCHIVED_COLUMNS, "archived_at"],
+                select(*copied, literal(now).label("archived_at")).where(approvals.c.id.in_(ids)),
+            )
+        )
+        db.execute(delete(approvals).where(approvals.c.id.in_(ids)))
+        db.commit()
+        moved += len(ids)
+        metrics.APPROVALS_ARCHIVED.inc(len(ids))
+        if len(ids) < batch_size:
+            break
+    return moved
+
+
+def run_maintenance(engine, vacuum_pages: int = 1000) -> None:
+    """Reclaim free pages (SQLite incremental auto-vacuum) and run ANALYZE."""
+    with engine.connect() as conn:
+        if engine.dialect.name == "sqlite":
+            mode = conn.exec_driver_sql("PRAGMA auto_vacuum").scalar()
+            if mode == SQLITE_AUTO_VACUUM_INCREMENTAL:
+                conn.exec_driver_sql(f"PRAGMA incremental_vacuum({int(vacuum_pages)})")
+        conn.exec_driver_sql("ANALYZE")
+        conn.commit()
+
+
+def enable_incremental_vacuum(engine) -> None:
+    """Switch an existing SQLite file to incremental auto-vacuum (full VACUUM, run offline)."""
+    with engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.exec_driver_sql("VACUUM")
+
+
+def run_once(session_local, engine, older_than_days: float, batch_size: int) -> int:
+    db = session_local()
+    try:
+        while expire_overdue(db, batch_size) >= batch_size:
+            pass
+        idempotency.purge_expired(db, batch_size)
+        moved = archive_terminal(db, older_than_days, batch_size)
+    finally:
+        db.close()
+    if moved:
+        run_maintenance(engine)
+    if get_settings().storage_backend == "memory":
+        # Nothing to archive into: old terminal approvals are dropped.
+        cutoff = utcnow() - dt.timedelta(days=older_than_days)
+        store = repository.get_store()
+        while True:
+            dropped = store.prune(cutoff, batch_size)
+            moved += dropped
+            if dropped < batch_size:
+                break
+    return moved
+
+
+def run_all(session_local, engine, older_than_days: float, batch_size: int) -> int:
+    """``run_once`` on the primary database and, with ``SHARD_DIR``, on every client shard."""
+    moved = run_once(session_local, engine, older_than_days, batch_size)
+    router = sharding.get_router()
+    if router is not None:
+        db = session_local()
+        try:
+            shards = router.shards(db)
+        finally:
+            db.close()
+        for shard in shards:
+            shard_engine, shard_session_local = router.open(shard)
+            moved += run_once(shard_session_local, shard_engine, older_than_days, batch_size)
+    return moved
+
+
+class RetentionWorker:
+    """Background thread that archives every ``interval`` seconds."""
+
+    def __init__(self, session_local, engine, older_than_days: float, interval: float, batch_size: int) -> None:
+        self.session_local = session_local
+        self.engine = engine
+        self.older_than_days = older_than_days
+        self.interval = interval
+        self.batch_size = batch_size
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="approval-retention", daemon=True)
+
+    def start(self) -> "RetentionWorker":
+        self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                run_all(self.session_local, self.engine, self.older_than_days, self.batch_size)
+            except Exception:
+                # Retry on the next tick; archival never affects request handling.
+                continue
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join(timeout=5)
+
+
+def start_worker() -> RetentionWorker | None:
+    settings = get_settings()
+    if settings.archive_after_days <= 0:
+        return None
+    from agent_approval_gate.database import SessionLocal, engine
+
+    return RetentionWorker(
+        SessionLocal,
+        engine,
+        settings.archive_after_days,
+        settings.archive_interval_sec,
+        settings.archive_batch_size,
+    ).start()
+
+
+def main() -> None:
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description="Archive terminal approvals and compact the database.")
+    parser.add_argument("--days", type=float, default=settings.archive_after_days or 30)
+    parser.add_argument("--batch-size", type=int, default=settings.archive_batch_size)
+    parser.add_argument(
+        "--enable-incremental-vacuum",
+        action="store_true",
+        help="convert an existing SQLite file to incremental auto-vacuum (rewrites the file)",
+    )
+    args = parser.parse_args()
+
+    from agent_approval_gate.database import SessionLocal, engine, init_db
+
+    init_db()
+    if args.enable_incremental_vacuum:
+        enable_incremental_vacuum(engine)
+    db = SessionLocal()
+    try:
+        moved = archive_terminal(db, args.days, args.batch_size)
+        router = sharding.get_router()
+        shards = {}
+        if router is not None:
+            shards = router.fan_out(db, lambda shard_db: archive_terminal(shard_db, args.days, args.batch_size))
+    finally:
+        db.close()
+    run_maintenance(engine)
+    for shard in shards:
+        run_maintenance(router.open(shard)[0])
+    moved += sum(shards.values())
+    print(f"[Retention] Archived {moved} approval(s) older than {args.days:g} day(s)", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -24,6 +24,7 @@ class ApprovalCreateResponse(BaseModel):
     approval_id: str
     status: str
     auto: bool
+    coalesced: bool = False  # 合并到了一个内容相同的待审批请求上
     expires_at: int | None = None
     decision: DecisionModel | None = None
 
@@ -36,6 +37,51 @@ class ApprovalStatusResponse(BaseModel):
     action_type: str | None = None
 
 
+class ApprovalListItem(BaseModel):
+    approval_id: str
+    status: str
+    created_at: int
+    expires_at: int
+    session_id: str
+    action_type: str
+    title: str
+    channel: str
+    decision: DecisionModel | None = None
+
+
+class ApprovalListResponse(BaseModel):
+    items: list[ApprovalListItem]
+    next_cursor: str | None = None  # 传回 cursor 参数获取下一页；None 表示没有更多
+
+
+class DecisionLatency(BaseModel):
+    count: int
+    p50: float | None = None  # seconds
+    p90: float | None = None
+    p99: float | None = None
+
+
+class StatsGroup(BaseModel):
+    created: int
+    auto_approved: int
+    approved: int
+    denied: int
+    expired: int
+    approval_rate: float | None = None
+    denial_rate: float | None = None
+    expiry_rate: float | None = None
+    auto_approve_rate: float | None = None
+    decision_latency: DecisionLatency
+
+
+class StatsResponse(BaseModel):
+    window: str
+    since: int
+    totals: StatsGroup
+    by_action_type: dict[str, StatsGroup]
+    by_channel: dict[str, StatsGroup]
+
+
 class EmailReplyIn(BaseModel):
     subject: str | None = None
     body: str
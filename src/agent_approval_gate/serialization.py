@@ -0,0 +1,87 @@
+"""Direct JSON rendering for the hot approval endpoints.
+
+With ``FAST_RESPONSES=1`` the handlers of ``POST /v1/approvals`` and
+``GET /v1/approvals/{approval_id}`` return pre-encoded bytes instead of a
+dict, which skips ``response_model`` validation and serialization. Their
+bodies are built from database rows whose types are already known, so the
+only check needed is the shape: each body is laid out in the model's field
+order, missing optional fields get the model default, and a missing
+required field raises. The layout is computed once per model, and
+encoding uses orjson when it is installed (stdlib ``json`` otherwise).
+The bytes are the same as FastAPI's for the model.
+"""
+
+import json
+import types
+import typing
+
+from fastapi import Response
+from pydantic import BaseModel
+
+from agent_approval_gate.config import get_settings
+
+try:
+    import orjson
+except ImportError:  # optional speed-up; the stdlib encoder gives the same bytes
+    orjson = None
+
+JSON_MEDIA_TYPE = "application/json"
+_REQUIRED = object()
+
+
+def _dumps_stdlib(obj) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+dumps = orjson.dumps if orjson is not None else _dumps_stdlib
+
+
+def _nested_model(annotation):
+    if typing.get_origin(annotation) in (typing.Union, types.UnionType):
+        models = [arg for arg in typing.get_args(annotation) if isinstance(arg, type) and issubclass(arg, BaseModel)]
+        return models[0] if len(models) == 1 else None
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return annotation
+    return None
+
+
+def _layout(model: type[BaseModel]) -> tuple:
+    layout = []
+    for name, field in model.model_fields.items():
+        default = _REQUIRED if field.is_required() else field.default
+        nested = _nested_model(field.annotation)
+        layout.append((name, default, _layout(nested) if nested else None))
+    return tuple(layout)
+
+
+def _shape(body: dict, layout: tuple) -> dict:
+    shaped = {}
+    for name, default, nested in layout:
+        value = body.get(name, default)
+        if value is _REQUIRED:
+            raise KeyError(f"response body is missing required field {name!r}")
+        if nested is not None and value is not None:
+            value = _shape(value, nested)
+        shaped[name] = value
+    return shaped
+
+
+class ModelEncoder:
+    """Encode handler bodies in ``model``'s wire format without building the model."""
+
+    def __init__(self, model: type[BaseModel]) -> None:
+        self.model = model
+        self.layout = _layout(model)
+
+    def __call__(self, body: dict) -> bytes:
+        return dumps(_shape(body, self.layout))
+
+
+def render(body: dict, encoder: ModelEncoder, response: Response):
+    """Return ``body`` for FastAPI to serialize, or pre-encoded bytes when FAST_RESPONSES is on."""
+    if not get_settings().fast_responses:
+        return body
+    fast = Response(content=encoder(body), media_type=JSON_MEDIA_TYPE)
+    # A returned Response bypasses the injected one, so carry its headers over.
+    fast.headers.update({key: value for key, value in response.headers.items() if key != "content-length"})
+    return fast
@@ -1,20 +1,38 @@
+import base64
 import datetime as dt
+import hashlib
+import json
+import math
+import time
 import uuid
+from typing import Callable, TypeVar
 
 from fastapi import HTTPException
-from sqlalchemy import select
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
+from agent_approval_gate import idempotency, metrics, notify, repository, stats, tracing, writer
 from agent_approval_gate.decision import Decision
-from agent_approval_gate.models import AllowRule, Approval, SessionAllow
+from agent_approval_gate.models import AllowRule, Approval, ApprovalArchive, SessionAllow
+
+
+T = TypeVar("T")
+
+
+class PendingDuplicate(Exception):
+    """A concurrent request committed a pending approval with the same content hash."""
 
 
 def utcnow() -> dt.datetime:
     return dt.datetime.utcnow()
 
 
-def make_approval_id() -> str:
-    return f"appr_{uuid.uuid4().hex}"  # Full 32 hex chars (128 bits)
+# Session.info key: hex digits every approval id created on that session starts with.
+APPROVAL_ID_PREFIX = "approval_id_prefix"
+
+
+def make_approval_id(prefix: str = "") -> str:
+    return f"appr_{prefix}{uuid.uuid4().hex[len(prefix):]}"  # Full 32 hex chars
 
 
 def make_rule_id() -> str:
@@ -35,70 +53,124 @@ def validate_target(channel: str, target: dict) -> dict:
     raise HTTPException(status_code=422, detail="invalid channel")
 
 
+def _write(repo: repository.Repository, write: Callable[[repository.Repository], T]) -> T:
+    """Run ``write`` and commit it, through the group-commit writer when it is on."""
+    group = writer.get_writer()
+    if group is None:
+        try:
+            result = write(repo)
+            repo.commit()
+        except Exception:
+            repo.rollback()
+            raise
+        return result
+    try:
+        return group.submit(repo.db.get_bind(), lambda db: write(repository.of(db)))
+    except writer.WriterUnavailable as exc:
+        # Nothing was written, so retrying is safe.
+        raise HTTPException(status_code=503, detail=str(exc), headers={"Retry-After": "1"}) from exc
+
+
+def _transition(repo: repository.Repository, approval: Approval, values: dict, now: dt.datetime | None = None) -> bool:
+    """Move a pending ``approval`` out of ``pending`` with one conditional write; False if another request did first.
+
+    The caller's object shows ``values`` once the write is committed.
+    """
+    return repo.transition(approval, values, now)
+
+
+def _reload(db: Session, approval: Approval) -> Approval:
+    """``approval`` as another request left it after winning the race."""
+    repository.of(db).expire_all()
+    return approval
+
+
 def get_allow_rule(db: Session, client_id: str, action_type: str) -> AllowRule | None:
-    stmt = select(AllowRule).where(
-        AllowRule.client_id == client_id,
-        AllowRule.action_type == action_type,
-        AllowRule.enabled.is_(True),
-    )
-    return db.execute(stmt).scalars().first()
+    return repository.of(db).get_allow_rule(client_id, action_type)
 
 
 def get_allow_rule_any(db: Session, client_id: str, action_type: str) -> AllowRule | None:
-    stmt = select(AllowRule).where(
-        AllowRule.client_id == client_id,
-        AllowRule.action_type == action_type,
-    )
-    return db.execute(stmt).scalars().first()
+    return repository.of(db).get_allow_rule(client_id, action_type, enabled_only=False)
 
 
 def get_session_allow(
     db: Session, client_id: str, session_id: str, action_type: str
 ) -> SessionAllow | None:
-    stmt = select(SessionAllow).where(
-        SessionAllow.client_id == client_id,
-        SessionAllow.session_id == session_id,
-        SessionAllow.action_type == action_type,
-    )
-    return db.execute(stmt).scalars().first()
+    return repository.of(db).get_session_allow(client_id, session_id, action_type)
 
 
 def create_session_allow(
     db: Session, client_id: str, session_id: str, action_type: str
 ) -> SessionAllow:
-    existing = get_session_allow(db, client_id, session_id, action_type)
+    return _write(repository.of(db), lambda repo: _stage_session_allow(repo, client_id, session_id, action_type))
+
+
+def _stage_session_allow(
+    repo: repository.Repository, client_id: str, session_id: str, action_type: str
+) -> SessionAllow:
+    existing = repo.get_session_allow(client_id, session_id, action_type)
     if existing:
         return existing
     record = SessionAllow(
         client_id=client_id,
         session_id=session_id,
         action_type=action_type,
+        created_at=utcnow(),
     )
-    db.add(record)
-    db.commit()
-    db.refresh(record)
+    repo.add_session_allow(record)
     return record
 
 
 def create_allow_rule(db: Session, client_id: str, action_type: str) -> AllowRule:
-    existing = get_allow_rule_any(db, client_id, action_type)
+    def write(repo: repository.Repository) -> AllowRule:
+        existing = repo.get_allow_rule(client_id, action_type, enabled_only=False)
+        return _stage_allow_rule(repo, existing, client_id, action_type)
+
+    return _write(repository.of(db), write)
+
+
+def _stage_allow_rule(
+    repo: repository.Repository,
+    existing: AllowRule | None,
+    client_id: str,
+    action_type: str,
+    rule_id: str | None = None,
+) -> AllowRule:
     if existing:
         if not existing.enabled:
-            existing.enabled = True
-            db.commit()
+            repo.set_allow_rule_enabled(existing, True)
         return existing
     rule = AllowRule(
-        rule_id=make_rule_id(),
+        rule_id=rule_id or make_rule_id(),
         client_id=client_id,
         action_type=action_type,
         enabled=True,
+        created_at=utcnow(),
     )
-    db.add(rule)
-    db.commit()
-    db.refresh(rule)
+    repo.add_allow_rule(rule)
     return rule
 
 
+def content_hash(session_id: str, action_type: str, preview: str, options: list[str] | None = None) -> str:
+    payload = json.dumps([session_id, action_type, preview, options or []], ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def find_pending_duplicate(db: Session, client_id: str, content_hash: str) -> Approval | None:
+    """The live pending approval with this content hash, if any."""
+    approval = repository.of(db).find_pending_by_hash(client_id, content_hash)
+    if approval is not None and approval.expires_at <= utcnow():
+        # Expiring it frees the hash for a new approval.
+        expire_if_needed(db, approval)
+        return None
+    return approval
+
+
+def count_pending(db: Session, client_id: str, session_id: str) -> tuple[int, dt.datetime | None]:
+    """Live pending approvals in a session and the earliest of their expiry times."""
+    return repository.of(db).count_pending(client_id, session_id, utcnow())
+
+
 def create_approval(
     db: Session,
     *,
@@ -110,15 +182,19 @@ def create_approval(
     target: dict,
     expires_in_sec: int,
     client_id: str,
+    idempotency_key: str | None = None,
+    request_hash: str = "",
+    content_hash: str | None = None,
+    max_pending: int = 0,
 ) -> tuple[Approval, bool]:
     now = utcnow()
     expires_at = now + dt.timedelta(seconds=expires_in_sec)
 
-    allow_rule = get_allow_rule(db, client_id, action_type)
-    session_allow = get_session_allow(db, client_id, session_id, action_type)
+    repo = repository.of(db)
+    standing = repo.find_standing_allow(client_id, session_id, action_type)
 
     approval = Approval(
-        approval_id=make_approval_id(),
+        approval_id=make_approval_id(db.info.get(APPROVAL_ID_PREFIX, "")),
         created_at=now,
         expires_at=expires_at,
         status="pending",
@@ -129,87 +205,277 @@ def create_approval(
         channel=channel,
         target=target,
         client_id=client_id,
+        content_hash=content_hash,
     )
 
-    auto = False
-    if allow_rule:
+    auto = standing is not None
+    if auto:
         approval.status = "approved"
-        approval.decision_code = "6"
-        approval.allow_rule_applied = allow_rule.rule_id
-        auto = True
-    elif session_allow:
-        approval.status = "approved"
-        approval.decision_code = "2"
-        auto = True
-
-    db.add(approval)
-    db.commit()
-    db.refresh(approval)
+        approval.decision_code, approval.allow_rule_applied = standing
+
+    if not auto and max_pending:
+        pending, earliest = count_pending(db, client_id, session_id)
+        if pending >= max_pending:
+            metrics.APPROVALS_THROTTLED.labels("session_pending").inc()
+            # A slot frees up at the latest when the oldest pending approval expires.
+            retry_after = min(60, max(1, math.ceil((earliest - now).total_seconds())))
+            raise HTTPException(
+                status_code=429,
+                detail=f"session has {pending} pending approvals (limit {max_pending})",
+                headers={"Retry-After": str(retry_after)},
+            )
+
+    def write(repo: repository.Repository) -> Approval:
+        repo.add_approval(approval)
+        stats.record_created(repo.db, approval, auto)
+        if idempotency_key:
+            idempotency.claim(repo.db, client_id, idempotency_key, request_hash, approval.approval_id, auto)
+        return approval
+
+    try:
+        _write(repo, write)
+    except repository.Conflict:
+        repo.rollback()
+        if content_hash and find_pending_duplicate(db, client_id, content_hash) is not None:
+            raise PendingDuplicate(content_hash)
+        if idempotency_key:
+            raise idempotency.KeyInUse(idempotency_key)
+        raise
+
+    metrics.APPROVALS_CREATED.labels(channel, action_type).inc()
+    if auto:
+        metrics.APPROVALS_AUTO_APPROVED.labels(channel, action_type).inc()
+    notify.publish_approval(approval)
     return approval, auto
 
 
 def expire_if_needed(db: Session, approval: Approval) -> Approval:
     if approval.status == "pending" and approval.expires_at <= utcnow():
-        approval.status = "expired"
-        db.commit()
-        db.refresh(approval)
+        _expire(db, approval)
     return approval
 
 
+def _expire(db: Session, approval: Approval) -> bool:
+    """Expire a pending ``approval``; False if another request decided or expired it first."""
+
+    def write(repo: repository.Repository) -> bool:
+        if not _transition(repo, approval, {"status": "expired"}):
+            return False
+        stats.record_expired(repo.db, approval)
+        return True
+
+    if not _write(repository.of(db), write):
+        _reload(db, approval)
+        return False
+    metrics.APPROVALS_EXPIRED.labels(approval.channel, approval.action_type).inc()
+    notify.publish_approval(approval)
+    return True
+
+
+def abandon(db: Session, approval: Approval) -> None:
+    """Expire a pending approval whose notification could not be sent.
+
+    Nobody can answer it, so it must not hold its content hash (coalescing
+    would attach retries to it) or a slot of the session's pending cap.
+    """
+    if approval.status == "pending":
+        _expire(db, approval)
+
+
+def find_approval(db: Session, approval_id: str) -> Approval | ApprovalArchive | None:
+    """Look up the hot table first, then the archive of terminal approvals."""
+    return repository.of(db).find_approval(approval_id)
+
+
+def expire_overdue(db: Session, limit: int = 500) -> int:
+    """Expire pending approvals past their deadline that nobody has read since."""
+    repo = repository.of(db)
+    overdue = repo.list_overdue(utcnow(), limit)
+    if not overdue:
+        return 0
+
+    def write(repo: repository.Repository) -> list[Approval]:
+        # A decision that landed since the listing keeps its row; only the rows moved here count.
+        expired = [approval for approval in overdue if _transition(repo, approval, {"status": "expired"})]
+        for approval in expired:
+            stats.record_expired(repo.db, approval)
+        return expired
+
+    expired = _write(repo, write)
+    for approval in expired:
+        metrics.APPROVALS_EXPIRED.labels(approval.channel, approval.action_type).inc()
+        notify.publish_approval(approval)
+    return len(expired)
+
+
 def get_approval(db: Session, approval_id: str) -> Approval:
-    stmt = select(Approval).where(Approval.approval_id == approval_id)
-    approval = db.execute(stmt).scalars().first()
+    approval = find_approval(db, approval_id)
     if not approval:
         raise HTTPException(status_code=404, detail="approval not found")
     return approval
 
 
+def encode_cursor(created_at: dt.datetime, row_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[dt.datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.split("|")
+        return dt.datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="invalid cursor")
+
+
+def list_approvals(
+    db: Session,
+    client_id: str,
+    *,
+    status: str | None = None,
+    session_id: str | None = None,
+    action_type: str | None = None,
+    channel: str | None = None,
+    created_after: dt.datetime | None = None,
+    created_before: dt.datetime | None = None,
+    cursor: str | None = None,
+    limit: int = 50,
+    archived: bool = False,
+) -> tuple[list[Approval], str | None]:
+    """Newest-first page of the client's approvals and the cursor for the next one.
+
+    Pages are keyed on ``(created_at, id)`` so each one costs the same no
+    matter how deep the caller has paged. A pending approval past its
+    deadline counts as ``expired``, matching what ``GET /v1/approvals/{id}``
+    returns.
+    """
+    rows = repository.of(db).list_approvals(
+        client_id,
+        now=utcnow(),
+        status=status,
+        session_id=session_id,
+        action_type=action_type,
+        channel=channel,
+        created_after=created_after,
+        created_before=created_before,
+        before=decode_cursor(cursor) if cursor is not None else None,
+        limit=limit + 1,
+        archived=archived,
+    )
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].created_at, rows[-1].id)
+
+
+async def wait_for_decision(db: Session, approval: Approval, timeout: float) -> Approval:
+    """Wait until ``approval`` leaves ``pending`` or ``timeout`` elapses.
+
+    Awaits the notification bus on the event loop instead of re-querying the
+    database or holding a threadpool worker; reads run in the threadpool and
+    release the session's connection before the next wait.
+    """
+    approval_id = approval.approval_id
+    with notify.get_bus().subscribe(approval_id) as subscription:
+        # Re-read after subscribing so a decision committed in between is not missed.
+        approval = await run_in_threadpool(_read_detached, db, approval_id)
+        remaining = min(timeout, max((approval.expires_at - utcnow()).total_seconds(), 0.0))
+        deadline = time.monotonic() + remaining
+        while approval.status == "pending" and remaining > 0:
+            event = await subscription.wait_async(remaining)
+            remaining = deadline - time.monotonic()
+            if event is None:
+                break
+            if event.status != "pending":
+                approval = await run_in_threadpool(_read_detached, db, approval_id)
+    if approval.status == "pending" and approval.expires_at <= utcnow():
+        approval = await run_in_threadpool(_read_detached, db, approval_id)
+    return approval
+
+
+def _read_detached(db: Session, approval_id: str) -> Approval:
+    """The current ``approval_id``, expired if overdue, with its values loaded and ``db`` closed."""
+    repository.of(db).expire_all()
+    approval = expire_if_needed(db, get_approval(db, approval_id))
+    db.close()
+    return approval
+
+
 def get_approval_no_check(db: Session, approval_id: str) -> Approval:
     """获取审批记录（不检查 client_id，用于邮件按钮回调）"""
-    stmt = select(Approval).where(Approval.approval_id == approval_id)
-    approval = db.execute(stmt).scalars().first()
+    approval = find_approval(db, approval_id)
     if not approval:
         raise HTTPException(status_code=404, detail="approval not found")
     return approval
 
 
 def apply_decision(db: Session, approval: Approval, decision: Decision) -> Approval:
+    with tracing.span(
+        "apply_decision",
+        **{tracing.APPROVAL_ID_ATTR: approval.approval_id, "decision.code": decision.code},
+    ):
+        return _apply_decision(db, approval, decision)
+
+
+def _apply_decision(db: Session, approval: Approval, decision: Decision) -> Approval:
     if approval.status != "pending":
         raise HTTPException(status_code=409, detail="approval not pending")
     if approval.expires_at <= utcnow():
-        approval.status = "expired"
-        db.commit()
-        db.refresh(approval)
+        if not _expire(db, approval):
+            raise HTTPException(status_code=409, detail="approval not pending")
         raise HTTPException(status_code=410, detail="approval expired")
 
-    approval.decision_code = decision.code
-    approval.decision_note = decision.note
-    approval.decision_override = decision.override
-
-    if decision.code == "3":
-        approval.status = "denied"
-    else:
-        approval.status = "approved"
-
-    if decision.code == "2":
-        create_session_allow(db, approval.client_id, approval.session_id, approval.action_type)
-    if decision.code == "6":
-        rule = create_allow_rule(db, approval.client_id, approval.action_type)
-        approval.allow_rule_applied = rule.rule_id
+    values = {
+        "status": "denied" if decision.code == "3" else "approved",
+        "decision_code": decision.code,
+        "decision_note": decision.note,
+        "decision_override": decision.override,
+    }
+
+    def write(repo: repository.Repository) -> bool:
+        # The status check and the write are one statement, so of several concurrent
+        # decisions exactly one lands. Only the winner stages its allow, in the same transaction.
+        rule = None
+        if decision.code == "6":
+            rule = repo.get_allow_rule(approval.client_id, approval.action_type, enabled_only=False)
+            values["allow_rule_applied"] = rule.rule_id if rule else make_rule_id()
+        if not _transition(repo, approval, values, now=utcnow()):
+            return False
+        if decision.code == "2":
+            _stage_session_allow(repo, approval.client_id, approval.session_id, approval.action_type)
+        if decision.code == "6":
+            _stage_allow_rule(repo, rule, approval.client_id, approval.action_type, values["allow_rule_applied"])
+        stats.record_decided(repo.db, approval, status=values["status"])
+        return True
+
+    try:
+        won = _write(repository.of(db), write)
+    except repository.Conflict:
+        # A decision on another approval created the same allow rule first; this time it is found.
+        won = _write(repository.of(db), write)
+    if not won:
+        if _reload(db, approval).status == "pending":
+            # Nobody decided it: it passed its deadline after the check above.
+            _expire(db, approval)
+            raise HTTPException(status_code=410, detail="approval expired")
+        raise HTTPException(status_code=409, detail="approval not pending")
 
-    db.commit()
-    db.refresh(approval)
+    metrics.APPROVALS_DECIDED.labels(approval.channel, approval.action_type, approval.status).inc()
+    metrics.DECISION_LATENCY.labels(approval.channel, approval.action_type).observe(
+        (utcnow() - approval.created_at).total_seconds()
+    )
+    notify.publish_approval(approval)
     return approval
 
 
 def revoke_allow_rule(db: Session, rule_id: str, client_id: str | None = None) -> AllowRule:
-    stmt = select(AllowRule).where(AllowRule.rule_id == rule_id)
-    rule = db.execute(stmt).scalars().first()
+    repo = repository.of(db)
+    rule = repo.get_allow_rule_by_id(rule_id)
     if not rule:
         raise HTTPException(status_code=404, detail="rule not found")
     if client_id and rule.client_id != client_id:
         raise HTTPException(status_code=404, detail="rule not found")
-    rule.enabled = False
-    db.commit()
-    db.refresh(rule)
+    repo.set_allow_rule_enabled(rule, False)
+    repo.commit()
     return rule
@@ -0,0 +1,301 @@
+"""Per-client SQLite sharding.
+
+With ``SHARD_DIR`` set, each client's approvals, allow rules, session
+allows, idempotency keys and rate-limit buckets live in their own SQLite
+file, ``SHARD_DIR/<shard>.db``, so tenants stop queueing on a single
+database write lock. ``DATABASE_URL`` stays the primary database. It holds
+the API keys, the webhook de-duplication table and ``client_shards``, the
+shard map from client id to shard. A client without a row is assigned
+``sha256(client_id)[:8]`` the first time it is seen. Rows can be edited
+(``assign``) to pin or group new tenants. Shard names are 8 hex digits.
+
+Approval ids created on a shard start with the shard name
+(``appr_<shard><24 hex>``). Endpoints that only receive an approval id,
+such as email action links and the Telegram webhook, can therefore find
+the right file without a lookup table. An id whose prefix is not in the
+shard map resolves to the primary database, where it is simply not
+found. Unknown ids never create files.
+
+Engines are opened on first use and kept in an LRU of at most
+``SHARD_MAX_OPEN``. Evicting one disposes its pool; sessions still using
+it finish normally. ``service`` never sees any of this, because it is
+handed a session bound to the right file. Work that spans tenants, such
+as retention and the CLI below, fans out over every shard::
+
+    python -m agent_approval_gate.sharding list
+    python -m agent_approval_gate.sharding assign <client_id> <shard>
+"""
+
+import argparse
+import contextlib
+import functools
+import hashlib
+import os
+import re
+import sys
+import threading
+from collections import OrderedDict
+from typing import Callable, TypeVar
+
+from fastapi import Depends
+from sqlalchemy import create_engine, func, insert, select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session, sessionmaker
+
+from agent_approval_gate import metrics
+from agent_approval_gate.auth import get_client_id, require_scope
+from agent_approval_gate.config import get_settings
+from agent_approval_gate.database import _set_journal_mode, get_db, init_schema
+from agent_approval_gate.models import Approval, ClientShard
+from agent_approval_gate.service import APPROVAL_ID_PREFIX
+
+SHARD_NAME_RE = re.compile(r"[0-9a-f]{8}")
+APPROVAL_ID_SHARD = slice(len("appr_"), len("appr_") + 8)
+
+_INSERTS = {"sqlite": sqlite_insert, "postgresql": postgresql_insert}
+
+T = TypeVar("T")
+
+
+def default_shard(client_id: str) -> str:
+    return hashlib.sha256(client_id.encode()).hexdigest()[:8]
+
+
+class ShardRouter:
+    """Shard map lookups and an LRU of open shard engines."""
+
+    def __init__(self, shard_dir: str, max_open: int, journal_mode: str | None = None) -> None:
+        self.shard_dir = shard_dir
+        self.max_open = max(1, max_open)
+        self.journal_mode = journal_mode
+        self._clients: dict[str, str] = {}
+        self._known: set[str] = set()
+        self._open: OrderedDict[str, tuple] = OrderedDict()
+        self._initialized: set[str] = set()
+        self._lock = threading.Lock()
+
+    # ---- shard map (primary database) ----
+
+    def shard_for(self, db: Session, client_id: str) -> str:
+        """The client's shard, assigning the default one on first sight."""
+        shard = self._clients.get(client_id)
+        if shard is not None:
+            return shard
+        stmt = select(ClientShard.shard).where(ClientShard.client_id == client_id)
+        shard = db.execute(stmt).scalar()
+        if shard is None:
+            values = {"client_id": client_id, "shard": default_shard(client_id)}
+            dialect_insert = _INSERTS.get(db.get_bind().dialect.name)
+            if dialect_insert is None:
+                db.execute(insert(ClientShard).values(**values))
+            else:
+                # Another worker may be assigning the same client; either row is the default.
+                db.execute(dialect_insert(ClientShard).values(**values).on_conflict_do_nothing())
+            db.commit()
+            shard = db.execute(stmt).scalar()
+        self._clients[client_id] = shard
+        self._known.add(shard)
+        return shard
+
+    def shard_of_approval(self, db: Session, approval_id: str) -> str | None:
+        """The shard named by an approval id, or None if no client maps to it."""
+        shard = approval_id[APPROVAL_ID_SHARD]
+        if shard in self._known:
+            return shard
+        if not SHARD_NAME_RE.fullmatch(shard):
+            return None
+        if db.execute(select(ClientShard.client_id).where(ClientShard.shard == shard).limit(1)).first() is None:
+            return None
+        self._known.add(shard)
+        return shard
+
+    def shards(self, db: Session) -> list[str]:
+        return list(db.execute(select(ClientShard.shard).distinct().order_by(ClientShard.shard)).scalars())
+
+    def assign(self, db: Session, client_id: str, shard: str) -> None:
+        """Point ``client_id`` at ``shard``. Existing rows are not moved."""
+        if not SHARD_NAME_RE.fullmatch(shard):
+            raise ValueError(f"shard names are 8 lowercase hex digits: {shard!r}")
+        stmt = update(ClientShard).where(ClientShard.client_id == client_id).values(shard=shard)
+        if db.execute(stmt).rowcount == 0:
+            db.add(ClientShard(client_id=client_id, shard=shard))
+        db.commit()
+        self._clients.pop(client_id, None)
+
+    # ---- shard engines ----
+
+    def open(self, shard: str) -> tuple:
+        """``(engine, session_local)`` for ``shard``, creating the file and schema on first use."""
+        with self._lock:
+            opened = self._open.get(shard)
+            if opened is not None:
+                self._open.move_to_end(shard)
+                return opened
+            os.makedirs(self.shard_dir, exist_ok=True)
+            path = os.path.join(self.shard_dir, f"{shard}.db")
+            engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False}, future=True)
+            if self.journal_mode:
+                _set_journal_mode(engine, self.journal_mode)
+            if shard not in self._initialized:
+                init_schema(engine)
+                self._initialized.add(shard)
+            session_local = sessionmaker(
+                autocommit=False,
+                autoflush=False,
+                expire_on_commit=False,
+                bind=engine,
+                future=True,
+                info={APPROVAL_ID_PREFIX: shard},
+            )
+            opened = self._open[shard] = (engine, session_local)
+            while len(self._open) > self.max_open:
+                _, (evicted, _) = self._open.popitem(last=False)
+                evicted.dispose()
+            metrics.SHARDS_OPEN.set(len(self._open))
+            return opened
+
+    @contextlib.contextmanager
+    def session(self, shard: str):
+        db = self.open(shard)[1]()
+        metrics.DB_SESSIONS_IN_USE.inc()
+        try:
+            yield db
+        finally:
+            db.close()
+            metrics.DB_SESSIONS_IN_USE.dec()
+
+    def fan_out(self, db: Session, fn: Callable[[Session], T]) -> dict[str, T]:
+        """Run ``fn`` on a session of every shard in the map, one shard at a time."""
+        results = {}
+        for shard in self.shards(db):
+            with self.session(shard) as shard_db:
+                results[shard] = fn(shard_db)
+        return results
+
+    def close(self) -> None:
+        with self._lock:
+            for engine, _ in self._open.values():
+                engine.dispose()
+            self._open.clear()
+            metrics.SHARDS_OPEN.set(0)
+
+
+_router: ShardRouter | None = None
+_router_key: tuple | None = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> ShardRouter | None:
+    """The process-wide router, or None when sharding is off."""
+    global _router, _router_key
+    settings = get_settings()
+    if not settings.shard_dir:
+        return None
+    key = (settings.shard_dir, settings.shard_max_open, settings.sqlite_journal_mode)
+    if _router is None or _router_key != key:
+        with _router_lock:
+            if _router is None or _router_key != key:
+                if _router is not None:
+                    _router.close()
+                _router = ShardRouter(*key)
+                _router_key = key
+    return _router
+
+
+# ---- FastAPI dependencies ----
+
+
+@functools.lru_cache()
+def client_db(scope: str = "approvals"):
+    """Dependency factory: a session on the authenticated client's shard.
+
+    Without sharding this is the request's primary session.
+    """
+    authenticate = get_client_id if scope == "approvals" else require_scope(scope)
+
+    def dependency(client_id: str = Depends(authenticate), db=Depends(get_db)):
+        router = get_router()
+        if router is None:
+            yield db
+            return
+        with router.session(router.shard_for(db, client_id)) as shard_db:
+            yield shard_db
+
+    return dependency
+
+
+get_client_db = client_db()
+
+
+@contextlib.contextmanager
+def approval_session(db: Session, approval_id: str):
+    """A session on the shard holding ``approval_id``; ``db`` itself when unsharded or unknown."""
+    router = get_router()
+    shard = router.shard_of_approval(db, approval_id) if router is not None else None
+    if shard is None:
+        yield db
+        return
+    with router.session(shard) as shard_db:
+        yield shard_db
+
+
+def get_approval_db(approval_id: str, db=Depends(get_db)):
+    """Dependency for routes with an ``{approval_id}`` but no client."""
+    with approval_session(db, approval_id) as approval_db:
+        yield approval_db
+
+
+def bind_for_approval(db: Session, approval_id: str):
+    """Engine holding ``approval_id``, for work on detached sessions; ``db``'s bind when unsharded."""
+    router = get_router()
+    shard = router.shard_of_approval(db, approval_id) if router is not None else None
+    if shard is None:
+        return db.get_bind()
+    return router.open(shard)[0]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Inspect and edit the per-client shard map.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="approvals per shard (fans out over every shard)")
+    assign = sub.add_parser("assign", help="pin a client to a shard; its existing rows are not moved")
+    assign.add_argument("client_id")
+    assign.add_argument("shard")
+    args = parser.parse_args()
+
+    router = get_router()
+    if router is None:
+        print("[Shards] SHARD_DIR is not set", file=sys.stderr, flush=True)
+        raise SystemExit(1)
+
+    from agent_approval_gate.database import SessionLocal, init_db
+
+    init_db()
+    db = SessionLocal()
+    try:
+        if args.command == "assign":
+            try:
+                router.assign(db, args.client_id, args.shard)
+            except ValueError as exc:
+                print(f"[Shards] {exc}", file=sys.stderr, flush=True)
+                raise SystemExit(1)
+            print(f"[Shards] {args.client_id} -> {args.shard}", flush=True)
+        else:
+            counts = router.fan_out(
+                db,
+                lambda shard_db: shard_db.execute(
+                    select(func.count(), func.count().filter(Approval.status == "pending")).select_from(Approval)
+                ).one(),
+            )
+            clients = db.execute(select(ClientShard.shard, func.count()).group_by(ClientShard.shard)).all()
+            for shard, client_count in clients:
+                total, pending = counts[shard]
+                print(f"{shard}\t{client_count} client(s)\t{total} approval(s)\t{pending} pending")
+    finally:
+        db.close()
+        router.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""Approval analytics from incremental rollups.
+
+Every create, decision and expiry adds one upsert to ``approval_rollups``
+(hourly counters per client, action_type and channel) in the same
+transaction as the state change; human decisions also bump one bin of
+``latency_rollups``. ``GET /v1/stats`` only reads these small tables, never
+``approvals``.
+
+Decision latency is a log-bucketed sketch with relative error
+``SKETCH_ALPHA``: bin ``i`` counts latencies in ``(gamma**(i-1), gamma**i]``,
+so sketches from any set of hours, action types or channels merge by adding
+counts per bin.
+"""
+
+import datetime as dt
+import math
+
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from agent_approval_gate.models import ApprovalRollup, LatencyRollup
+
+SKETCH_ALPHA = 0.02
+GAMMA = (1 + SKETCH_ALPHA) / (1 - SKETCH_ALPHA)
+MIN_LATENCY_SEC = 0.001
+COUNTERS = ("created", "auto_approved", "approved", "denied", "expired")
+QUANTILES = {"p50": 0.5, "p90": 0.9, "p99": 0.99}
+WINDOWS = {
+    "1h": dt.timedelta(hours=1),
+    "24h": dt.timedelta(hours=24),
+    "7d": dt.timedelta(days=7),
+    "30d": dt.timedelta(days=30),
+}
+
+_UPSERTS = {"sqlite": sqlite_insert, "postgresql": postgresql_insert}
+
+
+class LatencySketch:
+    """Mergeable quantile sketch over positive latencies (seconds)."""
+
+    def __init__(self, bins: dict[int, int] | None = None) -> None:
+        self.bins: dict[int, int] = dict(bins or {})
+
+    @staticmethod
+    def bin_for(value: float) -> int:
+        return math.ceil(math.log(max(value, MIN_LATENCY_SEC), GAMMA))
+
+    def add(self, value: float, count: int = 1) -> None:
+        index = self.bin_for(value)
+        self.bins[index] = self.bins.get(index, 0) + count
+
+    def merge(self, other: "LatencySketch") -> "LatencySketch":
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        return self
+
+    @property
+    def count(self) -> int:
+        return sum(self.bins.values())
+
+    def quantile(self, q: float) -> float | None:
+        total = self.count
+        if not total:
+            return None
+        rank = q * (total - 1)
+        seen = 0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                # Midpoint of the bin in relative terms: within SKETCH_ALPHA of any value in it.
+                return 2 * GAMMA**index / (GAMMA + 1)
+        return 2 * GAMMA ** max(self.bins) / (GAMMA + 1)
+
+
+def utcnow() -> dt.datetime:
+    return dt.datetime.utcnow()
+
+
+def bucket_start(timestamp: dt.datetime) -> dt.datetime:
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def _increment(db: Session, model, key: dict, **deltas: int) -> None:
+    columns = model.__table__.c
+    upsert = _UPSERTS.get(db.get_bind().dialect.name)
+    if upsert is not None:
+        stmt = upsert(model).values(**key, **deltas).on_conflict_do_update(
+            index_elements=list(key),
+            set_={name: columns[name] + delta for name, delta in deltas.items()},
+        )
+        db.execute(stmt)
+        return
+    stmt = (
+        update(model)
+        .where(*(columns[name] == value for name, value in key.items()))
+        .values({name: columns[name] + delta for name, delta in deltas.items()})
+    )
+    if db.execute(stmt).rowcount == 0:
+        db.add(model(**key, **deltas))
+
+
+def _rollup_key(approval, timestamp: dt.datetime) -> dict:
+    return {
+        "client_id": approval.client_id,
+        "bucket_start": bucket_start(timestamp),
+        "action_type": approval.action_type,
+        "channel": approval.channel,
+    }
+
+
+def record_created(db: Session, approval, auto: bool) -> None:
+    deltas = {"created": 1, "auto_approved": 1} if auto else {"created": 1}
+    _increment(db, ApprovalRollup, _rollup_key(approval, approval.created_at), **deltas)
+
+
+def record_decided(db: Session, approval, now: dt.datetime | None = None, status: str | None = None) -> None:
+    now = now or utcnow()
+    key = _rollup_key(approval, now)
+    _increment(db, ApprovalRollup, key, **{status or approval.status: 1})
+    latency = (now - approval.created_at).total_seconds()
+    _increment(db, LatencyRollup, {**key, "bin": LatencySketch.bin_for(latency)}, count=1)
+
+
+def record_expired(db: Session, approval) -> None:
+    _increment(db, ApprovalRollup, _rollup_key(approval, utcnow()), expired=1)
+
+
+def _summarize(counts: dict[str, int], sketch: LatencySketch) -> dict:
+    resolved = counts["approved"] + counts["denied"] + counts["expired"]
+
+    def rate(numerator: int, denominator: int) -> float | None:
+        return round(numerator / denominator, 4) if denominator else None
+
+    return {
+        **counts,
+        "approval_rate": rate(counts["approved"], resolved),
+        "denial_rate": rate(counts["denied"], resolved),
+        "expiry_rate": rate(counts["expired"], resolved),
+        "auto_approve_rate": rate(counts["auto_approved"], counts["created"]),
+        "decision_latency": {
+            "count": sketch.count,
+            **{name: _round(sketch.quantile(q)) for name, q in QUANTILES.items()},
+        },
+    }
+
+
+def _round(value: float | None) -> float | None:
+    return None if value is None else round(value, 3)
+
+
+def get_stats(db: Session, client_id: str, window: str = "24h", now: dt.datetime | None = None) -> dict:
+    """Totals, per-action_type and per-channel figures for the last ``window``.
+
+    Buckets are hourly, so the window starts at the top of the hour.
+    """
+    since = bucket_start((now or utcnow()) - WINDOWS[window])
+    groups: dict[tuple[str, str], tuple[dict[str, int], LatencySketch]] = {}
+
+    def group(action_type: str, channel: str):
+        return groups.setdefault((action_type, channel), ({name: 0 for name in COUNTERS}, LatencySketch()))
+
+    rollup_stmt = (
+        select(
+            ApprovalRollup.action_type,
+            ApprovalRollup.channel,
+            *(func.sum(getattr(ApprovalRollup, name)) for name in COUNTERS),
+        )
+        .where(ApprovalRollup.client_id == client_id, ApprovalRollup.bucket_start >= since)
+        .group_by(ApprovalRollup.action_type, ApprovalRollup.channel)
+    )
+    for action_type, channel, *values in db.execute(rollup_stmt):
+        counts, _ = group(action_type, channel)
+        counts.update(zip(COUNTERS, (int(value or 0) for value in values)))
+
+    latency_stmt = (
+        select(LatencyRollup.action_type, LatencyRollup.channel, LatencyRollup.bin, func.sum(LatencyRollup.count))
+        .where(LatencyRollup.client_id == client_id, LatencyRollup.bucket_start >= since)
+        .group_by(LatencyRollup.action_type, LatencyRollup.channel, LatencyRollup.bin)
+    )
+    for action_type, channel, index, count in db.execute(latency_stmt):
+        _, sketch = group(action_type, channel)
+        sketch.merge(LatencySketch({index: int(count)}))
+
+    def combine(keys) -> dict:
+        counts = {name: 0 for name in COUNTERS}
+        sketch = LatencySketch()
+        for key in keys:
+            group_counts, group_sketch = groups[key]
+            for name in COUNTERS:
+                counts[name] += group_counts[name]
+            sketch.merge(group_sketch)
+        return _summarize(counts, sketch)
+
+    action_types = sorted({action_type for action_type, _ in groups})
+    channels = sorted({channel for _, channel in groups})
+    return {
+        "window": window,
+        "since": since,
+        "totals": combine(groups),
+        "by_action_type": {
+            action_type: combine(key for key in groups if key[0] == action_type) for action_type in action_types
+        },
+        "by_channel": {channel: combine(key for key in groups if key[1] == channel) for channel in channels},
+    }
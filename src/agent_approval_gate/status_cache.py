@@ -0,0 +1,78 @@
+"""HTTP caching for ``GET /v1/approvals/{approval_id}``.
+
+Approved, denied and expired approvals never change again, so their
+response bodies are kept in a bounded in-process LRU keyed by
+``(client_id, approval_id)`` and served without a database query, with
+``Cache-Control: immutable``. Every response carries an ``ETag``; a
+matching ``If-None-Match`` gets an empty 304, which keeps pending polls
+cheap on the wire.
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from agent_approval_gate.config import get_settings
+
+TERMINAL_CACHE_CONTROL = "private, max-age=31536000, immutable"
+PENDING_CACHE_CONTROL = "private, no-cache"
+
+
+class LRUCache:
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+_cache: LRUCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> LRUCache:
+    global _cache
+    size = get_settings().status_cache_size
+    if _cache is None or _cache.maxsize != size:
+        with _cache_lock:
+            if _cache is None or _cache.maxsize != size:
+                _cache = LRUCache(size)
+    return _cache
+
+
+def etag_for(body: dict) -> str:
+    digest = hashlib.sha1(json.dumps(body, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+    return f'"{digest[:20]}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
@@ -0,0 +1,352 @@
+"""Lightweight tracing with W3C ``traceparent`` propagation.
+
+Spans are exported either to a local JSONL file (``TRACE_EXPORTER=jsonl``) or
+to an OTLP/HTTP JSON collector (``TRACE_EXPORTER=otlp``). Every span that
+touches an approval carries an ``approval.id`` attribute, so the latency
+breakdown of one approval can be rebuilt from the exported spans with
+:func:`approval_breakdown`.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from agent_approval_gate.config import get_settings
+
+TRACEPARENT_HEADER = "traceparent"
+TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+APPROVAL_ID_ATTR = "approval.id"
+
+
+def new_trace_id() -> str:
+    return os.urandom(16).hex()
+
+
+def new_span_id() -> str:
+    return os.urandom(8).hex()
+
+
+def parse_traceparent(header: str | None) -> tuple[str, str] | None:
+    if not header:
+        return None
+    match = TRACEPARENT_RE.match(header.strip().lower())
+    if not match or match.group(1) == "0" * 32:
+        return None
+    return match.group(1), match.group(2)
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: str | None
+    start_ns: int
+    end_ns: int | None = None
+    status: str = "ok"
+    attributes: dict = field(default_factory=dict)
+
+    def set_attribute(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def update_name(self, name: str) -> None:
+        self.name = name
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    def set_attribute(self, key: str, value) -> None:
+        pass
+
+    def update_name(self, name: str) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+_current_span: ContextVar[Span | None] = ContextVar("approval_gate_span", default=None)
+
+
+class JsonlExporter:
+    """Append one JSON object per finished span to a local file."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), ensure_ascii=False)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as fh:
+                fh.write(line + "\n")
+
+    def shutdown(self) -> None:
+        pass
+
+
+def _otlp_attributes(attributes: dict) -> list[dict]:
+    result = []
+    for key, value in attributes.items():
+        if isinstance(value, bool):
+            typed = {"boolValue": value}
+        elif isinstance(value, int):
+            typed = {"intValue": str(value)}
+        elif isinstance(value, float):
+            typed = {"doubleValue": value}
+        else:
+            typed = {"stringValue": str(value)}
+        result.append({"key": key, "value": typed})
+    return result
+
+
+def to_otlp(spans: list[Span], service_name: str = "agent-approval-gate") -> dict:
+    return {
+        "resourceSpans": [
+            {
+                "resource": {"attributes": _otlp_attributes({"service.name": service_name})},
+                "scopeSpans": [
+                    {
+                        "scope": {"name": "agent_approval_gate"},
+                        "spans": [
+                            {
+                                "traceId": span.trace_id,
+                                "spanId": span.span_id,
+                                "parentSpanId": span.parent_id or "",
+                                "name": span.name,
+                                "startTimeUnixNano": str(span.start_ns),
+                                "endTimeUnixNano": str(span.end_ns),
+                                "attributes": _otlp_attributes(span.attributes),
+                                "status": {"code": 2 if span.status == "error" else 1},
+                            }
+                            for span in spans
+                        ],
+                    }
+                ],
+            }
+        ]
+    }
+
+
+class OtlpExporter:
+    """Batch spans and POST them as OTLP/HTTP JSON from a background thread."""
+
+    def __init__(self, endpoint: str, batch_size: int = 64, interval: float = 2.0) -> None:
+        self.endpoint = endpoint
+        self.batch_size = batch_size
+        self.interval = interval
+        self._buffer: list[Span] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="otlp-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            self._buffer.append(span)
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self._wake.set()
+
+    def flush(self) -> None:
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        if not batch:
+            return
+        import httpx
+
+        try:
+            httpx.post(self.endpoint, json=to_otlp(batch), timeout=5)
+        except Exception:
+            pass
+
+    def _run(self) -> None:
+        while not self._stopped:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def shutdown(self) -> None:
+        self._stopped = True
+        self._wake.set()
+        self._thread.join(timeout=5)
+        self.flush()
+
+
+_exporter = None
+_exporter_key: tuple | None = None
+_exporter_lock = threading.Lock()
+
+
+def get_exporter():
+    global _exporter, _exporter_key
+    settings = get_settings()
+    key = (settings.trace_exporter, settings.trace_file, settings.trace_otlp_endpoint)
+    if key != _exporter_key:
+        with _exporter_lock:
+            if key != _exporter_key:
+                if _exporter is not None:
+                    _exporter.shutdown()
+                if settings.trace_exporter == "jsonl":
+                    _exporter = JsonlExporter(settings.trace_file)
+                elif settings.trace_exporter == "otlp":
+                    _exporter = OtlpExporter(settings.trace_otlp_endpoint)
+                else:
+                    _exporter = None
+                _exporter_key = key
+    return _exporter
+
+
+def current_span() -> Span | None:
+    return _current_span.get()
+
+
+def set_attribute(key: str, value) -> None:
+    """Set an attribute on the active span, if any."""
+    span = _current_span.get()
+    if span is not None:
+        span.set_attribute(key, value)
+
+
+@contextmanager
+def span(name: str, traceparent: str | None = None, **attributes):
+    """Open a child of the active span, or of ``traceparent`` when given.
+
+    Yields a no-op span when tracing is disabled.
+    """
+    exporter = get_exporter()
+    if exporter is None:
+        yield NOOP_SPAN
+        return
+
+    parent = parse_traceparent(traceparent)
+    current = _current_span.get()
+    if parent:
+        trace_id, parent_id = parent
+    elif current is not None:
+        trace_id, parent_id = current.trace_id, current.span_id
+    else:
+        trace_id, parent_id = new_trace_id(), None
+
+    record = Span(
+        name=name,
+        trace_id=trace_id,
+        span_id=new_span_id(),
+        parent_id=parent_id,
+        start_ns=time.time_ns(),
+        attributes=dict(attributes),
+    )
+    token = _current_span.set(record)
+    try:
+        yield record
+    except Exception as exc:
+        record.status = "error"
+        record.attributes["error"] = repr(exc)
+        raise
+    finally:
+        record.end_ns = time.time_ns()
+        _current_span.reset(token)
+        exporter.export(record)
+
+
+# ---- SQLAlchemy instrumentation ----
+
+_DB_SPAN_KEY = "approval_gate_trace_span"
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    parent = _current_span.get()
+    if parent is None:
+        return
+    exporter = get_exporter()
+    if exporter is None:
+        return
+    verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "SQL"
+    record = Span(
+        name=f"db.{verb.lower()}",
+        trace_id=parent.trace_id,
+        span_id=new_span_id(),
+        parent_id=parent.span_id,
+        start_ns=time.time_ns(),
+        attributes={"db.statement": statement[:500]},
+    )
+    conn.info.setdefault(_DB_SPAN_KEY, []).append((record, exporter))
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stack = conn.info.get(_DB_SPAN_KEY)
+    if not stack:
+        return
+    record, exporter = stack.pop()
+    record.end_ns = time.time_ns()
+    exporter.export(record)
+
+
+# ---- Offline analysis ----
+
+
+def load_spans(path: str) -> list[dict]:
+    spans = []
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            line = line.strip()
+            if line:
+                spans.append(json.loads(line))
+    return spans
+
+
+def approval_breakdown(spans: list[dict], approval_id: str) -> list[dict]:
+    """Rebuild the timeline of every trace that touched ``approval_id``.
+
+    Returns spans sorted by start time, each with ``offset_ms`` relative to
+    the earliest span and ``duration_ms``.
+    """
+    trace_ids = {
+        item["trace_id"]
+        for item in spans
+        if item.get("attributes", {}).get(APPROVAL_ID_ATTR) == approval_id
+    }
+    related = sorted(
+        (item for item in spans if item["trace_id"] in trace_ids),
+        key=lambda item: item["start_ns"],
+    )
+    if not related:
+        return []
+    origin = related[0]["start_ns"]
+    return [
+        {
+            "name": item["name"],
+            "trace_id": item["trace_id"],
+            "span_id": item["span_id"],
+            "parent_id": item.get("parent_id"),
+            "offset_ms": (item["start_ns"] - origin) / 1e6,
+            "duration_ms": ((item.get("end_ns") or item["start_ns"]) - item["start_ns"]) / 1e6,
+            "status": item.get("status", "ok"),
+        }
+        for item in related
+    ]
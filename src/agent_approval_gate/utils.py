@@ -12,6 +12,11 @@ def to_epoch(timestamp: dt.datetime) -> int:
     return int(timestamp.astimezone(dt.timezone.utc).timestamp())
 
 
+def from_epoch(seconds: int) -> dt.datetime:
+    """Naive UTC datetime, the form timestamps are stored in."""
+    return dt.datetime.fromtimestamp(seconds, dt.timezone.utc).replace(tzinfo=None)
+
+
 def format_expires_at(timestamp: dt.datetime, timezone_name: str | None = None) -> str:
     """Format expiration time in human-readable format with timezone."""
     if timezone_name is None:
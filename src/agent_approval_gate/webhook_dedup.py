@@ -0,0 +1,140 @@
+"""De-duplication of Telegram webhook updates.
+
+Telegram delivers an update again when the webhook does not answer in
+time, so the same ``update_id`` can arrive more than once. Each process
+remembers the ids it has seen during the last ``TELEGRAM_DEDUP_WINDOW_SEC``
+seconds, up to ``TELEGRAM_DEDUP_CAPACITY`` of them. The ids are kept in a
+ring buffer of ``(update_id, seen_at)`` in arrival order, plus a set for
+the membership test. Ids leave from the front once they are older than
+the window or the buffer is full, so a check is O(1) amortized and memory
+stays bounded.
+
+When several workers share one webhook, a redelivered update can reach a
+different process. With ``TELEGRAM_DEDUP_BACKEND=db``, an update that is
+new to this process is also claimed in ``telegram_updates`` with an
+insert that does nothing on conflict. Only the worker whose insert lands
+handles the update. Rows older than the window are deleted periodically.
+
+An id is recorded before the update is handled, so a concurrent
+redelivery is dropped. If handling raises, the webhook does not answer
+and ``release`` forgets the id (and deletes its row) so that Telegram's
+redelivery is handled.
+"""
+
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import delete, insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from agent_approval_gate.config import get_settings
+from agent_approval_gate.models import TelegramUpdate
+
+SWEEP_INTERVAL_SEC = 60.0
+
+_INSERTS = {"sqlite": sqlite_insert, "postgresql": postgresql_insert}
+
+
+class RecentUpdates:
+    """Update ids seen by this process: a bounded, time-windowed ring buffer plus a set."""
+
+    def __init__(self, capacity: int, window_sec: float) -> None:
+        self.capacity = capacity
+        self.window_sec = window_sec
+        self._ring: deque[tuple[int, float]] = deque()
+        self._ids: set[int] = set()
+        self._lock = threading.Lock()
+
+    def seen(self, update_id: int, now: float) -> bool:
+        """Record ``update_id``; True if it was already recorded within the window."""
+        with self._lock:
+            ring = self._ring
+            while ring and ring[0][1] <= now - self.window_sec:
+                self._ids.discard(ring.popleft()[0])
+            if update_id in self._ids:
+                return True
+            while ring and len(ring) >= self.capacity:
+                self._ids.discard(ring.popleft()[0])
+            ring.append((update_id, now))
+            self._ids.add(update_id)
+            return False
+
+    def forget(self, update_id: int) -> None:
+        """Drop ``update_id`` so that its next delivery counts as new."""
+        with self._lock:
+            if update_id not in self._ids:
+                return
+            self._ids.discard(update_id)
+            ring = self._ring
+            # Usually the newest entry.
+            for index in range(len(ring) - 1, -1, -1):
+                if ring[index][0] == update_id:
+                    del ring[index]
+                    break
+
+    def __len__(self) -> int:
+        return len(self._ring)
+
+
+class UpdateDeduper:
+    def __init__(self, backend: str, capacity: int, window_sec: float) -> None:
+        if backend not in ("memory", "db"):
+            raise ValueError(f"unsupported TELEGRAM_DEDUP_BACKEND: {backend}")
+        self.shared = backend == "db"
+        self.window_sec = window_sec
+        self.recent = RecentUpdates(capacity, window_sec)
+        self._swept_at = 0.0
+
+    def seen(self, update_id: int, now: float | None = None) -> bool:
+        """True if this process already handled ``update_id``; no I/O."""
+        return self.recent.seen(update_id, time.time() if now is None else now)
+
+    def claimed_elsewhere(self, db: Session, update_id: int, now: float | None = None) -> bool:
+        """Claim ``update_id`` in ``telegram_updates``; True if another worker already did."""
+        now = time.time() if now is None else now
+        if now - self._swept_at >= SWEEP_INTERVAL_SEC:
+            self._swept_at = now
+            db.execute(delete(TelegramUpdate).where(TelegramUpdate.seen_at <= now - self.window_sec))
+        values = {"update_id": update_id, "seen_at": now}
+        dialect_insert = _INSERTS.get(db.get_bind().dialect.name)
+        try:
+            if dialect_insert is None:
+                db.execute(insert(TelegramUpdate).values(**values))
+                claimed = True
+            else:
+                stmt = dialect_insert(TelegramUpdate).values(**values).on_conflict_do_nothing()
+                claimed = bool(db.execute(stmt).rowcount)
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            claimed = False
+        return not claimed
+
+    def release(self, db: Session, update_id: int) -> None:
+        """Undo the claim on ``update_id`` after handling it failed."""
+        self.recent.forget(update_id)
+        if self.shared:
+            db.rollback()
+            db.execute(delete(TelegramUpdate).where(TelegramUpdate.update_id == update_id))
+            db.commit()
+
+
+_deduper: UpdateDeduper | None = None
+_deduper_key: tuple | None = None
+_deduper_lock = threading.Lock()
+
+
+def get_deduper() -> UpdateDeduper:
+    global _deduper, _deduper_key
+    settings = get_settings()
+    key = (settings.telegram_dedup_backend, settings.telegram_dedup_capacity, settings.telegram_dedup_window_sec)
+    if _deduper is None or _deduper_key != key:
+        with _deduper_lock:
+            if _deduper is None or _deduper_key != key:
+                _deduper = UpdateDeduper(*key)
+                _deduper_key = key
+    return _deduper
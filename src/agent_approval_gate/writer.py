@@ -0,0 +1,208 @@
+"""Group commit: one writer thread commits many requests' writes together.
+
+Every create and decision used to end in its own ``COMMIT``, and on SQLite
+each commit is an fsync, so bursts were bounded by fsync rate. With
+``WRITE_BATCH_WINDOW_MS`` > 0, ``service`` hands its writes to a single
+writer thread instead. The writer takes the first queued write, keeps
+collecting for up to the window or until ``WRITE_BATCH_MAX`` writes are
+queued, runs them all on one session per engine and commits once. Each
+caller blocks on a future that resolves when its batch has committed.
+
+A write is a function of a session. It only stages rows and statements;
+the writer owns the transaction. If anything in a batch fails, the batch
+is rolled back and its writes are retried one per transaction. The
+failure then reaches only the caller that caused it, as
+``repository.Conflict`` for a uniqueness violation.
+
+The batch's new approvals are flushed together as one multi-row
+``INSERT ... RETURNING id``. Writer sessions use ``expire_on_commit=False``,
+so rows handed back to callers keep their loaded values and nothing is
+re-read after the commit.
+
+All writes run on the writer thread, including the reads inside them
+(the allow lookups of a decision). Those reads queue behind every batch,
+so keep ``write`` closures short and do other reads before submitting.
+
+``submit`` fails with ``WriterUnavailable`` once the writer is stopped or
+its thread has died, or when its write has not started within
+``SUBMIT_TIMEOUT_SEC``; that write is cancelled. ``WriterUnavailable``
+therefore always means nothing was written, and ``service`` answers it
+with a 503 the caller can retry. A write that has started is waited for
+until it commits or fails.
+
+The memory storage backend has nothing to fsync and never uses the
+writer.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import CancelledError, Future
+from typing import Callable, TypeVar
+
+from sqlalchemy.orm import Session
+
+from agent_approval_gate import metrics, repository
+from agent_approval_gate.config import get_settings
+
+T = TypeVar("T")
+
+SUBMIT_TIMEOUT_SEC = 30.0
+LIVENESS_CHECK_SEC = 0.5
+
+_STOP = object()
+
+
+class WriterUnavailable(RuntimeError):
+    """The writer is stopped, its thread died, or it did not answer in time."""
+
+
+class GroupCommitWriter:
+    def __init__(self, window_sec: float, max_batch: int, timeout_sec: float = SUBMIT_TIMEOUT_SEC) -> None:
+        self.window_sec = window_sec
+        self.max_batch = max(1, max_batch)
+        self.timeout_sec = timeout_sec
+        self._queue: queue.Queue = queue.Queue()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="approval-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, bind, write: Callable[[Session], T]) -> T:
+        """Run ``write`` on a writer session for ``bind``; return its result once committed."""
+        if self._stopped.is_set() or not self._thread.is_alive():
+            raise WriterUnavailable("group-commit writer is stopped")
+        future: Future = Future()
+        self._queue.put((bind, write, future))
+        deadline = time.monotonic() + self.timeout_sec
+        while True:
+            try:
+                return future.result(timeout=LIVENESS_CHECK_SEC)
+            except TimeoutError:
+                if not self._thread.is_alive():
+                    # A batch that dies with the thread fails its futures first, so this one never started.
+                    future.cancel()
+                    raise WriterUnavailable("group-commit writer thread died")
+                # Only a write that never started may time out: one that has may already have committed.
+                if time.monotonic() >= deadline and future.cancel():
+                    raise WriterUnavailable("group-commit writer did not run the write")
+            except CancelledError:
+                raise WriterUnavailable("group-commit writer did not run the write")
+
+    def _run(self) -> None:
+        batch: list = []
+        try:
+            while True:
+                item = self._queue.get()
+                if item is _STOP:
+                    return
+                batch = [item]
+                stopping = False
+                deadline = time.monotonic() + self.window_sec
+                while len(batch) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    try:
+                        item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+                try:
+                    self._run_batch(batch)
+                except Exception as exc:
+                    # Outside a write's transaction (opening or closing a session): fail the batch, keep serving.
+                    _fail(batch, exc)
+                if stopping:
+                    return
+        except BaseException as exc:
+            _fail(batch, WriterUnavailable("group-commit writer thread died"), cause=exc)
+            raise
+        finally:
+            self._stopped.set()
+            # Submits that raced with stop() or a dying thread.
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not _STOP:
+                    _fail([item], WriterUnavailable("group-commit writer is stopped"))
+
+    def _run_batch(self, batch: list) -> None:
+        by_bind: dict = {}
+        for bind, write, future in batch:
+            # Skips writes whose caller gave up before the writer got to them.
+            if future.set_running_or_notify_cancel():
+                by_bind.setdefault(bind, []).append((write, future))
+        for bind, writes in by_bind.items():
+            self._commit(bind, writes)
+
+    def _commit(self, bind, writes: list) -> None:
+        db = Session(bind=bind, autoflush=False, expire_on_commit=False)
+        try:
+            results = [write(db) for write, _ in writes]
+            repository.SqlRepository(db).commit()
+        except Exception as exc:
+            db.rollback()
+            if len(writes) == 1:
+                writes[0][1].set_exception(exc)
+            else:
+                # Find the write that failed: retry each one in a transaction of its own.
+                for write in writes:
+                    self._commit(bind, [write])
+            return
+        finally:
+            db.close()
+        metrics.WRITE_BATCH_SIZE.observe(len(writes))
+        for (_, future), result in zip(writes, results):
+            future.set_result(result)
+
+    def stop(self) -> None:
+        """Commit what is queued, then stop the thread. Later submits fail at once."""
+        self._stopped.set()
+        self._queue.put(_STOP)
+        self._thread.join(timeout=5)
+
+
+def _fail(batch: list, exc: BaseException, cause: BaseException | None = None) -> None:
+    if cause is not None:
+        exc.__cause__ = cause
+    for _, _, future in batch:
+        if not future.done():
+            try:
+                future.set_exception(exc)
+            except Exception:
+                # Not yet marked running: the caller's cancel() won the race.
+                pass
+
+
+_writer: GroupCommitWriter | None = None
+_writer_key: tuple | None = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> GroupCommitWriter | None:
+    """The process-wide writer, or None when group commit is off."""
+    global _writer, _writer_key
+    settings = get_settings()
+    if settings.write_batch_window_ms <= 0 or settings.storage_backend != "sql":
+        return None
+    key = (settings.write_batch_window_ms / 1000, settings.write_batch_max)
+    if _writer is None or _writer_key != key:
+        with _writer_lock:
+            if _writer is None or _writer_key != key:
+                if _writer is not None:
+                    _writer.stop()
+                _writer = GroupCommitWriter(*key)
+                _writer_key = key
+    return _writer
+
+
+def stop() -> None:
+    global _writer, _writer_key
+    with _writer_lock:
+        if _writer is not None:
+            _writer.stop()
+        _writer = None
+        _writer_key = None
@@ -31,7 +31,7 @@ ENGINE = create_engine(
     poolclass=StaticPool,
     future=True,
 )
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=ENGINE, future=True)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=ENGINE, future=True)
 
 
 def override_get_db():
@@ -1,4 +1,7 @@
+import datetime as dt
+
 from agent_approval_gate.auth import api_key_to_client_id
+from agent_approval_gate.models import Approval
 from agent_approval_gate.service import create_allow_rule
 
 
@@ -45,3 +48,55 @@ def test_auto_approve_with_allow_rule(client, db_session):
     assert data["status"] == "approved"
     assert data["auto"] is True
     assert data["decision"]["code"] == "6"
+
+
+def test_list_approvals_keyset_pagination(client, db_session):
+    headers = {"Authorization": "Bearer test-key"}
+    created = []
+    for i in range(5):
+        payload = {
+            "session_id": f"sess_list_{i % 2}",
+            "action_type": "exec_cmd",
+            "title": f"Run command {i}",
+            "preview": "echo hi",
+            "channel": "telegram",
+            "target": {"tg_chat_id": "123"},
+            "expires_in_sec": 600,
+        }
+        created.append(client.post("/v1/approvals", json=payload, headers=headers).json()["approval_id"])
+    client.post("/v1/inbox/email-reply", json={"subject": f"Re: [{created[0]}]", "body": "1"}, headers=headers)
+    # Another client's approval with the same session must not leak into this listing.
+    other = Approval(
+        approval_id="appr_other_client",
+        created_at=dt.datetime.utcnow(),
+        expires_at=dt.datetime.utcnow() + dt.timedelta(minutes=10),
+        status="pending",
+        session_id="sess_list_0",
+        action_type="exec_cmd",
+        title="Run command",
+        preview="echo hi",
+        channel="telegram",
+        target={"tg_chat_id": "123"},
+        client_id="someone-else",
+    )
+    db_session.add(other)
+    db_session.commit()
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        page = client.get("/v1/approvals", params=params, headers=headers).json()
+        seen.extend(item["approval_id"] for item in page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == list(reversed(created))
+
+    resp = client.get("/v1/approvals", params={"session_id": "sess_list_0", "status": "pending"}, headers=headers)
+    assert [item["approval_id"] for item in resp.json()["items"]] == [created[4], created[2]]
+    resp = client.get("/v1/approvals", params={"status": "approved"}, headers=headers)
+    items = resp.json()["items"]
+    assert [item["approval_id"] for item in items] == [created[0]]
+    assert items[0]["decision"]["code"] == "1"
+
+    assert client.get("/v1/approvals", params={"cursor": "not-a-cursor"}, headers=headers).status_code == 400
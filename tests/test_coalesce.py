@@ -0,0 +1,75 @@
+import pytest
+
+from agent_approval_gate import main
+from agent_approval_gate.config import get_settings
+from agent_approval_gate.service import PendingDuplicate, content_hash, create_approval
+
+headers = {"Authorization": "Bearer test-key"}
+payload = {
+    "session_id": "sess_parallel",
+    "action_type": "Bash",
+    "title": "Claude Code: Bash",
+    "preview": "git push origin main",
+    "channel": "telegram",
+    "target": {"tg_chat_id": "123"},
+    "expires_in_sec": 600,
+}
+
+
+@pytest.fixture()
+def coalescing(monkeypatch):
+    monkeypatch.setenv("COALESCE_PENDING", "1")
+    get_settings.cache_clear()
+    sends = []
+    monkeypatch.setattr(main.telegram_adapter, "send_approval", lambda approval: sends.append(approval.approval_id))
+    yield sends
+    get_settings.cache_clear()
+
+
+def test_identical_pending_requests_share_one_approval(client, coalescing):
+    first = client.post("/v1/approvals", json=payload, headers=headers).json()
+    second = client.post("/v1/approvals", json=payload, headers=headers).json()
+    other = client.post("/v1/approvals", json={**payload, "preview": "git push --force"}, headers=headers).json()
+
+    assert second["approval_id"] == first["approval_id"]
+    assert second["coalesced"] is True and first["coalesced"] is False
+    assert other["approval_id"] != first["approval_id"]
+    assert coalescing == [first["approval_id"], other["approval_id"]]
+
+    # One decision answers every waiter; afterwards the same request starts a new approval.
+    client.post("/v1/inbox/email-reply", json={"subject": f"Re: [{first['approval_id']}]", "body": "1"}, headers=headers)
+    assert client.get(f"/v1/approvals/{second['approval_id']}", headers=headers).json()["status"] == "approved"
+    third = client.post("/v1/approvals", json=payload, headers=headers).json()
+    assert third["approval_id"] != first["approval_id"]
+    assert third["coalesced"] is False
+
+
+def test_failed_send_does_not_capture_retries(client, coalescing, monkeypatch):
+    def fail(approval):
+        raise RuntimeError("telegram down")
+
+    monkeypatch.setattr(main.telegram_adapter, "send_approval", fail)
+    with pytest.raises(RuntimeError):
+        client.post("/v1/approvals", json=payload, headers=headers)
+    unsent = client.get("/v1/approvals", headers=headers).json()["items"][0]
+    assert unsent["status"] == "expired"
+
+    monkeypatch.setattr(main.telegram_adapter, "send_approval", lambda approval: coalescing.append(approval.approval_id))
+    retry = client.post("/v1/approvals", json=payload, headers=headers).json()
+    assert retry["coalesced"] is False and retry["approval_id"] != unsent["approval_id"]
+    assert coalescing == [retry["approval_id"]]
+
+
+def test_coalescing_is_off_by_default(client, monkeypatch):
+    monkeypatch.setattr(main.telegram_adapter, "send_approval", lambda approval: None)
+    first = client.post("/v1/approvals", json=payload, headers=headers).json()
+    second = client.post("/v1/approvals", json=payload, headers=headers).json()
+    assert first["approval_id"] != second["approval_id"]
+
+
+def test_concurrent_duplicate_loses_on_unique_index(db_session):
+    digest = content_hash(payload["session_id"], payload["action_type"], payload["preview"])
+    kwargs = {key: value for key, value in payload.items()}
+    create_approval(db_session, client_id="client-1", content_hash=digest, **kwargs)
+    with pytest.raises(PendingDuplicate):
+        create_approval(db_session, client_id="client-1", content_hash=digest, **kwargs)
@@ -0,0 +1,181 @@
+import collections
+import datetime as dt
+import itertools
+import threading
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine, func, select
+
+from agent_approval_gate import notify, repository, service, writer
+from agent_approval_gate.config import get_settings
+from agent_approval_gate.database import get_session_local, init_schema
+from agent_approval_gate.decision import parse_menu_reply
+from agent_approval_gate.models import ApprovalRollup, LatencyRollup
+
+THREADS = 12
+ROUNDS = 5
+STATUS_FOR_CODE = {"1": "approved", "2": "approved", "3": "denied", "6": "approved"}
+
+
+@pytest.fixture(params=["sql", "memory", "group_commit"])
+def session_local(request, monkeypatch, tmp_path):
+    monkeypatch.setattr(repository, "_store", None)
+    if request.param == "memory":
+        monkeypatch.setenv("STORAGE_BACKEND", "memory")
+    if request.param == "group_commit":
+        monkeypatch.setenv("WRITE_BATCH_WINDOW_MS", "2")
+    get_settings.cache_clear()
+    engine = create_engine(f"sqlite:///{tmp_path / 'race.db'}", connect_args={"check_same_thread": False})
+    init_schema(engine)
+    yield get_session_local(engine)
+    writer.stop()
+    engine.dispose()
+    get_settings.cache_clear()
+
+
+def create(db, action_type: str):
+    approval, _ = service.create_approval(
+        db,
+        session_id="sess-1",
+        action_type=action_type,
+        title="Run command",
+        preview="make deploy",
+        channel="telegram",
+        target={"tg_chat_id": "123"},
+        expires_in_sec=600,
+        client_id="client-1",
+    )
+    return approval.approval_id
+
+
+def hammer(session_local, approval_id: str, codes) -> dict[str, object]:
+    """Decide ``approval_id`` from one thread per code at once; each thread's result or error status."""
+    outcomes = {}
+    barrier = threading.Barrier(len(codes))
+
+    def decide(index: int, code: str) -> None:
+        db = session_local()
+        try:
+            approval = service.get_approval_no_check(db, approval_id)
+            barrier.wait()
+            try:
+                outcomes[index] = (code, service.apply_decision(db, approval, parse_menu_reply(code)).status)
+            except HTTPException as exc:
+                outcomes[index] = (code, exc.status_code)
+        finally:
+            db.close()
+
+    threads = [threading.Thread(target=decide, args=(index, code)) for index, code in enumerate(codes)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return outcomes
+
+
+def test_exactly_one_concurrent_decision_lands(session_local, monkeypatch):
+    published = []
+    monkeypatch.setattr(notify, "publish_approval", lambda approval: published.append(approval.approval_id))
+    codes = list(itertools.islice(itertools.cycle(STATUS_FOR_CODE), THREADS))
+    for round_ in range(ROUNDS):
+        db = session_local()
+        # A fresh action type per round: an allow rule from the last round would auto-approve it.
+        action_type = f"exec_{round_}"
+        approval_id = create(db, action_type)
+
+        outcomes = hammer(session_local, approval_id, codes)
+
+        winners = [(code, result) for code, result in outcomes.values() if isinstance(result, str)]
+        assert len(winners) == 1, outcomes
+        assert sorted(result for _, result in outcomes.values() if isinstance(result, int)) == [409] * (THREADS - 1)
+        (code, status), = winners
+        assert status == STATUS_FOR_CODE[code]
+
+        approval = service.get_approval_no_check(db, approval_id)
+        assert (approval.status, approval.decision_code) == (status, code)
+        repo = repository.of(db)
+        assert (repo.get_session_allow("client-1", "sess-1", action_type) is not None) == (code == "2")
+        rule = repo.get_allow_rule("client-1", action_type)
+        assert (rule is not None) == (code == "6")
+        if code == "6":
+            assert approval.allow_rule_applied == rule.rule_id
+        db.close()
+    # One event for the creation and one for the decision that landed.
+    assert set(collections.Counter(published).values()) == {2} and len(published) == 2 * ROUNDS
+
+    db = session_local()
+    decided = db.execute(select(func.sum(ApprovalRollup.approved + ApprovalRollup.denied))).scalar()
+    assert decided == ROUNDS
+    assert db.execute(select(func.sum(LatencyRollup.count))).scalar() == ROUNDS
+    db.close()
+
+
+def test_stale_pending_object_loses_to_a_committed_decision(session_local):
+    db, other = session_local(), session_local()
+    approval_id = create(db, "exec_cmd")
+    stale = service.get_approval_no_check(db, approval_id)
+    service.apply_decision(other, service.get_approval_no_check(other, approval_id), parse_menu_reply("3"))
+
+    with pytest.raises(HTTPException) as exc:
+        service.apply_decision(db, stale, parse_menu_reply("6"))
+    assert exc.value.status_code == 409
+    assert stale.status == "denied"
+    assert repository.of(db).get_allow_rule("client-1", "exec_cmd", enabled_only=False) is None
+    db.close()
+    other.close()
+
+
+def test_always_allow_on_two_approvals_shares_one_rule(session_local):
+    db = session_local()
+    for round_ in range(ROUNDS):
+        action_type = f"exec_{round_}"
+        approval_ids = [create(db, action_type) for _ in range(THREADS)]
+        barrier = threading.Barrier(THREADS)
+        statuses = {}
+
+        def decide(approval_id: str) -> None:
+            thread_db = session_local()
+            try:
+                approval = service.get_approval_no_check(thread_db, approval_id)
+                barrier.wait()
+                statuses[approval_id] = service.apply_decision(thread_db, approval, parse_menu_reply("6")).status
+            finally:
+                thread_db.close()
+
+        threads = [threading.Thread(target=decide, args=(approval_id,)) for approval_id in approval_ids]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert statuses == {approval_id: "approved" for approval_id in approval_ids}
+        rule = repository.of(db).get_allow_rule("client-1", action_type)
+        repository.of(db).expire_all()
+        assert {service.get_approval_no_check(db, i).allow_rule_applied for i in approval_ids} == {rule.rule_id}
+    db.close()
+
+
+def test_expiry_sweep_skips_an_approval_decided_after_listing(session_local, monkeypatch):
+    published = []
+    monkeypatch.setattr(notify, "publish_approval", lambda approval: published.append(approval.status))
+    db, other = session_local(), session_local()
+    approval_id = create(db, "exec_cmd")
+    backend = type(repository.of(db))
+    list_overdue = backend.list_overdue
+
+    def listed_then_decided(self, now, limit):
+        # Listed as if past its deadline, then decided before the sweep writes.
+        overdue = list_overdue(self, now + dt.timedelta(hours=1), limit)
+        service.apply_decision(other, service.get_approval_no_check(other, approval_id), parse_menu_reply("3"))
+        return overdue
+
+    monkeypatch.setattr(backend, "list_overdue", listed_then_decided)
+
+    assert service.expire_overdue(db) == 0
+    repository.of(db).expire_all()
+    assert service.get_approval_no_check(db, approval_id).status == "denied"
+    assert published == ["pending", "denied"]
+    assert not db.execute(select(func.sum(ApprovalRollup.expired))).scalar()
+    db.close()
+    other.close()
@@ -0,0 +1,38 @@
+import threading
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+
+from agent_approval_gate.database import get_session_local, serialize_transactions
+
+
+def test_static_pool_sessions_take_turns_per_transaction_not_per_session():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    session_local = get_session_local(engine)
+    serialize_transactions(session_local)
+    idle, holder = session_local(), session_local()
+    holder.execute(text("SELECT 1"))
+    done = threading.Event()
+
+    def other_request():
+        with session_local() as db:
+            db.execute(text("SELECT 1"))
+            db.commit()
+        done.set()
+
+    thread = threading.Thread(target=other_request)
+    thread.start()
+    # An open transaction keeps other sessions off the shared connection...
+    assert not done.wait(0.2)
+    holder.commit()
+    assert done.wait(5)
+    thread.join()
+    # ...while a session without one, like a request waiting on a long-poll, holds nothing.
+    done.clear()
+    thread = threading.Thread(target=other_request)
+    thread.start()
+    assert done.wait(5)
+    thread.join()
+    idle.close()
+    holder.close()
+    engine.dispose()
@@ -0,0 +1,94 @@
+import base64
+import importlib.util
+import re
+from pathlib import Path
+
+SCRIPT = Path(__file__).resolve().parents[1] / "scripts" / "gmail_poller.py"
+spec = importlib.util.spec_from_file_location("gmail_poller", SCRIPT)
+gmail_poller = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(gmail_poller)
+
+
+class FakeIMAP:
+    """Minimal imaplib stand-in that records UID commands."""
+
+    def __init__(self, messages: dict) -> None:
+        self.messages = messages
+        self.commands = []
+
+    def select(self, mailbox):
+        return "OK", [b"1"]
+
+    def uid(self, command, *args):
+        self.commands.append((command, args))
+        if command == "SEARCH":
+            return "OK", [b" ".join(self.messages)]
+        if command == "STORE":
+            return "OK", []
+        uid_set, items = args
+        data = []
+        for seq, uid in enumerate(uid_set.encode().split(b","), start=1):
+            msg = self.messages[uid]
+            if "BODYSTRUCTURE" in items:
+                header = msg["header"]
+                prefix = (
+                    f"{seq} (UID {uid.decode()} BODYSTRUCTURE {msg['structure']} "
+                    f"BODY[HEADER.FIELDS (SUBJECT FROM)] {{{len(header)}}}"
+                ).encode()
+                data.extend([(prefix, header), b")"])
+            else:
+                part, start, length = re.search(r"BODY.PEEK\[(.+)\]<(\d+)\.(\d+)>", items).groups()
+                body = msg["parts"][part][int(start):int(start) + int(length)]
+                prefix = f"{seq} (UID {uid.decode()} BODY[{part}]<0> {{{len(body)}}}".encode()
+                data.extend([(prefix, body), b")"])
+        return "OK", data
+
+
+def test_fetch_emails_uses_partial_text_part():
+    encoded = base64.encodebytes(("2\n\nOn Tue, someone wrote:\n" + "> x\n" * 5000).encode())
+    messages = {
+        b"7": {
+            "header": b"Subject: Re: Run [appr_abc123]\r\nFrom: Boss <boss@example.com>\r\n\r\n",
+            "structure": (
+                '(("TEXT" "PLAIN" ("CHARSET" "UTF-8") NIL NIL "BASE64" 1000 10 NIL NIL NIL)'
+                '("TEXT" "HTML" ("CHARSET" "UTF-8") NIL NIL "7BIT" 100 2 NIL NIL NIL)'
+                '("APPLICATION" "PDF" ("NAME" "big.pdf") NIL NIL "BASE64" 9000000 NIL NIL NIL)'
+                ' "MIXED" ("BOUNDARY" "b1") NIL NIL)'
+            ),
+            "parts": {"1": encoded},
+        },
+        b"9": {
+            "header": b"Subject: Re: Deploy [appr_def456]\r\nFrom: boss@example.com\r\n\r\n",
+            "structure": '("TEXT" "PLAIN" ("CHARSET" "utf-8") NIL NIL "7BIT" 3 1 NIL NIL NIL)',
+            "parts": {"1": b"3\r\n"},
+        },
+    }
+    mail = FakeIMAP(messages)
+
+    uids = gmail_poller.get_unread_uids(mail)
+    emails = gmail_poller.fetch_emails(mail, uids)
+
+    assert [uid for uid, *_ in emails] == [b"7", b"9"]
+    _, subject, from_addr, body = emails[0]
+    assert "appr_abc123" in subject
+    assert from_addr == "Boss <boss@example.com>"
+    assert body.startswith("2\n")
+    assert len(body) <= gmail_poller.BODY_MAX_BYTES
+    assert emails[1][3].strip() == "3"
+
+    fetches = [args[1] for cmd, args in mail.commands if cmd == "FETCH"]
+    assert len(fetches) == 2
+    assert all("PEEK" in items and "RFC822" not in items for items in fetches)
+
+    gmail_poller.mark_seen(mail, [uid for uid, *_ in emails])
+    stores = [args for cmd, args in mail.commands if cmd == "STORE"]
+    assert stores == [("7,9", "+FLAGS", "(\\Seen)")]
+
+
+def test_find_text_plain_part_nested_alternative():
+    structure = gmail_poller._tokenize_sexp(
+        b'((("TEXT" "PLAIN" ("CHARSET" "iso-8859-1") NIL NIL "QUOTED-PRINTABLE" 10 1 NIL NIL NIL)'
+        b'("TEXT" "HTML" NIL NIL NIL "7BIT" 10 1 NIL NIL NIL) "ALTERNATIVE")'
+        b'("IMAGE" "PNG" NIL NIL NIL "BASE64" 10 NIL NIL NIL) "MIXED")'
+    )[0]
+    assert gmail_poller.find_text_plain_part(structure) == ("1.1", "quoted-printable", "iso-8859-1")
@@ -0,0 +1,89 @@
+import pytest
+from sqlalchemy import func, select
+
+from agent_approval_gate import idempotency, main
+from agent_approval_gate.models import Approval
+from agent_approval_gate.service import create_approval
+
+headers = {"Authorization": "Bearer test-key"}
+payload = {
+    "session_id": "sess_idem",
+    "action_type": "exec_cmd",
+    "title": "Run command",
+    "preview": "make deploy",
+    "channel": "telegram",
+    "target": {"tg_chat_id": "123"},
+    "expires_in_sec": 600,
+}
+
+
+@pytest.fixture()
+def sends(monkeypatch):
+    calls = []
+    monkeypatch.setattr(main.telegram_adapter, "send_approval", lambda approval: calls.append(approval.approval_id))
+    return calls
+
+
+def count_approvals(db_session) -> int:
+    return db_session.execute(select(func.count()).select_from(Approval)).scalar()
+
+
+def test_replay_returns_original_response_without_resend(client, db_session, sends):
+    keyed = {**headers, "Idempotency-Key": "retry-1"}
+    first = client.post("/v1/approvals", json=payload, headers=keyed)
+    client.post("/v1/inbox/email-reply", json={"subject": f"Re: [{first.json()['approval_id']}]", "body": "1"}, headers=headers)
+    second = client.post("/v1/approvals", json=payload, headers=keyed)
+
+    assert second.status_code == 200
+    assert second.json() == first.json()
+    assert second.headers[idempotency.REPLAYED_HEADER] == "true"
+    assert idempotency.REPLAYED_HEADER not in first.headers
+    assert len(sends) == 1
+    assert count_approvals(db_session) == 1
+
+    # Without a key every request is new.
+    client.post("/v1/approvals", json=payload, headers=headers)
+    assert len(sends) == 2
+
+
+def test_key_reuse_with_different_body_is_rejected(client, sends):
+    keyed = {**headers, "Idempotency-Key": "retry-2"}
+    assert client.post("/v1/approvals", json=payload, headers=keyed).status_code == 200
+    resp = client.post("/v1/approvals", json={**payload, "preview": "make destroy"}, headers=keyed)
+    assert resp.status_code == 422
+    assert len(sends) == 1
+
+
+def test_failed_send_releases_key(client, db_session, monkeypatch):
+    def fail(approval):
+        raise RuntimeError("telegram down")
+
+    monkeypatch.setattr(main.telegram_adapter, "send_approval", fail)
+    keyed = {**headers, "Idempotency-Key": "retry-3"}
+    with pytest.raises(RuntimeError):
+        client.post("/v1/approvals", json=payload, headers=keyed)
+
+    sent = []
+    monkeypatch.setattr(main.telegram_adapter, "send_approval", lambda approval: sent.append(approval.approval_id))
+    resp = client.post("/v1/approvals", json=payload, headers=keyed)
+    assert resp.status_code == 200
+    assert sent == [resp.json()["approval_id"]]
+
+
+def test_concurrent_insert_with_same_key_loses(db_session):
+    kwargs = dict(
+        session_id="sess_idem",
+        action_type="exec_cmd",
+        title="Run command",
+        preview="make deploy",
+        channel="telegram",
+        target={"tg_chat_id": "123"},
+        expires_in_sec=600,
+        client_id="client-1",
+        idempotency_key="race",
+        request_hash="h",
+    )
+    create_approval(db_session, **kwargs)
+    with pytest.raises(idempotency.KeyInUse):
+        create_approval(db_session, **kwargs)
+    assert count_approvals(db_session) == 1
@@ -0,0 +1,62 @@
+import datetime as dt
+
+from sqlalchemy import select
+
+from agent_approval_gate import keys
+from agent_approval_gate.auth import api_key_to_client_id, registry
+from agent_approval_gate.models import ApiKey
+
+payload = {
+    "session_id": "sess_keys",
+    "action_type": "exec_cmd",
+    "title": "Run command",
+    "preview": "ls",
+    "channel": "telegram",
+    "target": {"tg_chat_id": "123"},
+    "expires_in_sec": 600,
+}
+
+
+def bearer(secret: str) -> dict:
+    return {"Authorization": f"Bearer {secret}"}
+
+
+def test_database_key_is_hashed_and_scoped(client, db_session):
+    row, secret = keys.create_key(db_session, "ci", ["stats"])
+    stored = db_session.execute(select(ApiKey.key_hash, ApiKey.name)).all()
+    assert all(secret not in value for values in stored for value in values)
+
+    assert client.get("/v1/stats", headers=bearer(secret)).status_code == 200
+    resp = client.get("/v1/approvals", headers=bearer(secret))
+    assert resp.status_code == 403
+    assert client.get("/v1/stats", headers=bearer("not-a-key")).status_code == 401
+    # Env keys keep full access.
+    assert client.get("/v1/approvals", headers=bearer("test-key")).status_code == 200
+
+
+def test_rotation_keeps_client_and_honours_grace(client, db_session):
+    old, old_secret = keys.create_key(db_session, "agent", ["approvals"])
+    approval_id = client.post("/v1/approvals", json=payload, headers=bearer(old_secret)).json()["approval_id"]
+
+    new, new_secret = keys.rotate_key(db_session, old.key_id, grace_sec=3600)
+    assert new.client_id == old.client_id and new.key_id != old.key_id
+    for secret in (old_secret, new_secret):
+        assert client.get(f"/v1/approvals/{approval_id}", headers=bearer(secret)).status_code == 200
+
+    db_session.refresh(old)
+    old.expires_at = dt.datetime.utcnow() - dt.timedelta(seconds=1)
+    db_session.commit()
+    registry.invalidate()
+    assert client.get(f"/v1/approvals/{approval_id}", headers=bearer(old_secret)).status_code == 401
+    assert client.get(f"/v1/approvals/{approval_id}", headers=bearer(new_secret)).status_code == 200
+
+
+def test_revocation_and_import_apply_without_restart(client, db_session):
+    row, secret = keys.create_key(db_session, "temp", ["*"])
+    assert client.get("/v1/approvals", headers=bearer(secret)).status_code == 200
+    keys.revoke_key(db_session, row.key_id)
+    assert client.get("/v1/approvals", headers=bearer(secret)).status_code == 401
+
+    imported = keys.store_key(db_session, "legacy-secret", "legacy", ["approvals"])
+    assert imported.client_id == api_key_to_client_id("legacy-secret")
+    assert client.get("/v1/approvals", headers=bearer("legacy-secret")).status_code == 200
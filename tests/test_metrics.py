@@ -0,0 +1,53 @@
+from agent_approval_gate import metrics
+from agent_approval_gate.simulate import simulate_human_reply
+
+
+def test_histogram_renders_cumulative_buckets():
+    hist = metrics.Histogram("demo_seconds", "demo", ("route",), buckets=(0.1, 1.0))
+    child = hist.labels("/x")
+    child.observe(0.05)
+    child.observe(0.5)
+    child.observe(3)
+    text = hist.render()
+    assert 'demo_seconds_bucket{route="/x",le="0.1"} 1' in text
+    assert 'demo_seconds_bucket{route="/x",le="1"} 2' in text
+    assert 'demo_seconds_bucket{route="/x",le="+Inf"} 3' in text
+    assert 'demo_seconds_count{route="/x"} 3' in text
+
+
+def test_label_values_are_escaped():
+    counter = metrics.Counter("demo_total", "demo", ("action_type",))
+    counter.labels('custom:"x"\n').inc()
+    assert 'demo_total{action_type="custom:\\"x\\"\\n"} 1' in counter.render()
+
+
+def test_metrics_endpoint_reports_pipeline(client, db_session):
+    headers = {"Authorization": "Bearer test-key"}
+    payload = {
+        "session_id": "sess_metrics",
+        "action_type": "metrics_probe",
+        "title": "Run command",
+        "preview": "echo hi",
+        "channel": "telegram",
+        "target": {"tg_chat_id": "123"},
+        "expires_in_sec": 600,
+    }
+    approval_id = client.post("/v1/approvals", json=payload, headers=headers).json()["approval_id"]
+    simulate_human_reply(db_session, approval_id, "1")
+    client.get(f"/v1/approvals/{approval_id}", headers=headers)
+
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+    text = resp.text
+    assert 'approval_gate_approvals_created_total{channel="telegram",action_type="metrics_probe"} 1' in text
+    assert (
+        'approval_gate_approvals_decided_total{channel="telegram",action_type="metrics_probe",status="approved"} 1'
+        in text
+    )
+    assert 'approval_gate_time_to_decision_seconds_count{channel="telegram",action_type="metrics_probe"} 1' in text
+    assert (
+        'approval_gate_http_request_duration_seconds_count{method="GET",route="/v1/approvals/{approval_id}"}'
+        in text
+    )
+    assert "approval_gate_db_sessions_in_use" in text
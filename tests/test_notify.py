@@ -0,0 +1,165 @@
+import asyncio
+import subprocess
+import sys
+import threading
+import time
+
+import httpx
+import pytest
+
+from agent_approval_gate import main, notify
+from agent_approval_gate.decision import parse_menu_reply
+from agent_approval_gate.service import apply_decision, get_approval_no_check
+
+from conftest import SRC, TestingSessionLocal
+
+headers = {"Authorization": "Bearer test-key"}
+
+
+def test_inprocess_bus_wakes_matching_subscriber():
+    bus = notify.InProcessBus()
+    with bus.subscribe("appr_a") as sub_a, bus.subscribe("appr_b") as sub_b, bus.subscribe() as sub_all:
+        bus.publish(notify.ApprovalEvent("appr_a", "client", "approved"))
+        assert sub_a.wait(1).status == "approved"
+        assert sub_b.wait(0.05) is None
+        assert sub_all.wait(1).approval_id == "appr_a"
+    assert not bus._subscribers
+
+
+def test_sqlite_bus_delivers_across_instances(tmp_path):
+    path = str(tmp_path / "notify.db")
+    publisher = notify.SqliteChangeBus(path)
+    listener = notify.SqliteChangeBus(path, interval=0.01)
+    try:
+        with listener.subscribe("appr_x") as subscription:
+            publisher.publish(notify.ApprovalEvent("appr_x", "client", "denied"))
+            event = subscription.wait(5)
+        assert event == notify.ApprovalEvent("appr_x", "client", "denied")
+    finally:
+        publisher.close()
+        listener.close()
+
+
+def test_sqlite_bus_polls_only_while_subscribed(tmp_path):
+    path = str(tmp_path / "notify.db")
+    publisher = notify.SqliteChangeBus(path)
+    listener = notify.SqliteChangeBus(path, interval=0.01)
+    listener.RESUME_SLACK_SEC = 0.0
+    try:
+        assert not listener._watching.is_set()
+        publisher.publish(notify.ApprovalEvent("appr_x", "client", "pending"))
+        time.sleep(0.05)
+        with listener.subscribe("appr_x") as subscription:
+            assert listener._watching.is_set()
+            # Published before anyone here listened: not replayed.
+            assert subscription.wait(0.2) is None
+            publisher.publish(notify.ApprovalEvent("appr_x", "client", "approved"))
+            assert subscription.wait(5).status == "approved"
+        assert not listener._watching.is_set()
+    finally:
+        publisher.close()
+        listener.close()
+
+
+@pytest.mark.skipif(not hasattr(__import__("socket"), "AF_UNIX"), reason="requires Unix sockets")
+def test_unix_broker_relays_between_processes(tmp_path):
+    path = str(tmp_path / "notify.sock")
+    broker = notify.UnixSocketBroker(path).start()
+    bus = notify.UnixSocketBus(path, reconnect_interval=0.05)
+    publisher = (
+        "import sys, time\n"
+        f"sys.path.insert(0, {str(SRC)!r})\n"
+        "from agent_approval_gate import notify\n"
+        f"bus = notify.UnixSocketBus({path!r}, reconnect_interval=0.05)\n"
+        "assert bus.wait_connected(5)\n"
+        "bus.publish(notify.ApprovalEvent('appr_remote', 'client', 'approved'))\n"
+        "time.sleep(0.2)\n"
+        "bus.close()\n"
+    )
+    try:
+        assert bus.wait_connected(5)
+        with bus.subscribe("appr_remote") as subscription:
+            subprocess.run([sys.executable, "-c", publisher], check=True, timeout=30)
+            event = subscription.wait(5)
+        assert event is not None and event.status == "approved"
+    finally:
+        bus.close()
+        broker.stop()
+
+
+def test_long_poll_returns_when_decision_lands(client):
+    payload = {
+        "session_id": "sess_wait",
+        "action_type": "exec_cmd",
+        "title": "Run command",
+        "preview": "echo hi",
+        "channel": "telegram",
+        "target": {"tg_chat_id": "123"},
+        "expires_in_sec": 600,
+    }
+    approval_id = client.post("/v1/approvals", json=payload, headers=headers).json()["approval_id"]
+
+    def decide():
+        time.sleep(0.3)
+        db = TestingSessionLocal()
+        try:
+            apply_decision(db, get_approval_no_check(db, approval_id), parse_menu_reply("1"))
+        finally:
+            db.close()
+
+    worker = threading.Thread(target=decide)
+    worker.start()
+    start = time.monotonic()
+    resp = client.get(f"/v1/approvals/{approval_id}?wait=10", headers=headers)
+    elapsed = time.monotonic() - start
+    worker.join()
+
+    assert resp.status_code == 200
+    assert resp.json()["status"] == "approved"
+    assert elapsed < 5
+
+
+def test_long_poll_times_out_pending(client):
+    payload = {
+        "session_id": "sess_wait_timeout",
+        "action_type": "exec_cmd",
+        "title": "Run command",
+        "preview": "echo hi",
+        "channel": "telegram",
+        "target": {"tg_chat_id": "123"},
+        "expires_in_sec": 600,
+    }
+    approval_id = client.post("/v1/approvals", json=payload, headers=headers).json()["approval_id"]
+    resp = client.get(f"/v1/approvals/{approval_id}?wait=0.2", headers=headers)
+    assert resp.json()["status"] == "pending"
+    assert client.get(f"/v1/approvals/{approval_id}?wait=61", headers=headers).status_code == 422
+
+
+def test_long_polls_do_not_starve_other_requests(client):
+    """More waiters than the threadpool has workers (40): a create must still be served at once."""
+    payload = {
+        "session_id": "sess_wait_many",
+        "action_type": "exec_cmd",
+        "title": "Run command",
+        "preview": "echo hi",
+        "channel": "telegram",
+        "target": {"tg_chat_id": "123"},
+        "expires_in_sec": 600,
+    }
+    approval_id = client.post("/v1/approvals", json=payload, headers=headers).json()["approval_id"]
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://gate", timeout=30) as gate:
+            url = f"/v1/approvals/{approval_id}?wait=2"
+            waiters = [asyncio.create_task(gate.get(url, headers=headers)) for _ in range(45)]
+            await asyncio.sleep(0.3)
+            start = time.monotonic()
+            created = await gate.post("/v1/approvals", json={**payload, "preview": "echo other"}, headers=headers)
+            elapsed = time.monotonic() - start
+            return created, elapsed, await asyncio.gather(*waiters)
+
+    created, elapsed, polled = asyncio.run(scenario())
+    assert created.status_code == 200
+    assert elapsed < 1.0
+    assert {resp.json()["status"] for resp in polled} == {"pending"}
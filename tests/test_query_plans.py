@@ -0,0 +1,179 @@
+"""EXPLAIN QUERY PLAN regression harness for the statements service.py issues.
+
+Runs a workload of service calls against a seeded SQLite database, records
+every SQL statement and fails if any of them plans a full table scan.
+Add new service queries to ``WORKLOAD``.
+"""
+
+import datetime as dt
+import re
+
+import pytest
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.orm import sessionmaker
+
+from agent_approval_gate import idempotency, ratelimit, repository, retention, service, sharding, stats, webhook_dedup
+from agent_approval_gate.database import Base
+from agent_approval_gate.decision import parse_menu_reply
+from agent_approval_gate.migrations import MIGRATIONS, migrate
+from agent_approval_gate.models import AllowRule, Approval, SessionAllow
+
+NOW = dt.datetime.utcnow()
+CLIENTS = [f"client-{i}" for i in range(20)]
+ACTION_TYPES = [f"action_{i}" for i in range(10)]
+FULL_SCAN = re.compile(r"^SCAN (TABLE )?\w+( AS \w+)?$")
+
+
+def seed(db) -> None:
+    statuses = ("approved", "denied", "expired", "pending")
+    db.add_all(
+        Approval(
+            approval_id=f"appr_{i:05d}",
+            created_at=NOW - dt.timedelta(days=i % 90),
+            expires_at=NOW - dt.timedelta(days=i % 90) + dt.timedelta(hours=1),
+            status=statuses[i % len(statuses)],
+            session_id=f"sess-{i % 50}",
+            action_type=ACTION_TYPES[i % len(ACTION_TYPES)],
+            title="Run command",
+            preview="echo hi",
+            channel="telegram",
+            target={"tg_chat_id": "123"},
+            client_id=CLIENTS[i % len(CLIENTS)],
+        )
+        for i in range(2000)
+    )
+    db.add_all(
+        AllowRule(rule_id=f"rule_{c}_{a}", client_id=client, action_type=action, enabled=(a % 2 == 0))
+        for c, client in enumerate(CLIENTS)
+        for a, action in enumerate(ACTION_TYPES)
+    )
+    db.add_all(
+        SessionAllow(client_id=client, session_id=f"sess-{s}", action_type=ACTION_TYPES[s % len(ACTION_TYPES)])
+        for client in CLIENTS
+        for s in range(50)
+    )
+    db.commit()
+
+
+def _create_and_decide(db):
+    approval, _ = service.create_approval(
+        db,
+        session_id="sess-new",
+        action_type="action_1",
+        title="Run command",
+        preview="echo hi",
+        channel="telegram",
+        target={"tg_chat_id": "123"},
+        expires_in_sec=600,
+        client_id="client-1",
+    )
+    service.apply_decision(db, approval, parse_menu_reply("2"))
+
+
+WORKLOAD = {
+    "get_allow_rule": lambda db: service.get_allow_rule(db, "client-3", "action_2"),
+    "get_allow_rule_any": lambda db: service.get_allow_rule_any(db, "client-3", "action_3"),
+    "get_session_allow": lambda db: service.get_session_allow(db, "client-3", "sess-7", "action_7"),
+    "find_standing_allow": lambda db: repository.of(db).find_standing_allow("client-3", "sess-7", "action_7"),
+    "get_approval": lambda db: service.get_approval(db, "appr_00042"),
+    "get_approval_archived": lambda db: service.find_approval(db, "appr_missing"),
+    "create_and_decide": _create_and_decide,
+    "revoke_allow_rule": lambda db: service.revoke_allow_rule(db, "rule_0_0", "client-0"),
+    "expire_overdue": lambda db: service.expire_overdue(db, limit=50),
+    "list_approvals": lambda db: service.list_approvals(db, "client-3", limit=20),
+    "list_approvals_filtered": lambda db: service.list_approvals(
+        db,
+        "client-3",
+        status="pending",
+        session_id="sess-3",
+        cursor=service.encode_cursor(NOW, 10**6),
+        created_after=NOW - dt.timedelta(days=30),
+    ),
+    "list_approvals_archived": lambda db: service.list_approvals(db, "client-3", archived=True),
+    "find_pending_duplicate": lambda db: service.find_pending_duplicate(db, "client-1", "0" * 64),
+    "count_pending": lambda db: service.count_pending(db, "client-3", "sess-3"),
+    "rate_limit_db": lambda db: ratelimit.RateLimiter(
+        "db", ratelimit.Limit.per_minute(10), ratelimit.Limit.per_minute(5)
+    ).admit(db, "client-1", "sess-1"),
+    "shard_of_approval": lambda db: sharding.ShardRouter("unused", 1).shard_of_approval(db, "appr_0000000a" + "0" * 24),
+    "telegram_update_claim": lambda db: webhook_dedup.UpdateDeduper("db", 100, 600).claimed_elsewhere(db, 1),
+    "idempotency_lookup": lambda db: idempotency.lookup(db, "client-1", "key-1", "hash"),
+    "idempotency_purge": lambda db: idempotency.purge_expired(db),
+    "get_stats": lambda db: stats.get_stats(db, "client-1", "7d"),
+    "archive_terminal": lambda db: retention.archive_terminal(db, older_than_days=60, batch_size=100),
+}
+
+
+@pytest.fixture()
+def seeded(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'plans.db'}", future=True)
+    with engine.begin() as conn:
+        Base.metadata.create_all(bind=conn)
+        migrate(conn)
+    session = sessionmaker(bind=engine, future=True)()
+    seed(session)
+    yield engine, session
+    session.close()
+    engine.dispose()
+
+
+def capture(engine, func, db) -> list[tuple[str, tuple]]:
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "INSERT")):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        func(db)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    return statements
+
+
+@pytest.mark.parametrize("name", sorted(WORKLOAD))
+def test_service_queries_use_indexes(seeded, name):
+    engine, db = seeded
+    statements = capture(engine, WORKLOAD[name], db)
+    assert statements, f"{name} issued no SQL"
+
+    scans = []
+    with engine.connect() as conn:
+        for statement, parameters in statements:
+            plan = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+            scans.extend(f"{row[-1]}  <-  {statement.split()[0]} ..." for row in plan if FULL_SCAN.match(row[-1]))
+    assert not scans, f"{name} falls back to a full scan:\n" + "\n".join(scans)
+
+
+def test_migration_upgrades_existing_database(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'data.db'}", future=True)
+    with engine.begin() as conn:
+        Base.metadata.create_all(bind=conn)
+        # Reproduce a data.db created before the composite indexes existed.
+        for name in (
+            "ix_allow_rules_client_action_enabled",
+            "ix_approvals_status_expires_at",
+            "ix_approvals_created_at",
+            "ix_approvals_client_created",
+            "ix_approvals_archive_client_created",
+            "ux_approvals_pending_content",
+        ):
+            conn.exec_driver_sql(f"DROP INDEX {name}")
+        for table in ("approvals", "approvals_archive"):
+            conn.exec_driver_sql(f"ALTER TABLE {table} DROP COLUMN content_hash")
+        conn.exec_driver_sql("CREATE INDEX ix_approvals_status ON approvals (status)")
+
+    with engine.begin() as conn:
+        assert migrate(conn) == [version for version, _, _ in MIGRATIONS]
+    with engine.begin() as conn:
+        assert migrate(conn) == []
+
+    inspector = inspect(engine)
+    approval_indexes = {index["name"] for index in inspector.get_indexes("approvals")}
+    assert {"ix_approvals_status_expires_at", "ix_approvals_created_at", "ix_approvals_client_created"} <= approval_indexes
+    assert "ix_approvals_status" not in approval_indexes
+    assert "ux_approvals_pending_content" in approval_indexes
+    assert "content_hash" in {column["name"] for column in inspector.get_columns("approvals_archive")}
+    assert "ix_allow_rules_client_action_enabled" in {index["name"] for index in inspector.get_indexes("allow_rules")}
+    engine.dispose()
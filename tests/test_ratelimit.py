@@ -0,0 +1,98 @@
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import func, select
+
+from agent_approval_gate import main, ratelimit
+from agent_approval_gate.config import get_settings
+from agent_approval_gate.models import RateLimitBucket
+
+from conftest import TestingSessionLocal
+
+headers = {"Authorization": "Bearer test-key"}
+payload = {
+    "session_id": "sess_loop",
+    "action_type": "exec_cmd",
+    "title": "Run command",
+    "preview": "make test",
+    "channel": "telegram",
+    "target": {"tg_chat_id": "123"},
+    "expires_in_sec": 600,
+}
+
+
+@pytest.fixture()
+def limits(monkeypatch):
+    monkeypatch.setattr(main.telegram_adapter, "send_approval", lambda approval: None)
+    monkeypatch.setattr(ratelimit, "_limiter", None)
+
+    def configure(**env) -> None:
+        for name, value in env.items():
+            monkeypatch.setenv(name, str(value))
+        get_settings.cache_clear()
+
+    yield configure
+    get_settings.cache_clear()
+
+
+@pytest.mark.parametrize("backend", ["memory", "db"])
+def test_buckets_refill_and_take_all_or_nothing(backend, db_session):
+    limiter = ratelimit.RateLimiter(backend, ratelimit.Limit.per_minute(3), ratelimit.Limit.per_minute(2))
+    for _ in range(2):
+        limiter.admit(db_session, "client-1", "sess-a", now=1000.0)
+    with pytest.raises(HTTPException) as exc:
+        limiter.admit(db_session, "client-1", "sess-a", now=1000.0)
+    assert exc.value.status_code == 429
+    assert exc.value.headers["Retry-After"] == "30"
+
+    # The session bucket refused, so the client bucket still has its last token.
+    limiter.admit(db_session, "client-1", "sess-b", now=1000.0)
+    with pytest.raises(HTTPException) as exc:
+        limiter.admit(db_session, "client-1", "sess-c", now=1000.0)
+    assert exc.value.headers["Retry-After"] == "20"
+    limiter.admit(db_session, "client-1", "sess-c", now=1020.0)
+
+
+def test_db_buckets_are_shared_and_idle_ones_evicted(db_session):
+    limit = ratelimit.Limit.per_minute(2)
+    worker_a = ratelimit.RateLimiter("db", limit, None)
+    worker_b = ratelimit.RateLimiter("db", limit, None)
+    other_db = TestingSessionLocal()
+    try:
+        worker_a.admit(db_session, "client-1", "s", now=1000.0)
+        worker_b.admit(other_db, "client-1", "s", now=1000.0)
+        with pytest.raises(HTTPException):
+            worker_a.admit(db_session, "client-1", "s", now=1000.0)
+        worker_b.admit(other_db, "client-2", "s", now=1100.0)
+    finally:
+        other_db.close()
+    keys = db_session.execute(select(RateLimitBucket.key)).scalars().all()
+    assert keys == ["c:client-2"]
+
+
+def test_memory_buckets_evict_idle_keys(db_session):
+    limiter = ratelimit.RateLimiter("memory", None, ratelimit.Limit.per_minute(5))
+    for i in range(100):
+        limiter.admit(db_session, "client-1", f"sess-{i}", now=1000.0)
+    limiter.admit(db_session, "client-1", "sess-late", now=1000.0 + ratelimit.SWEEP_INTERVAL_SEC)
+    assert len(limiter.buckets) == 1
+
+
+def test_create_is_throttled_with_retry_after(client, limits):
+    limits(RATE_LIMIT_SESSION_PER_MIN=2)
+    assert [client.post("/v1/approvals", json=payload, headers=headers).status_code for _ in range(2)] == [200, 200]
+    throttled = client.post("/v1/approvals", json=payload, headers=headers)
+    assert throttled.status_code == 429
+    assert 1 <= int(throttled.headers["Retry-After"]) <= 30
+    assert client.post("/v1/approvals", json={**payload, "session_id": "sess_other"}, headers=headers).status_code == 200
+
+
+def test_pending_cap_per_session(client, limits, db_session):
+    limits(MAX_PENDING_PER_SESSION=1)
+    first = client.post("/v1/approvals", json=payload, headers=headers).json()
+    capped = client.post("/v1/approvals", json=payload, headers=headers)
+    assert capped.status_code == 429
+    assert 1 <= int(capped.headers["Retry-After"]) <= 60
+
+    client.post("/v1/inbox/email-reply", json={"subject": f"Re: [{first['approval_id']}]", "body": "3"}, headers=headers)
+    assert client.post("/v1/approvals", json=payload, headers=headers).status_code == 200
+    assert db_session.execute(select(func.count()).select_from(RateLimitBucket)).scalar() == 0
@@ -0,0 +1,256 @@
+import datetime as dt
+import threading
+
+import pytest
+
+from agent_approval_gate import main, repository
+from agent_approval_gate.config import get_settings
+from agent_approval_gate.models import AllowRule, Approval, SessionAllow
+
+NOW = dt.datetime(2026, 1, 1, 12, 0, 0)
+headers = {"Authorization": "Bearer test-key"}
+payload = {
+    "session_id": "sess_mem",
+    "action_type": "exec_cmd",
+    "title": "Run command",
+    "preview": "make deploy",
+    "channel": "telegram",
+    "target": {"tg_chat_id": "123"},
+    "expires_in_sec": 600,
+}
+
+
+@pytest.fixture(params=["sql", "memory"])
+def repo(request, db_session):
+    if request.param == "sql":
+        return repository.SqlRepository(db_session)
+    return repository.MemoryRepository(repository.MemoryStore(), db_session)
+
+
+def make_approval(approval_id: str, minutes: int = 0, **fields) -> Approval:
+    values = {
+        "approval_id": approval_id,
+        "created_at": NOW + dt.timedelta(minutes=minutes),
+        "expires_at": NOW + dt.timedelta(minutes=minutes + 10),
+        "status": "pending",
+        "session_id": "sess-1",
+        "action_type": "exec_cmd",
+        "title": "t",
+        "preview": "p",
+        "channel": "telegram",
+        "target": {"tg_chat_id": "1"},
+        "client_id": "client-1",
+        **fields,
+    }
+    return Approval(**values)
+
+
+def test_allow_rules(repo):
+    repo.add_allow_rule(AllowRule(rule_id="rule_1", client_id="client-1", action_type="exec_cmd", created_at=NOW))
+    repo.commit()
+    assert repo.get_allow_rule("client-1", "exec_cmd").rule_id == "rule_1"
+    assert repo.get_allow_rule("client-2", "exec_cmd") is None
+
+    repo.set_allow_rule_enabled(repo.get_allow_rule_by_id("rule_1"), False)
+    repo.commit()
+    assert repo.get_allow_rule("client-1", "exec_cmd") is None
+    assert repo.get_allow_rule("client-1", "exec_cmd", enabled_only=False).rule_id == "rule_1"
+
+    with pytest.raises(repository.Conflict):
+        repo.add_allow_rule(AllowRule(rule_id="rule_2", client_id="client-1", action_type="exec_cmd", created_at=NOW))
+        repo.commit()
+    repo.rollback()
+    assert repo.get_allow_rule_by_id("rule_2") is None
+
+
+def test_session_allows(repo):
+    def allow():
+        return SessionAllow(client_id="client-1", session_id="sess-1", action_type="exec_cmd", created_at=NOW)
+
+    repo.add_session_allow(allow())
+    repo.commit()
+    assert repo.get_session_allow("client-1", "sess-1", "exec_cmd") is not None
+    assert repo.get_session_allow("client-1", "sess-2", "exec_cmd") is None
+    with pytest.raises(repository.Conflict):
+        repo.add_session_allow(allow())
+        repo.commit()
+
+
+def test_standing_allow_prefers_the_allow_rule(repo):
+    assert repo.find_standing_allow("client-1", "sess-1", "exec_cmd") is None
+    allow = SessionAllow(client_id="client-1", session_id="sess-1", action_type="exec_cmd", created_at=NOW)
+    repo.add_session_allow(allow)
+    repo.commit()
+    assert repo.find_standing_allow("client-1", "sess-1", "exec_cmd") == ("2", None)
+    assert repo.find_standing_allow("client-1", "sess-2", "exec_cmd") is None
+    repo.add_allow_rule(AllowRule(rule_id="rule_1", client_id="client-1", action_type="exec_cmd", created_at=NOW))
+    repo.commit()
+    assert repo.find_standing_allow("client-1", "sess-1", "exec_cmd") == ("6", "rule_1")
+    repo.set_allow_rule_enabled(repo.get_allow_rule_by_id("rule_1"), False)
+    repo.commit()
+    assert repo.find_standing_allow("client-1", "sess-2", "exec_cmd") is None
+
+
+def test_rollback_discards_uncommitted_approvals(repo):
+    repo.add_approval(make_approval("appr_kept"))
+    repo.commit()
+    repo.add_approval(make_approval("appr_dropped"))
+    repo.rollback()
+    assert repo.find_approval("appr_kept").approval_id == "appr_kept"
+    assert repo.find_approval("appr_dropped") is None
+
+
+def test_one_pending_approval_per_content_hash(repo):
+    repo.add_approval(make_approval("appr_1", content_hash="h"))
+    repo.commit()
+    assert repo.find_pending_by_hash("client-1", "h").approval_id == "appr_1"
+    with pytest.raises(repository.Conflict):
+        repo.add_approval(make_approval("appr_2", content_hash="h"))
+        repo.commit()
+    repo.rollback()
+
+    assert repo.transition(repo.find_approval("appr_1"), {"status": "denied"})
+    repo.commit()
+    assert repo.find_pending_by_hash("client-1", "h") is None
+    repo.add_approval(make_approval("appr_3", content_hash="h"))
+    repo.commit()
+    assert repo.find_pending_by_hash("client-1", "h").approval_id == "appr_3"
+
+
+def test_transition_only_moves_live_pending_approvals(repo):
+    repo.add_approval(make_approval("appr_1"))
+    repo.add_approval(make_approval("appr_late", minutes=-20))
+    repo.commit()
+    approval = repo.find_approval("appr_1")
+    assert repo.transition(approval, {"status": "denied", "decision_code": "3"}, now=NOW)
+    assert not repo.transition(approval, {"status": "approved"}, now=NOW)
+    assert not repo.transition(repo.find_approval("appr_late"), {"status": "approved"}, now=NOW)
+    assert repo.transition(repo.find_approval("appr_late"), {"status": "expired"})
+    repo.commit()
+    repo.expire_all()
+    assert [repo.find_approval(i).status for i in ("appr_1", "appr_late")] == ["denied", "expired"]
+
+
+def test_rollback_undoes_a_transition(repo):
+    repo.add_approval(make_approval("appr_1", content_hash="h"))
+    repo.commit()
+    assert repo.transition(repo.find_approval("appr_1"), {"status": "approved"}, now=NOW)
+    repo.rollback()
+    assert repo.find_approval("appr_1").status == "pending"
+    assert repo.count_pending("client-1", "sess-1", NOW)[0] == 1
+    assert repo.find_pending_by_hash("client-1", "h").approval_id == "appr_1"
+
+
+def test_memory_writes_are_invisible_until_commit(db_session):
+    store = repository.MemoryStore()
+    repo, other = repository.MemoryRepository(store, db_session), repository.MemoryRepository(store, db_session)
+    repo.add_allow_rule(AllowRule(rule_id="rule_1", client_id="client-1", action_type="exec_cmd", created_at=NOW))
+    repo.add_approval(make_approval("appr_1", content_hash="h"))
+    assert other.get_allow_rule_by_id("rule_1") is None
+    assert other.find_approval("appr_1") is None and other.find_pending_by_hash("client-1", "h") is None
+    repo.commit()
+    assert other.get_allow_rule("client-1", "exec_cmd").rule_id == "rule_1"
+
+    rule = other.get_allow_rule_by_id("rule_1")
+    repo.set_allow_rule_enabled(rule, False)
+    assert other.get_allow_rule("client-1", "exec_cmd") is rule
+    repo.rollback()
+    assert rule.enabled
+    repo.set_allow_rule_enabled(rule, False)
+    repo.commit()
+    assert other.get_allow_rule("client-1", "exec_cmd") is None
+
+
+def test_memory_transition_is_invisible_until_commit(db_session):
+    store = repository.MemoryStore()
+    repo, other = repository.MemoryRepository(store, db_session), repository.MemoryRepository(store, db_session)
+    repo.add_approval(make_approval("appr_1", content_hash="h"))
+    repo.commit()
+    assert repo.transition(repo.find_approval("appr_1"), {"status": "approved", "decision_code": "1"}, now=NOW)
+    assert other.find_approval("appr_1").status == "pending"
+    assert other.count_pending("client-1", "sess-1", NOW)[0] == 1
+    assert other.find_pending_by_hash("client-1", "h") is not None
+
+    # A competing transition waits for the claim and loses once it commits.
+    outcome = []
+
+    def deny():
+        outcome.append(other.transition(other.find_approval("appr_1"), {"status": "denied"}))
+
+    thread = threading.Thread(target=deny)
+    thread.start()
+    thread.join(0.2)
+    assert outcome == []
+    repo.commit()
+    thread.join(5)
+    assert outcome == [False]
+    assert (other.find_approval("appr_1").status, other.find_approval("appr_1").decision_code) == ("approved", "1")
+    assert other.find_pending_by_hash("client-1", "h") is None
+
+
+def test_pending_counts_and_overdue(repo):
+    for approval in (
+        make_approval("appr_a", minutes=0),
+        make_approval("appr_b", minutes=5),
+        make_approval("appr_c", minutes=-20),  # expired ten minutes ago
+        make_approval("appr_d", minutes=5, session_id="sess-2"),
+        make_approval("appr_e", minutes=5, status="approved"),
+    ):
+        repo.add_approval(approval)
+    repo.commit()
+    assert repo.count_pending("client-1", "sess-1", NOW) == (2, NOW + dt.timedelta(minutes=10))
+    assert repo.count_pending("client-1", "sess-3", NOW) == (0, None)
+    assert [a.approval_id for a in repo.list_overdue(NOW, 10)] == ["appr_c"]
+
+    repo.find_approval("appr_a").status = "approved"
+    repo.commit()
+    assert repo.count_pending("client-1", "sess-1", NOW) == (1, NOW + dt.timedelta(minutes=15))
+
+
+def test_list_approvals_filters_and_pages_newest_first(repo):
+    for i in range(5):
+        repo.add_approval(make_approval(f"appr_{i}", minutes=i, status="approved" if i % 2 else "pending"))
+    repo.add_approval(make_approval("appr_old", minutes=-30))  # pending past its expiry
+    repo.add_approval(make_approval("appr_other", client_id="client-2"))
+    repo.commit()
+
+    def ids(**filters):
+        return [a.approval_id for a in repo.list_approvals("client-1", now=NOW, **filters)]
+
+    assert ids() == ["appr_4", "appr_3", "appr_2", "appr_1", "appr_0", "appr_old"]
+    assert ids(status="pending") == ["appr_4", "appr_2", "appr_0"]
+    assert ids(status="expired") == ["appr_old"]
+    assert ids(status="approved") == ["appr_3", "appr_1"]
+    assert ids(created_after=NOW + dt.timedelta(minutes=1), created_before=NOW + dt.timedelta(minutes=3)) == [
+        "appr_2",
+        "appr_1",
+    ]
+    first = repo.list_approvals("client-1", now=NOW, limit=2)
+    last = first[-1]
+    assert ids(before=(last.created_at, last.id), limit=2) == ["appr_2", "appr_1"]
+    assert ids(session_id="sess-2") == [] and ids(archived=True) == []
+
+
+@pytest.fixture()
+def memory_backend(monkeypatch):
+    monkeypatch.setattr(main.telegram_adapter, "send_approval", lambda approval: None)
+    monkeypatch.setattr(repository, "_store", None)
+    monkeypatch.setenv("STORAGE_BACKEND", "memory")
+    get_settings.cache_clear()
+    yield
+    get_settings.cache_clear()
+
+
+def test_gate_runs_on_the_memory_backend(client, memory_backend, db_session):
+    created = client.post("/v1/approvals", json=payload, headers=headers).json()
+    approval_id = created["approval_id"]
+    assert repository.get_store().approvals[approval_id].status == "pending"
+    assert db_session.query(Approval).count() == 0
+
+    client.post("/v1/inbox/email-reply", json={"subject": f"Re: [{approval_id}]", "body": "6"}, headers=headers)
+    assert client.get(f"/v1/approvals/{approval_id}", headers=headers).json()["decision"]["code"] == "6"
+    auto = client.post("/v1/approvals", json=payload, headers=headers).json()
+    assert auto["auto"] is True and auto["status"] == "approved"
+    listed = client.get("/v1/approvals", params={"status": "approved"}, headers=headers).json()["items"]
+    assert [item["approval_id"] for item in listed] == [auto["approval_id"], approval_id]
+    assert client.get("/v1/stats", headers=headers).json()["totals"]["created"] == 2
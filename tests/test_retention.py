@@ -0,0 +1,118 @@
+import datetime as dt
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+from agent_approval_gate import notify, retention
+from agent_approval_gate.database import Base
+from agent_approval_gate.models import Approval, ApprovalArchive, ApprovalRollup
+from agent_approval_gate.service import get_approval
+
+from conftest import ENGINE, TestingSessionLocal
+
+headers = {"Authorization": "Bearer test-key"}
+NOW = dt.datetime(2026, 10, 19, 12, 0, 0)
+
+
+def make_approval(approval_id: str, status: str, age_days: float, client_id: str = "client-1") -> Approval:
+    created_at = NOW - dt.timedelta(days=age_days)
+    return Approval(
+        approval_id=approval_id,
+        created_at=created_at,
+        expires_at=created_at + dt.timedelta(hours=1),
+        status=status,
+        session_id="sess-1",
+        action_type="exec_cmd",
+        title="Run command",
+        preview="echo hi",
+        decision_code="1" if status == "approved" else None,
+        channel="telegram",
+        target={"tg_chat_id": "123"},
+        client_id=client_id,
+    )
+
+
+def test_archive_moves_old_terminal_approvals_in_batches(db_session):
+    db_session.add_all(
+        [
+            make_approval("appr_old_approved", "approved", 40),
+            make_approval("appr_old_denied", "denied", 35),
+            make_approval("appr_old_pending", "pending", 45),
+            make_approval("appr_recent", "approved", 1),
+            make_approval("appr_live", "pending", 0),
+        ]
+    )
+    db_session.commit()
+
+    moved = retention.archive_terminal(db_session, older_than_days=30, batch_size=1, now=NOW)
+
+    assert moved == 2
+    hot = set(db_session.execute(select(Approval.approval_id)).scalars())
+    # Overdue pending rows are left for expire_overdue.
+    assert hot == {"appr_old_pending", "appr_recent", "appr_live"}
+    assert db_session.execute(select(func.count()).select_from(ApprovalArchive)).scalar() == 2
+
+    archived = get_approval(db_session, "appr_old_approved")
+    assert isinstance(archived, ApprovalArchive)
+    assert archived.decision_code == "1"
+
+
+def test_pass_expires_overdue_pending_through_the_service_before_archiving(db_session, monkeypatch):
+    published = []
+    monkeypatch.setattr(notify, "publish_approval", lambda approval: published.append(approval.approval_id))
+    live = make_approval("appr_live", "pending", 0)
+    live.expires_at = dt.datetime.utcnow() + dt.timedelta(hours=1)
+    db_session.add_all([make_approval("appr_old_pending", "pending", 45), live])
+    db_session.commit()
+
+    moved = retention.run_once(TestingSessionLocal, ENGINE, older_than_days=30, batch_size=1)
+
+    assert moved == 1
+    assert get_approval(db_session, "appr_old_pending").status == "expired"
+    assert published == ["appr_old_pending"]
+    expired = db_session.execute(select(func.sum(ApprovalRollup.expired))).scalar()
+    assert expired == 1
+    assert get_approval(db_session, "appr_live").status == "pending"
+
+
+def test_status_endpoint_reads_archive(client, db_session):
+    from agent_approval_gate.auth import api_key_to_client_id
+
+    db_session.add(make_approval("appr_archived", "denied", 60, client_id=api_key_to_client_id("test-key")))
+    db_session.commit()
+    retention.archive_terminal(db_session, older_than_days=30, now=NOW)
+
+    resp = client.get("/v1/approvals/appr_archived", headers=headers)
+    assert resp.status_code == 200
+    assert resp.json()["status"] == "denied"
+
+
+def test_maintenance_reclaims_pages(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'data.db'}", future=True)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+        Base.metadata.create_all(bind=conn)
+    session = sessionmaker(bind=engine, future=True)()
+    session.add_all(make_approval(f"appr_{i}", "approved", 90) for i in range(200))
+    session.add(make_approval("appr_live", "pending", 0))
+    session.commit()
+    for approval in session.execute(select(Approval)).scalars():
+        approval.preview = "x" * 2000
+    session.commit()
+
+    assert retention.archive_terminal(session, older_than_days=30, now=NOW) == 200
+    session.execute(ApprovalArchive.__table__.delete())
+    session.commit()
+    session.close()
+
+    with engine.connect() as conn:
+        before = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+    retention.run_maintenance(engine)
+    with engine.connect() as conn:
+        after = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+        analyzed = conn.exec_driver_sql("SELECT count(*) FROM sqlite_stat1").scalar()
+    engine.dispose()
+
+    assert before > 0
+    assert after < before
+    assert analyzed > 0
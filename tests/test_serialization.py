@@ -0,0 +1,85 @@
+import pytest
+
+from agent_approval_gate import idempotency, main, serialization, status_cache
+from agent_approval_gate.config import get_settings
+from agent_approval_gate.schemas import ApprovalCreateResponse, ApprovalStatusResponse
+
+headers = {"Authorization": "Bearer test-key"}
+payload = {
+    "session_id": "sess_fast",
+    "action_type": "exec_cmd",
+    "title": "Run command",
+    "preview": "rm -rf ./build",
+    "channel": "telegram",
+    "target": {"tg_chat_id": "123"},
+    "expires_in_sec": 600,
+}
+
+BODIES = [
+    (ApprovalCreateResponse, {"approval_id": "appr_1", "status": "pending", "auto": False, "expires_at": 1730000000}),
+    (ApprovalCreateResponse, {"approval_id": "appr_2", "status": "approved", "auto": True, "decision": {"code": "6", "note": None, "override": None}}),
+    (ApprovalCreateResponse, {"approval_id": "appr_3", "status": "pending", "auto": False, "expires_at": 1, "coalesced": True}),
+    (ApprovalStatusResponse, {"status": "pending", "expires_at": 1730000000}),
+    (
+        ApprovalStatusResponse,
+        {
+            "status": "approved",
+            "expires_at": 1730000000,
+            "decision": {"code": "5", "note": "好的 \"quoted\"\n\t\x01", "override": "echo ✓ </script>"},
+            "session_id": "sess",
+            "action_type": "custom:ask",
+        },
+    ),
+]
+
+
+@pytest.mark.parametrize("model,body", BODIES)
+def test_encoder_matches_pydantic_bytes(model, body):
+    encoded = serialization.ModelEncoder(model)(body)
+    assert encoded == model.model_validate(body).model_dump_json().encode()
+    assert serialization._dumps_stdlib(serialization._shape(body, serialization._layout(model))) == encoded
+
+
+def test_encoder_rejects_missing_required_field():
+    with pytest.raises(KeyError):
+        serialization.ModelEncoder(ApprovalCreateResponse)({"status": "pending", "auto": False})
+
+
+@pytest.fixture()
+def fast(monkeypatch):
+    monkeypatch.setattr(main.telegram_adapter, "send_approval", lambda approval: None)
+
+    def set_fast(enabled: bool) -> None:
+        monkeypatch.setenv("FAST_RESPONSES", "1" if enabled else "0")
+        get_settings.cache_clear()
+
+    yield set_fast
+    get_settings.cache_clear()
+
+
+def test_fast_path_is_wire_compatible(client, fast):
+    fast(True)
+    keyed = {**headers, "Idempotency-Key": "fast-1"}
+    created = client.post("/v1/approvals", json=payload, headers=keyed)
+    assert created.headers["content-type"] == "application/json"
+    replayed = client.post("/v1/approvals", json=payload, headers=keyed)
+    assert replayed.content == created.content
+    assert replayed.headers[idempotency.REPLAYED_HEADER] == "true"
+    fast(False)
+    assert client.post("/v1/approvals", json=payload, headers=keyed).content == created.content
+
+    approval_id = created.json()["approval_id"]
+    pending = client.get(f"/v1/approvals/{approval_id}", headers=headers)
+    fast(True)
+    fast_pending = client.get(f"/v1/approvals/{approval_id}", headers=headers)
+    assert fast_pending.content == pending.content
+    assert fast_pending.headers["ETag"] == pending.headers["ETag"]
+    assert fast_pending.headers["Cache-Control"] == status_cache.PENDING_CACHE_CONTROL
+
+    client.post("/v1/inbox/email-reply", json={"subject": f"Re: [{approval_id}]", "body": "4 ship it"}, headers=headers)
+    fast_terminal = client.get(f"/v1/approvals/{approval_id}", headers=headers)
+    fast(False)
+    terminal = client.get(f"/v1/approvals/{approval_id}", headers=headers)
+    assert fast_terminal.content == terminal.content
+    assert fast_terminal.headers["Cache-Control"] == status_cache.TERMINAL_CACHE_CONTROL
+    assert terminal.json()["decision"]["note"] == "ship it"
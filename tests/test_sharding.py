@@ -0,0 +1,100 @@
+import pytest
+from sqlalchemy import func, select
+
+from agent_approval_gate import keys, main, sharding, webhook_dedup
+from agent_approval_gate.auth import api_key_to_client_id
+from agent_approval_gate.config import get_settings
+from agent_approval_gate.models import Approval, ClientShard
+
+headers = {"Authorization": "Bearer test-key"}
+payload = {
+    "session_id": "sess_shard",
+    "action_type": "exec_cmd",
+    "title": "Run command",
+    "preview": "make deploy",
+    "channel": "telegram",
+    "target": {"tg_chat_id": "123"},
+    "expires_in_sec": 600,
+}
+
+
+@pytest.fixture()
+def shard_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(main.telegram_adapter, "send_approval", lambda approval: None)
+    monkeypatch.setattr(sharding, "_router", None)
+    monkeypatch.setattr(webhook_dedup, "_deduper", None)
+    monkeypatch.setenv("SHARD_DIR", str(tmp_path))
+    monkeypatch.setenv("SHARD_MAX_OPEN", "1")
+    get_settings.cache_clear()
+    yield tmp_path
+    sharding.get_router().close()
+    get_settings.cache_clear()
+
+
+def count_approvals(db) -> int:
+    return db.execute(select(func.count()).select_from(Approval)).scalar()
+
+
+def test_clients_get_their_own_shard_file(client, shard_dir, db_session):
+    _, other_key = keys.create_key(db_session, "other", ["*"])
+    other = {"Authorization": f"Bearer {other_key}"}
+    mine = client.post("/v1/approvals", json=payload, headers=headers).json()["approval_id"]
+    theirs = client.post("/v1/approvals", json=payload, headers=other).json()["approval_id"]
+
+    my_shard = sharding.default_shard(api_key_to_client_id("test-key"))
+    assert mine.startswith(f"appr_{my_shard}") and len(mine) == len("appr_") + 32
+    assert sorted(path.name for path in shard_dir.iterdir()) == sorted({f"{my_shard}.db", f"{theirs[5:13]}.db"})
+    assert count_approvals(db_session) == 0
+    assert len(db_session.execute(select(ClientShard)).all()) == 2
+
+    # SHARD_MAX_OPEN=1: each request reopens the other shard's engine.
+    assert client.get(f"/v1/approvals/{mine}", headers=headers).json()["status"] == "pending"
+    assert client.get(f"/v1/approvals/{theirs}", headers=other).json()["status"] == "pending"
+    assert client.get(f"/v1/approvals/{theirs}", headers=headers).status_code == 404
+    assert [item["approval_id"] for item in client.get("/v1/approvals", headers=headers).json()["items"]] == [mine]
+
+    router = sharding.get_router()
+    assert router.fan_out(db_session, count_approvals) == {my_shard: 1, theirs[5:13]: 1}
+
+
+def test_approval_id_routes_unauthenticated_decisions(client, shard_dir, monkeypatch):
+    async def edited(*args):
+        edits.append(args)
+
+    edits = []
+    monkeypatch.setattr(main, "_edit_message", edited)
+    approval_id = client.post("/v1/approvals", json=payload, headers=headers).json()["approval_id"]
+    assert client.get(f"/v1/action/{approval_id}/deny").status_code == 200
+    assert client.get(f"/v1/approvals/{approval_id}", headers=headers).json()["status"] == "denied"
+
+    tapped = client.post("/v1/approvals", json=payload, headers=headers).json()["approval_id"]
+    update = {
+        "update_id": 1,
+        "callback_query": {
+            "id": "cb-1",
+            "data": f"{tapped}:1",
+            "from": {"id": 42},
+            "message": {"message_id": 7, "chat": {"id": 123}, "text": "Run command"},
+        },
+    }
+    assert client.post("/v1/telegram/webhook", json=update).json()["text"] == "✅ Approved"
+    assert client.get(f"/v1/approvals/{tapped}", headers=headers).json()["status"] == "approved"
+    assert len(edits) == 1
+
+    # An unmapped prefix falls through to the primary database and never creates a file.
+    assert client.get("/v1/action/appr_0123456789abcdef0123456789abcdef/approve").status_code == 404
+    assert len(list(shard_dir.iterdir())) == 1
+
+
+def test_router_keeps_at_most_max_open_engines(tmp_path):
+    router = sharding.ShardRouter(str(tmp_path), max_open=2)
+    with router.session("0000000a") as db:
+        for shard in ("0000000b", "0000000c"):
+            router.open(shard)
+        assert list(router._open) == ["0000000b", "0000000c"]
+        # A session on an evicted shard keeps working.
+        assert count_approvals(db) == 0
+    router.open("0000000b")
+    router.open("0000000a")
+    assert list(router._open) == ["0000000b", "0000000a"]
+    router.close()
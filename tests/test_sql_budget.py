@@ -0,0 +1,102 @@
+"""SQL round-trip budgets per endpoint.
+
+Each request runs with ``DEBUG_SQL_HEADERS=1`` and must stay within the
+statements and commits listed in ``BUDGETS``. Lower a budget when a change
+saves a round trip; raising one needs a reason.
+"""
+
+import pytest
+
+from agent_approval_gate import main
+from agent_approval_gate.auth import api_key_to_client_id
+from agent_approval_gate.config import get_settings
+from agent_approval_gate.querycount import COMMITS_HEADER, STATEMENTS_HEADER
+from agent_approval_gate.service import create_allow_rule, create_session_allow
+
+headers = {"Authorization": "Bearer test-key"}
+payload = {
+    "session_id": "sess_budget",
+    "action_type": "exec_cmd",
+    "title": "Run command",
+    "preview": "make deploy",
+    "channel": "telegram",
+    "target": {"tg_chat_id": "123"},
+    "expires_in_sec": 600,
+}
+
+# (statements, commits)
+BUDGETS = {
+    # standing-allow lookup, approval insert, rollup upsert
+    "create": (3, 1),
+    "create_auto_approved": (3, 1),
+    "get_pending": (1, 0),
+    # served from the status cache after the first read
+    "get_terminal": (1, 0),
+    "get_terminal_cached": (0, 0),
+    "list": (1, 0),
+    "stats": (2, 0),
+    # approval read, decision update, approval and latency rollups
+    "decide": (4, 1),
+    # plus the allow lookup and insert, in the same transaction
+    "decide_session": (6, 1),
+    "decide_always": (6, 1),
+    "revoke_allow_rule": (2, 1),
+}
+
+
+@pytest.fixture()
+def budget(client, monkeypatch):
+    monkeypatch.setattr(main.telegram_adapter, "send_approval", lambda approval: None)
+    monkeypatch.setenv("DEBUG_SQL_HEADERS", "1")
+    get_settings.cache_clear()
+    # Load the API key registry so its refresh is not billed to the first request.
+    client.get("/v1/approvals", headers=headers)
+
+    def check(name, response):
+        assert response.status_code == 200, response.text
+        used = int(response.headers[STATEMENTS_HEADER]), int(response.headers[COMMITS_HEADER])
+        allowed = BUDGETS[name]
+        assert used[0] <= allowed[0] and used[1] <= allowed[1], f"{name}: used {used}, budget {allowed}"
+        return response
+
+    yield check
+    get_settings.cache_clear()
+
+
+def create(client) -> str:
+    return client.post("/v1/approvals", json=payload, headers=headers).json()["approval_id"]
+
+
+def test_create_and_read_budgets(client, budget):
+    approval_id = budget("create", client.post("/v1/approvals", json=payload, headers=headers)).json()["approval_id"]
+    budget("get_pending", client.get(f"/v1/approvals/{approval_id}", headers=headers))
+    budget("list", client.get("/v1/approvals", headers=headers))
+    budget("stats", client.get("/v1/stats", headers=headers))
+
+    client.get(f"/v1/action/{approval_id}/deny")
+    budget("get_terminal", client.get(f"/v1/approvals/{approval_id}", headers=headers))
+    budget("get_terminal_cached", client.get(f"/v1/approvals/{approval_id}", headers=headers))
+
+
+@pytest.mark.parametrize("standing", ["allow_rule", "session_allow"])
+def test_auto_approved_create_budget(client, budget, db_session, standing):
+    client_id = api_key_to_client_id("test-key")
+    if standing == "allow_rule":
+        create_allow_rule(db_session, client_id, payload["action_type"])
+    else:
+        create_session_allow(db_session, client_id, payload["session_id"], payload["action_type"])
+    body = budget("create_auto_approved", client.post("/v1/approvals", json=payload, headers=headers)).json()
+    assert body["auto"] is True
+
+
+@pytest.mark.parametrize(
+    "name, action",
+    [("decide", "approve"), ("decide", "deny"), ("decide_session", "session"), ("decide_always", "always")],
+)
+def test_decision_budgets(client, budget, name, action):
+    budget(name, client.get(f"/v1/action/{create(client)}/{action}"))
+
+
+def test_revoke_allow_rule_budget(client, budget, db_session):
+    rule = create_allow_rule(db_session, api_key_to_client_id("test-key"), payload["action_type"])
+    budget("revoke_allow_rule", client.delete(f"/v1/allow-rules/{rule.rule_id}", headers=headers))
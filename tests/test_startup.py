@@ -0,0 +1,65 @@
+import os
+import subprocess
+import sys
+
+from conftest import ROOT, SRC
+
+# Self time (ms) of the package's own modules while importing the app. Dependencies
+# (FastAPI, SQLAlchemy, pydantic) dominate the total and are excluded, so the budget
+# only moves when our own module-level code grows.
+APP_SELF_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_APP_MS", "250"))
+# Cumulative time of the modules a client script imports on launch, beyond a bare interpreter.
+SCRIPT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_SCRIPT_MS", "150"))
+
+NOT_AT_IMPORT = {"httpx", "smtplib", "email.mime.multipart", "email.mime.text"}
+SCRIPT_FORBIDDEN = {"agent_approval_gate", "httpx", "uuid", "urllib.request", "ssl"}
+
+
+def import_profile(args: list[str], env: dict | None = None) -> list[tuple[str, int, int]]:
+    """Run ``python -X importtime`` and return ``(module, self_us, cumulative_us)`` rows."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        capture_output=True,
+        text=True,
+        stdin=subprocess.DEVNULL,
+        env={**os.environ, "PYTHONPATH": str(SRC), **(env or {})},
+        timeout=60,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        rows.append((name.rstrip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def test_app_import_defers_engine_adapters_and_optional_modules():
+    code = (
+        "import sys\n"
+        "import agent_approval_gate.main as main\n"
+        "from agent_approval_gate import database\n"
+        "assert database._engine is None and not main._adapters\n"
+        f"loaded = {sorted(NOT_AT_IMPORT)!r}\n"
+        "assert not [m for m in loaded if m in sys.modules], [m for m in loaded if m in sys.modules]\n"
+    )
+    rows = import_profile(["-c", code], {"DATABASE_URL": "sqlite://"})
+    names = {name.strip() for name, _, _ in rows}
+    assert "agent_approval_gate.main" in names
+    assert not names & NOT_AT_IMPORT
+
+    own_ms = sum(self_us for name, self_us, _ in rows if name.strip().startswith("agent_approval_gate")) / 1000
+    assert own_ms < APP_SELF_BUDGET_MS, f"agent_approval_gate modules took {own_ms:.1f} ms to import"
+
+
+def test_client_scripts_import_only_light_stdlib():
+    bare = {name for name, _, _ in import_profile(["-S", "-c", "pass"])}
+    env = {"APPROVAL_API_KEY": ""}
+    for script in (ROOT / "scripts" / "cc_permission_hook.py", ROOT / "mcp_server.py"):
+        rows = import_profile(["-S", str(script)], env)
+        names = {name.strip() for name, _, _ in rows}
+        assert not names & SCRIPT_FORBIDDEN, f"{script.name} imports {sorted(names & SCRIPT_FORBIDDEN)}"
+        # Top-level rows carry the cumulative cost of everything the script pulled in.
+        top_level = [cumulative for name, _, cumulative in rows if name.startswith(" ") and not name.startswith("  ") and name not in bare]
+        spent_ms = sum(top_level) / 1000
+        assert spent_ms < SCRIPT_BUDGET_MS, f"{script.name} spent {spent_ms:.1f} ms importing"
@@ -0,0 +1,82 @@
+import datetime as dt
+import random
+
+from sqlalchemy import event
+
+from agent_approval_gate import stats
+from agent_approval_gate.auth import api_key_to_client_id
+from agent_approval_gate.service import create_allow_rule, expire_if_needed, get_approval
+
+from conftest import ENGINE
+
+headers = {"Authorization": "Bearer test-key"}
+
+
+def test_latency_sketch_quantiles_and_merge():
+    rng = random.Random(7)
+    values = [rng.lognormvariate(3, 1.2) for _ in range(5000)]
+    left, right = stats.LatencySketch(), stats.LatencySketch()
+    for i, value in enumerate(values):
+        (left if i % 2 else right).add(value)
+    merged = stats.LatencySketch().merge(left).merge(right)
+
+    assert merged.count == len(values)
+    ordered = sorted(values)
+    for q in (0.5, 0.9, 0.99):
+        exact = ordered[int(q * (len(ordered) - 1))]
+        assert abs(merged.quantile(q) - exact) / exact <= stats.SKETCH_ALPHA * 1.01
+    assert stats.LatencySketch().quantile(0.5) is None
+
+
+def create(client, action_type: str) -> str:
+    payload = {
+        "session_id": f"sess_{action_type}",
+        "action_type": action_type,
+        "title": "Run command",
+        "preview": "echo hi",
+        "channel": "telegram",
+        "target": {"tg_chat_id": "123"},
+        "expires_in_sec": 600,
+    }
+    return client.post("/v1/approvals", json=payload, headers=headers).json()["approval_id"]
+
+
+def test_stats_endpoint_reads_rollups_only(client, db_session):
+    create_allow_rule(db_session, api_key_to_client_id("test-key"), "write_file")
+    approved = create(client, "exec_cmd")
+    denied = create(client, "exec_cmd")
+    expiring = create(client, "exec_cmd")
+    create(client, "exec_cmd")
+    create(client, "write_file")  # auto-approved by the allow rule
+
+    client.post("/v1/inbox/email-reply", json={"subject": f"Re: [{approved}]", "body": "1"}, headers=headers)
+    client.post("/v1/inbox/email-reply", json={"subject": f"Re: [{denied}]", "body": "3"}, headers=headers)
+    approval = get_approval(db_session, expiring)
+    approval.expires_at = dt.datetime.utcnow() - dt.timedelta(seconds=1)
+    db_session.commit()
+    expire_if_needed(db_session, approval)
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)  # noqa: E731
+    event.listen(ENGINE, "before_cursor_execute", listener)
+    try:
+        resp = client.get("/v1/stats", params={"window": "1h"}, headers=headers)
+    finally:
+        event.remove(ENGINE, "before_cursor_execute", listener)
+    assert resp.status_code == 200
+    assert not [s for s in statements if " approvals" in s]
+
+    data = resp.json()
+    totals = data["totals"]
+    assert (totals["created"], totals["auto_approved"]) == (5, 1)
+    assert (totals["approved"], totals["denied"], totals["expired"]) == (1, 1, 1)
+    assert totals["auto_approve_rate"] == 0.2
+    assert totals["approval_rate"] == round(1 / 3, 4)
+    assert totals["decision_latency"]["count"] == 2
+    assert totals["decision_latency"]["p50"] is not None
+
+    assert data["by_action_type"]["write_file"]["auto_approved"] == 1
+    assert data["by_action_type"]["exec_cmd"]["created"] == 4
+    assert data["by_channel"]["telegram"]["created"] == 5
+
+    assert client.get("/v1/stats", params={"window": "2y"}, headers=headers).status_code == 422
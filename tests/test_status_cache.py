@@ -0,0 +1,64 @@
+from sqlalchemy import event
+
+from agent_approval_gate import status_cache
+
+from conftest import ENGINE
+
+headers = {"Authorization": "Bearer test-key"}
+payload = {
+    "session_id": "sess_etag",
+    "action_type": "exec_cmd",
+    "title": "Run command",
+    "preview": "echo hi",
+    "channel": "telegram",
+    "target": {"tg_chat_id": "123"},
+    "expires_in_sec": 600,
+}
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = status_cache.LRUCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert len(cache) == 2
+
+
+def test_pending_poll_revalidates_with_etag(client):
+    approval_id = client.post("/v1/approvals", json=payload, headers=headers).json()["approval_id"]
+    first = client.get(f"/v1/approvals/{approval_id}", headers=headers)
+    etag = first.headers["ETag"]
+    assert first.headers["Cache-Control"] == status_cache.PENDING_CACHE_CONTROL
+
+    not_modified = client.get(f"/v1/approvals/{approval_id}", headers={**headers, "If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+
+    client.post("/v1/inbox/email-reply", json={"subject": f"Re: [{approval_id}]", "body": "1"}, headers=headers)
+    changed = client.get(f"/v1/approvals/{approval_id}", headers={**headers, "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.json()["status"] == "approved"
+    assert changed.headers["ETag"] != etag
+
+
+def test_terminal_status_is_immutable_and_served_from_cache(client):
+    approval_id = client.post("/v1/approvals", json=payload, headers=headers).json()["approval_id"]
+    client.post("/v1/inbox/email-reply", json={"subject": f"Re: [{approval_id}]", "body": "3"}, headers=headers)
+    first = client.get(f"/v1/approvals/{approval_id}", headers=headers)
+    assert first.headers["Cache-Control"] == status_cache.TERMINAL_CACHE_CONTROL
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)  # noqa: E731
+    event.listen(ENGINE, "before_cursor_execute", listener)
+    try:
+        again = client.get(f"/v1/approvals/{approval_id}", headers=headers)
+        revalidated = client.get(f"/v1/approvals/{approval_id}", headers={**headers, "If-None-Match": first.headers["ETag"]})
+    finally:
+        event.remove(ENGINE, "before_cursor_execute", listener)
+
+    assert statements == []
+    assert again.json() == first.json() == {**again.json(), "status": "denied"}
+    assert revalidated.status_code == 304
@@ -0,0 +1,234 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+from sqlalchemy import event
+
+from agent_approval_gate import main, webhook_dedup
+from agent_approval_gate.config import get_settings
+
+from conftest import ENGINE, TestingSessionLocal
+
+headers = {"Authorization": "Bearer test-key"}
+payload = {
+    "session_id": "sess_tg",
+    "action_type": "exec_cmd",
+    "title": "Run command",
+    "preview": "make deploy",
+    "channel": "telegram",
+    "target": {"tg_chat_id": "123"},
+    "expires_in_sec": 600,
+}
+SLOW_SEC = 1.0
+
+
+class TelegramStub:
+    def __init__(self) -> None:
+        self.calls = []
+        self.slow_call_started = threading.Event()
+        self.slow_call_started_at = 0.0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                method = self.path.rsplit("/", 1)[-1]
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                stub.calls.append(method)
+                if method == "editMessageText":
+                    stub.slow_call_started_at = time.perf_counter()
+                    stub.slow_call_started.set()
+                    time.sleep(SLOW_SEC)
+                body = b'{"ok": true, "result": true}'
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+
+@pytest.fixture()
+def telegram_api(monkeypatch):
+    stub = TelegramStub()
+    monkeypatch.setattr(webhook_dedup, "_deduper", None)
+    monkeypatch.setenv("TELEGRAM_API_BASE", stub.base_url)
+    monkeypatch.setenv("TELEGRAM_BOT_TOKEN", "123:abc")
+    get_settings.cache_clear()
+    yield stub
+    stub.server.shutdown()
+    get_settings.cache_clear()
+
+
+def callback_update(approval_id: str, code: str, update_id: int = 1) -> dict:
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": f"cb-{update_id}",
+            "data": f"{approval_id}:{code}",
+            "from": {"id": 42, "language_code": "en"},
+            "message": {"message_id": 7, "chat": {"id": 123}, "text": "Run command"},
+        },
+    }
+
+
+def test_slow_telegram_api_does_not_block_other_requests(client, telegram_api):
+    approval_id = client.post("/v1/approvals", json=payload, headers=headers).json()["approval_id"]
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://gate") as gate:
+            webhook = asyncio.create_task(gate.post("/v1/telegram/webhook", json=callback_update(approval_id, "1")))
+            assert await asyncio.to_thread(telegram_api.slow_call_started.wait, 5)
+            other = await gate.get(f"/v1/approvals/{approval_id}", headers=headers)
+            # Measured from when Telegram started stalling: a blocked loop could not even start this request.
+            other_elapsed = time.perf_counter() - telegram_api.slow_call_started_at
+            return other, other_elapsed, await webhook
+
+    other, other_elapsed, webhook = asyncio.run(scenario())
+    assert other.status_code == 200
+    assert other_elapsed < SLOW_SEC / 2
+    assert webhook.status_code == 200
+    assert client.get(f"/v1/approvals/{approval_id}", headers=headers).json()["status"] == "approved"
+    assert telegram_api.calls == ["editMessageText"]
+
+
+async def call_webhook(update: dict) -> tuple[dict, float, float]:
+    """Drive the ASGI app directly; returns the body and when it was sent and when the app finished."""
+    body = json.dumps(update).encode()
+    received = False
+    sent = {}
+    start = time.perf_counter()
+
+    async def receive():
+        nonlocal received
+        if received:
+            await asyncio.sleep(3600)
+        received = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            sent["body"] = sent.get("body", b"") + message.get("body", b"")
+            if not message.get("more_body"):
+                sent["at"] = time.perf_counter() - start
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/v1/telegram/webhook",
+        "raw_path": b"/v1/telegram/webhook",
+        "query_string": b"",
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        "client": ("127.0.0.1", 1),
+        "server": ("gate", 80),
+    }
+    await main.app(scope, receive, send)
+    return json.loads(sent["body"]), sent["at"], time.perf_counter() - start
+
+
+def test_tap_is_acknowledged_inline_before_decision_work(client, telegram_api):
+    approval_id = client.post("/v1/approvals", json=payload, headers=headers).json()["approval_id"]
+
+    answer, answered_at, finished_at = asyncio.run(call_webhook(callback_update(approval_id, "3")))
+    assert answer == {"method": "answerCallbackQuery", "callback_query_id": "cb-1", "text": "❌ Denied"}
+    # The acknowledgement goes out before the slow edit that runs in the background.
+    assert answered_at < SLOW_SEC / 2 <= SLOW_SEC <= finished_at
+    assert telegram_api.calls == ["editMessageText"]
+    assert client.get(f"/v1/approvals/{approval_id}", headers=headers).json()["status"] == "denied"
+
+    again = client.post("/v1/telegram/webhook", json=callback_update(approval_id, "1", update_id=2)).json()
+    assert again["text"] == "⚡ Denied"
+    missing = client.post("/v1/telegram/webhook", json=callback_update("appr_0000", "1", update_id=3)).json()
+    assert missing["text"] == "Failed: missing"
+    assert telegram_api.calls == ["editMessageText", "editMessageText"]
+
+
+def test_recent_updates_are_bounded_by_capacity_and_window():
+    recent = webhook_dedup.RecentUpdates(capacity=3, window_sec=60)
+    assert [recent.seen(update_id, now=1000.0) for update_id in (1, 2, 3, 1)] == [False, False, False, True]
+    assert recent.seen(4, now=1000.0) is False
+    assert recent.seen(1, now=1000.0) is False  # pushed out by capacity
+    assert len(recent) == 3
+    assert recent.seen(4, now=1059.0) is True
+    assert recent.seen(4, now=1061.0) is False  # aged out of the window
+    assert len(recent) == 1
+
+
+def test_redelivered_update_is_dropped_before_any_work(client, telegram_api):
+    approval_id = client.post("/v1/approvals", json=payload, headers=headers).json()["approval_id"]
+    update = callback_update(approval_id, "1", update_id=77)
+    assert client.post("/v1/telegram/webhook", json=update).json()["text"] == "✅ Approved"
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])  # noqa: E731
+    event.listen(ENGINE, "before_cursor_execute", listener)
+    try:
+        redelivered = client.post("/v1/telegram/webhook", json=update)
+    finally:
+        event.remove(ENGINE, "before_cursor_execute", listener)
+    assert redelivered.json() == {"ok": True}
+    assert statements == []
+    assert telegram_api.calls == ["editMessageText"]
+
+
+@pytest.mark.parametrize("backend", ["memory", "db"])
+def test_update_that_failed_is_handled_on_redelivery(client, telegram_api, monkeypatch, backend):
+    monkeypatch.setenv("TELEGRAM_DEDUP_BACKEND", backend)
+    get_settings.cache_clear()
+    approval_id = client.post("/v1/approvals", json=payload, headers=headers).json()["approval_id"]
+    update = callback_update(approval_id, "1", update_id=78)
+    peek = main._peek_tg_approval
+
+    def flaky_peek(approval_id, db):
+        monkeypatch.setattr(main, "_peek_tg_approval", peek)
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(main, "_peek_tg_approval", flaky_peek)
+    with pytest.raises(RuntimeError):
+        client.post("/v1/telegram/webhook", json=update)
+
+    assert client.post("/v1/telegram/webhook", json=update).json()["text"] == "✅ Approved"
+    assert client.get(f"/v1/approvals/{approval_id}", headers=headers).json()["status"] == "approved"
+    assert client.post("/v1/telegram/webhook", json=update).json() == {"ok": True}
+
+
+def test_forgotten_update_counts_as_new():
+    recent = webhook_dedup.RecentUpdates(capacity=3, window_sec=60)
+    assert [recent.seen(update_id, now=1000.0) for update_id in (1, 2)] == [False, False]
+    recent.forget(2)
+    recent.forget(9)
+    assert len(recent) == 1
+    assert recent.seen(2, now=1001.0) is False
+    assert recent.seen(2, now=1002.0) is True
+
+
+def test_db_backend_claims_each_update_once_across_workers(db_session):
+    worker_a = webhook_dedup.UpdateDeduper("db", capacity=100, window_sec=600)
+    worker_b = webhook_dedup.UpdateDeduper("db", capacity=100, window_sec=600)
+    other_db = TestingSessionLocal()
+    try:
+        assert worker_a.seen(5, now=1000.0) is False
+        assert worker_a.claimed_elsewhere(db_session, 5, now=1000.0) is False
+        # New to worker B's memory, but worker A already claimed it.
+        assert worker_b.seen(5, now=1001.0) is False
+        assert worker_b.claimed_elsewhere(other_db, 5, now=1001.0) is True
+        # Rows older than the window are swept, so the id can be claimed again.
+        assert worker_b.claimed_elsewhere(other_db, 5, now=1000.0 + 600 + webhook_dedup.SWEEP_INTERVAL_SEC) is False
+    finally:
+        other_db.close()
@@ -0,0 +1,68 @@
+import pytest
+
+from agent_approval_gate import tracing
+from agent_approval_gate.config import get_settings
+
+
+@pytest.fixture()
+def trace_file(tmp_path, monkeypatch):
+    path = tmp_path / "traces.jsonl"
+    monkeypatch.setenv("TRACE_EXPORTER", "jsonl")
+    monkeypatch.setenv("TRACE_FILE", str(path))
+    get_settings.cache_clear()
+    yield path
+    get_settings.cache_clear()
+
+
+def test_parse_traceparent():
+    trace_id, span_id = "a" * 32, "b" * 16
+    assert tracing.parse_traceparent(f"00-{trace_id}-{span_id}-01") == (trace_id, span_id)
+    assert tracing.parse_traceparent("garbage") is None
+    assert tracing.parse_traceparent(f"00-{'0' * 32}-{span_id}-01") is None
+
+
+def test_trace_context_propagates_to_decision(client, trace_file):
+    headers = {"Authorization": "Bearer test-key"}
+    client_trace = "1" * 32
+    payload = {
+        "session_id": "sess_trace",
+        "action_type": "exec_cmd",
+        "title": "Run command",
+        "preview": "echo hi",
+        "channel": "telegram",
+        "target": {"tg_chat_id": "123"},
+        "expires_in_sec": 600,
+    }
+    resp = client.post(
+        "/v1/approvals",
+        json=payload,
+        headers={**headers, "traceparent": f"00-{client_trace}-{'2' * 16}-01"},
+    )
+    approval_id = resp.json()["approval_id"]
+    client.post(
+        "/v1/inbox/email-reply",
+        json={"subject": f"Re: [{approval_id}]", "body": "1"},
+        headers=headers,
+    )
+
+    spans = tracing.load_spans(str(trace_file))
+    create_trace = [span for span in spans if span["trace_id"] == client_trace]
+    names = {span["name"] for span in create_trace}
+    assert "POST /v1/approvals" in names
+    assert "create_approval" in names
+    assert "telegram.send" in names
+    assert any(name.startswith("db.") for name in names)
+    server_span = next(span for span in create_trace if span["name"] == "POST /v1/approvals")
+    assert server_span["parent_id"] == "2" * 16
+    assert server_span["attributes"][tracing.APPROVAL_ID_ATTR] == approval_id
+
+    breakdown = tracing.approval_breakdown(spans, approval_id)
+    breakdown_names = [row["name"] for row in breakdown]
+    assert breakdown_names.index("create_approval") < breakdown_names.index("apply_decision")
+    assert {row["trace_id"] for row in breakdown} - {client_trace}
+    assert all(row["duration_ms"] >= 0 for row in breakdown)
+
+
+def test_tracing_disabled_is_noop(client):
+    with tracing.span("anything") as span:
+        assert span is tracing.NOOP_SPAN
@@ -0,0 +1,183 @@
+import datetime as dt
+import threading
+
+import pytest
+from sqlalchemy import create_engine, event, func, select
+
+from agent_approval_gate import main, repository, writer
+from agent_approval_gate.config import get_settings
+from agent_approval_gate.database import init_schema
+from agent_approval_gate.models import AllowRule, Approval
+
+headers = {"Authorization": "Bearer test-key"}
+payload = {
+    "session_id": "sess_writer",
+    "action_type": "exec_cmd",
+    "title": "Run command",
+    "preview": "make deploy",
+    "channel": "telegram",
+    "target": {"tg_chat_id": "123"},
+    "expires_in_sec": 600,
+}
+
+
+def make_approval(approval_id: str) -> Approval:
+    now = dt.datetime.utcnow()
+    return Approval(
+        approval_id=approval_id,
+        created_at=now,
+        expires_at=now + dt.timedelta(minutes=10),
+        status="pending",
+        session_id="sess-1",
+        action_type="exec_cmd",
+        title="t",
+        preview="p",
+        channel="telegram",
+        target={"tg_chat_id": "1"},
+        client_id="client-1",
+    )
+
+
+@pytest.fixture()
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'writer.db'}", connect_args={"check_same_thread": False})
+    init_schema(engine)
+    yield engine
+    engine.dispose()
+
+
+def submit_concurrently(group, engine, approval_ids):
+    results, errors = {}, {}
+    barrier = threading.Barrier(len(approval_ids))
+
+    def add(approval):
+        def write(db):
+            db.add(approval)
+            return approval
+
+        return write
+
+    def run(approval_id):
+        barrier.wait()
+        try:
+            results[approval_id] = group.submit(engine, add(make_approval(approval_id)))
+        except Exception as exc:
+            errors[approval_id] = exc
+
+    threads = [threading.Thread(target=run, args=(approval_id,)) for approval_id in approval_ids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+def test_concurrent_writes_share_commits(engine):
+    commits = []
+    event.listen(engine, "commit", lambda conn: commits.append(1))
+    group = writer.GroupCommitWriter(window_sec=0.2, max_batch=64)
+    try:
+        results, errors = submit_concurrently(group, engine, [f"appr_{i}" for i in range(16)])
+    finally:
+        group.stop()
+    assert not errors
+    assert len(commits) < 16
+    # Returned rows are detached but keep their values, including the generated id.
+    assert sorted(approval.id for approval in results.values()) == list(range(1, 17))
+    with engine.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(Approval)).scalar() == 16
+
+
+def test_a_failing_write_only_fails_its_caller(engine):
+    group = writer.GroupCommitWriter(window_sec=0.2, max_batch=64)
+    try:
+        results, errors = submit_concurrently(group, engine, ["appr_a", "appr_b", "appr_dup", "appr_dup"])
+    finally:
+        group.stop()
+    assert list(errors) == ["appr_dup"]
+    assert isinstance(errors["appr_dup"], repository.Conflict)
+    with engine.connect() as conn:
+        assert sorted(conn.execute(select(Approval.approval_id)).scalars()) == ["appr_a", "appr_b", "appr_dup"]
+
+
+def test_submit_fails_fast_once_stopped(engine):
+    group = writer.GroupCommitWriter(window_sec=0.01, max_batch=64)
+    group.stop()
+    with pytest.raises(writer.WriterUnavailable):
+        group.submit(engine, lambda db: None)
+
+
+def test_a_dead_writer_thread_fails_its_callers(engine, monkeypatch):
+    died = []
+    monkeypatch.setattr(threading, "excepthook", lambda args: died.append((args.thread.name, args.exc_type)))
+    group = writer.GroupCommitWriter(window_sec=0.01, max_batch=64)
+
+    def die(db):
+        raise SystemExit
+
+    with pytest.raises(writer.WriterUnavailable):
+        group.submit(engine, die)
+    group._thread.join(timeout=5)
+    assert died == [("approval-writer", SystemExit)]
+    with pytest.raises(writer.WriterUnavailable):
+        group.submit(engine, lambda db: None)
+
+
+def test_submit_times_out_only_writes_that_never_started(engine):
+    group = writer.GroupCommitWriter(window_sec=0.01, max_batch=1, timeout_sec=0.2)
+    release = threading.Event()
+    slow_results = []
+
+    def slow_caller():
+        try:
+            slow_results.append(group.submit(engine, lambda db: release.wait(5) and "committed"))
+        except Exception as exc:
+            slow_results.append(exc)
+
+    blocker = threading.Thread(target=slow_caller)
+    blocker.start()
+    ran = []
+    try:
+        with pytest.raises(writer.WriterUnavailable, match="did not run"):
+            group.submit(engine, lambda db: ran.append(1))
+        # The running write is past its timeout too, but its caller keeps waiting for the outcome.
+        release.set()
+        blocker.join(5)
+    finally:
+        release.set()
+        group.stop()
+    assert slow_results == ["committed"]
+    # The queued write was cancelled, not run after its caller gave up.
+    assert ran == []
+
+
+@pytest.fixture()
+def group_commit(monkeypatch):
+    monkeypatch.setattr(main.telegram_adapter, "send_approval", lambda approval: None)
+    monkeypatch.setenv("WRITE_BATCH_WINDOW_MS", "1")
+    get_settings.cache_clear()
+    yield
+    writer.stop()
+    get_settings.cache_clear()
+
+
+def test_gate_runs_through_the_writer(client, group_commit, db_session):
+    approval_id = client.post("/v1/approvals", json=payload, headers=headers).json()["approval_id"]
+    assert writer.get_writer() is not None
+    assert client.get(f"/v1/action/{approval_id}/always").status_code == 200
+
+    body = client.get(f"/v1/approvals/{approval_id}", headers=headers).json()
+    assert body["status"] == "approved"
+    rule = db_session.execute(select(AllowRule)).scalars().one()
+    assert rule.enabled and rule.action_type == "exec_cmd"
+    auto = client.post("/v1/approvals", json=payload, headers=headers).json()
+    assert auto["auto"] is True and auto["status"] == "approved"
+
+
+def test_unavailable_writer_is_a_retryable_503(client, group_commit, monkeypatch):
+    stopped = writer.GroupCommitWriter(window_sec=0.01, max_batch=64)
+    stopped.stop()
+    monkeypatch.setattr(writer, "get_writer", lambda: stopped)
+    resp = client.post("/v1/approvals", json=payload, headers=headers)
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"] == "1"